@@ -1,15 +1,24 @@
 from typing import Any
 
-from flask import Flask, request, send_file
+from flask import Flask, Response, request, send_file
 from flask_cors import CORS
 from flask_restful import Resource, Api, reqparse
-import json, os, sys, uuid
+import base64, functools, hashlib, json, os, sys, threading, uuid
 from html.parser import HTMLParser
 from flask import jsonify
 import urllib
 from urllib.parse import quote
 from urllib.error import HTTPError, URLError
 import spdx_manager
+import spdx_batch_export
+from sqlalchemy.orm import selectinload
+from mapping_loader import MappingTreeLoader
+from coverage_kernel import apis_coverage
+from section_relocation import SectionRelocator
+from section_splitter import SpecificationSections
+from specification_cache import SpecificationCache
+from export_jobs import ExportJobs
+from concurrent.futures.process import BrokenProcessPool
 
 import logging
 
@@ -29,9 +38,25 @@ JOIN_SW_REQUIREMENTS_TABLE = "sw-requirements"
 JOIN_TEST_SPECIFICATIONS_TABLE = "test-specifications"
 
 TOKEN_CHECK_OK = "TOKEN-OK"
+
+# Remote specifications cache, can be overridden from the environment
+specification_cache = SpecificationCache(
+    os.environ.get("BASIL_SPEC_CACHE_DIR", os.path.join(db_path, "spec_cache")),
+    ttl=int(os.environ.get("BASIL_SPEC_CACHE_TTL", 300)),
+    timeout=int(os.environ.get("BASIL_SPEC_FETCH_TIMEOUT", 30)))
+
+# SPDX exports, every job is built by a worker thread in a process of the export pool
+spdx_export_dir = spdx_batch_export.EXPORT_DIR
+export_jobs = None
+export_jobs_lock = threading.Lock()
+export_processes = None
+export_processes_lock = threading.Lock()
 import db_orm
+from response_cache import ResponseCache, register_invalidation
 
 from api import ApiModel, ApiHistoryModel
+from mapping_coverage import MappingCoverageModel
+from search_index import search, search_clause
 from api_justification import *
 from api_sw_requirement import *
 from api_test_case import *
@@ -45,10 +70,24 @@ from sw_requirement_test_specification import *
 from test_case import *
 from test_specification import *
 from test_specification_test_case import *
+from row_version import bulk_update
+from api_fork import fork_api_mappings
+
+# Mapping views responses, invalidated by the changes of the mapping tree of their api
+response_cache = ResponseCache(max_entries=int(os.environ.get("BASIL_VIEW_CACHE_SIZE", 256)),
+                               ttl=int(os.environ.get("BASIL_VIEW_CACHE_TTL", 300)),
+                               shared_dir=os.environ.get("BASIL_VIEW_CACHE_DIR") or None)
+register_invalidation(response_cache)
 
 app = Flask("BASIL-API")
 api = Api(app)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor"])
+
+
+@app.teardown_appcontext
+def shutdown_db_session(exception=None):
+    db_orm.remove_sessions()
+
 
 token_parser = reqparse.RequestParser()
 token_parser.add_argument('token', location="form")
@@ -64,6 +103,16 @@ _TCs = f'{_TC}s'
 _J = 'justification'
 _Js = f'{_J}s'
 
+# Direct mappings: (work item type, mapping model, work item key, work item title field)
+DIRECT_WORK_ITEMS = [('sw-requirements', ApiSwRequirementModel, _SR, 'title'),
+                     ('test-specifications', ApiTestSpecificationModel, _TS, 'title'),
+                     ('test-cases', ApiTestCaseModel, _TC, 'title'),
+                     ('justifications', ApiJustificationModel, _J, 'description')]
+
+# Models of the tables returned by /search
+SEARCH_MODELS = {x.__tablename__: x for x in [ApiModel, SwRequirementModel, TestSpecificationModel,
+                                              TestCaseModel, JustificationModel, CommentModel]}
+
 
 def get_api_from_request(_request, _db_session):
     if 'api-id' not in _request.keys():
@@ -210,7 +259,7 @@ def get_indirect_work_items_section_open_html(work_item_type, nesting, coverage)
     return tmp
 
 
-def get_api_specification(_url_or_path):
+def get_api_specification(_url_or_path, cached_only=False):
     if _url_or_path == None:
         return None
     else:
@@ -219,19 +268,9 @@ def get_api_specification(_url_or_path):
             return None
 
         if _url_or_path.startswith("http"):
-            try:
-                resource = urllib.request.urlopen(_url_or_path)
-                content = resource.read().decode(resource.headers.get_content_charset())
-                return content
-            except URLError as exp:
-                print(f"URLError: {exp.reason} reading {_url_or_path}")
-                return None
-            except HTTPError as exp:
-                print(f"HTTPError: {exp.reason} reading {_url_or_path}")
-                return None
-            except ValueError as exp:
-                print(f"ValueError reading {_url_or_path}")
-                return None
+            if cached_only:
+                return specification_cache.cached(_url_or_path)
+            return specification_cache.get(_url_or_path)
         else:
             if not os.path.exists(_url_or_path):
                 return None
@@ -245,84 +284,95 @@ def get_api_specification(_url_or_path):
                 return None
 
 
-def get_api_coverage(_sections):
-    total_len = sum([len(x['section']) for x in _sections])
-    wa = 0
-    for i in range(len(_sections)):
-        wa += (len(_sections[i]['section']) / total_len) * (_sections[i]['coverage'] / 100.0)
-    return int(wa * 100)
-
-
-def split_section(_to_splits, _that_split, _work_item_type):
-    sections = []
-    _work_items = []
-    _current_work_item = _that_split[_work_item_type]
-    _current_work_item['relation_id'] = _that_split['relation_id']
-    _current_work_item['coverage'] = _that_split['coverage'] if 'coverage' in _that_split.keys() else 0
-    _current_work_item['version'] = _that_split['version']
-
-    for _to_split in _to_splits:
-        _to_split_range = range(_to_split['offset'],
-                                _to_split['offset'] + len(_to_split['section']))
-        that_split_range = range(_that_split['offset'], _that_split['offset'] + len(_that_split['section']))
-        overlap = len(list(set(_to_split_range) & set(that_split_range))) > 0
-        if not overlap:
-            tmp_section = {'section': _to_split['section'],
-                           'offset': _to_split['offset'],
-                           'coverage': _to_split['coverage'],
-                           'delete': 0,
-                           _Js: [],
-                           _TCs: [],
-                           _TSs: [],
-                           _SRs: []}
-
-            for j in range(len(_to_split[_SRs])):
-                tmp_section[_SRs].append(_to_split[_SRs][j].copy())
-            for j in range(len(_to_split[_TCs])):
-                tmp_section[_TCs].append(_to_split[_TCs][j].copy())
-            for j in range(len(_to_split[_TSs])):
-                tmp_section[_TSs].append(_to_split[_TSs][j].copy())
-            for j in range(len(_to_split[_Js])):
-                tmp_section[_Js].append(_to_split[_Js][j].copy())
-
-            sections.append(tmp_section)
+def get_mapping_view_etag(dbi, api, view):
+    """ETag of a mapping view of api, hash of the view, of the specification
+    and of the state of the mapping tree rows, computed without building the view
+    """
+    api_specification = get_api_specification(api.raw_specification_url)
+    etag = hashlib.sha256()
+    etag.update(f'{view}\n{api_specification}\n'.encode())
+    etag.update(json.dumps(MappingTreeLoader(dbi.session, api).state(), default=str).encode())
+    return etag.hexdigest()
+
+
+def conditional_mapping_view(get):
+    """Decorator of the GET of a mapping view adding its ETag to the response.
+    Responses are cached per api and view until a change of the api mapping tree,
+    a request with a matching If-None-Match gets 304 without building the view.
+    Responses returned with their status, the errors and the views of a specification
+    that can't be read, are neither cached nor tagged.
+    """
+    @functools.wraps(get)
+    def wrapper(self, *args, **kwargs):
+        query_args = get_query_string_args(request.args)
+        try:
+            api_id = int(query_args['api-id'])
+        except (KeyError, ValueError):
+            return get(self, *args, **kwargs)
+
+        view = request.path
+        cached = response_cache.get(api_id, view)
+        if cached is None:
+            # Read the token before the data the response is built from
+            token = response_cache.token(api_id)
+            dbi = db_orm.DbInterface()
+            api = get_api_from_request(query_args, dbi.session)
+            if not api:
+                return get(self, *args, **kwargs)
+
+            etag = get_mapping_view_etag(dbi, api, view)
+            if request.if_none_match.contains(etag):
+                return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+
+            ret = get(self, *args, **kwargs)
+            if isinstance(ret, tuple):
+                return ret
+            cached = {'etag': etag, 'response': ret}
+            response_cache.put(api_id, view, token, cached)
+
+        headers = {'ETag': f'"{cached["etag"]}"',
+                   'Cache-Control': 'no-cache'}
+        if request.if_none_match.contains(cached['etag']):
+            return Response(status=304, headers=headers)
+        return cached['response'], 200, headers
+    return wrapper
+
+
+def get_apis_sections_coverage(dbi, apis):
+    """
+    Coverage of the specification sections of every api in apis,
+    as shown by the sw requirements mapping view.
+    The mapping rows of all the apis are read with two queries and the
+    sections of all the apis are computed together, see coverage_kernel.
+    Remote specifications are only read from the cache, the listing never
+    fetches them: the apis whose specification is not cached get the
+    stored coverage of their direct mappings, limited to 0..100.
+    return: dict {api id: coverage}
+    """
+    not_cached = set()
+
+    def get_specification(api):
+        ret = get_api_specification(api.raw_specification_url, cached_only=True)
+        if ret is None and (api.raw_specification_url or "").strip().startswith("http"):
+            not_cached.add(api.id)
+        return ret
+
+    ret = apis_coverage(dbi.session, apis, get_specification)
+    if not_cached:
+        stored = dict(dbi.session.query(MappingCoverageModel.parent_id, MappingCoverageModel.coverage).filter(
+            MappingCoverageModel.parent_table == ApiModel.__tablename__).filter(
+            MappingCoverageModel.parent_id.in_(not_cached)).all())
+        for api_id in not_cached:
+            ret[api_id] = int(min(max(stored.get(api_id, 0), 0), 100))
+    return ret
 
-        else:
-            idx = [_to_split['offset'],
-                   _to_split['offset'] + len(_to_split['section']),
-                   _that_split['offset'],
-                   _that_split['offset'] + len(_that_split['section'])]
-            idx_set = set(idx)
-            idx = sorted(list(idx_set))
-            for i in range(1, len(idx)):
-                tmp_section = {'section': _to_split['section'][idx[i - 1] - idx[0]:idx[i] - idx[0]],
-                               'offset': idx[i - 1],
-                               'coverage': _to_split['coverage'],
-                               'delete': 0,
-                               _Js: [],
-                               _TCs: [],
-                               _TSs: [],
-                               _SRs: []}
-
-                for j in range(len(_to_split[_SRs])):
-                    tmp_section[_SRs].append(_to_split[_SRs][j].copy())
-                for j in range(len(_to_split[_TCs])):
-                    tmp_section[_TCs].append(_to_split[_TCs][j].copy())
-                for j in range(len(_to_split[_TSs])):
-                    tmp_section[_TSs].append(_to_split[_TSs][j].copy())
-                for j in range(len(_to_split[_Js])):
-                    tmp_section[_Js].append(_to_split[_Js][j].copy())
-                sections.append(tmp_section)
-
-    for iSection in range(len(sections)):
-        section_range = range(sections[iSection]['offset'],
-                              sections[iSection]['offset'] + len(sections[iSection]['section']))
-        that_split_range = range(_that_split['offset'], _that_split['offset'] + len(_that_split['section']))
-        overlap = len(list(set(section_range) & set(that_split_range))) > 0
-        if overlap:
-            sections[iSection][f'{_work_item_type}s'].append(_current_work_item)
-
-    return sections
+
+def encode_cursor(_values):
+    return base64.urlsafe_b64encode(json.dumps(_values).encode()).decode()
+
+
+def decode_cursor(_cursor):
+    return json.loads(base64.urlsafe_b64decode(_cursor.encode()).decode())
 
 
 def get_splitted_sections(_specification, _mapping, _work_item_types):
@@ -332,63 +382,15 @@ def get_splitted_sections(_specification, _mapping, _work_item_types):
     _work_item_types: list of work items type for direct mapping that I
               what to display in the current view
     return: list of sections with related mapping
+
+    The specification is cut at every boundary of the matching mappings
+    and, sweeping the boundaries in order, each section gets the work
+    items of the mappings that cover it, in mapping order.
+    Sections are built as compact records, see section_splitter, and
+    converted to dicts sharing the work item dicts of _mapping.
     """
-    mapped_sections = [{'section': _specification,
-                        'offset': 0,
-                        'coverage': 0,
-                        'delete': 0,
-                        _TCs: [],
-                        _TSs: [],
-                        _SRs: [],
-                        _Js: []}]
-
-    for iWIT in range(len(_work_item_types)):
-        _items_key = f"{_work_item_types[iWIT]}s"
-        for iMapping in range(len(_mapping[_items_key])):
-            if not _mapping[_items_key][iMapping]['match']:
-                continue
-            mapped_sections = sorted(mapped_sections, key=lambda k: k['offset'])
-            # get overlapping sections
-            overlapping_section_indexes = []
-            for j in range(len(mapped_sections)):
-                section_range = range(mapped_sections[j]['offset'],
-                                      mapped_sections[j]['offset'] + len(mapped_sections[j]['section']))
-                that_split_range = range(_mapping[_items_key][iMapping]['offset'],
-                                         _mapping[_items_key][iMapping]['offset'] + len(
-                                             _mapping[_items_key][iMapping]['section']))
-                overlap = len(list(set(section_range) & set(that_split_range))) > 0
-                if overlap:
-                    overlapping_section_indexes.append(j)
-
-            if len(overlapping_section_indexes) > 0:
-                for k in overlapping_section_indexes:
-                    mapped_sections[k]['delete'] = 1
-
-                mapped_sections += split_section([x for x in mapped_sections if x['delete'] == 1],
-                                                 _mapping[_items_key][iMapping], _work_item_types[iWIT])
-                mapped_sections = [x for x in mapped_sections if x['delete'] == 0]
-
-    for iS in range(len(mapped_sections)):
-        if mapped_sections[iS]['section'].strip() == "":
-            if sum([len(mapped_sections[iS][_SRs]),
-                    len(mapped_sections[iS][_TSs]),
-                    len(mapped_sections[iS][_TCs]),
-                    len(mapped_sections[iS][_Js])]) == 0:
-                mapped_sections[iS]['delete'] = True
-        coverage_total = 0
-        for j in range(len(mapped_sections[iS][_SRs])):
-            coverage_total += mapped_sections[iS][_SRs][j]['coverage']
-        for j in range(len(mapped_sections[iS][_TCs])):
-            coverage_total += mapped_sections[iS][_TCs][j]['coverage']
-        for j in range(len(mapped_sections[iS][_TSs])):
-            coverage_total += mapped_sections[iS][_TSs][j]['coverage']
-        for j in range(len(mapped_sections[iS][_Js])):
-            coverage_total += mapped_sections[iS][_Js][j]['coverage']
-        mapped_sections[iS]['coverage'] = min(max(coverage_total, 0), 100)
-
-    # Remove Section with section: \n and no work items
-    mapped_sections = [x for x in mapped_sections if not x['delete']]
-    return sorted(mapped_sections, key=lambda k: k['offset'])
+    sections = SpecificationSections(_specification, _mapping, _work_item_types)
+    return sections.as_dicts([_TCs, _TSs, _SRs, _Js])
 
 
 def check_fields_in_request(fields, request):
@@ -406,7 +408,9 @@ def get_query_string_args(args):
 
     permitted_keys = ["id", "api-id", "work_item_type", "mapped_to_type",
                       "relation_id", "mode", "search", "library",
-                      "parent_table", "parent_id", "url"]
+                      "parent_table", "parent_id", "url",
+                      "cursor", "fields", "old-url", "min-similarity",
+                      "job-id", "download", "tables"]
     ret = {"db": db,
            "limit": limit,
            "order_by": order_by,
@@ -432,54 +436,16 @@ def get_query_string_args(args):
     return ret
 
 
-def get_api_sw_requirements_mapping_sections(dbi, api):
-    undesired_keys = ['section', 'offset']
-    api_specification = get_api_specification(api.raw_specification_url)
+def get_api_sw_requirements_mapping_sections(dbi, api, api_specification):
     if api_specification == None:
         api_specification = "Unable to find the Software Specification. " \
                             "Please check the value in the Software Component properties" \
                             " or check your internet connection (If file is remote)."
 
-    sr = dbi.session.query(ApiSwRequirementModel).filter(
-        ApiSwRequirementModel.api_id == api.id).order_by(
-        ApiSwRequirementModel.offset.asc()).all()
-    sr_mapping = [x.as_dict(db_session=dbi.session) for x in sr]
-
-    justifications = dbi.session.query(ApiJustificationModel).filter(
-        ApiJustificationModel.api_id == api.id).order_by(
-        ApiJustificationModel.offset.asc()).all()
-    justifications_mapping = [x.as_dict(db_session=dbi.session) for x in justifications]
-
+    loader = MappingTreeLoader(dbi.session, api)
     mapping = {_A: api.as_dict(),
-               _SRs: sr_mapping,
-               _Js: justifications_mapping}
-
-    for iSR in range(len(mapping[_SRs])):
-        # Indirect Test Specifications
-        curr_asr_id = mapping[_SRs][iSR]['relation_id']
-        ind_ts = dbi.session.query(SwRequirementTestSpecificationModel).filter(
-            SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id == curr_asr_id
-        ).all()
-        mapping[_SRs][iSR][_SR][_TSs] = [get_dict_without_keys(x.as_dict(db_session=dbi.session),
-                                                               undesired_keys + ['api']) for x in ind_ts]
-
-        ind_tc = dbi.session.query(SwRequirementTestCaseModel).filter(
-            SwRequirementTestCaseModel.sw_requirement_mapping_api_id == curr_asr_id
-        ).all()
-        mapping[_SRs][iSR][_SR][_TCs] = [get_dict_without_keys(x.as_dict(db_session=dbi.session),
-                                                               undesired_keys + ['api', 'sw_requirement_mapping_api'])
-                                         for x in ind_tc]
-
-        for iTS in range(len(mapping[_SRs][iSR][_SR][_TSs])):
-            # Indirect Test Cases
-            curr_srts_id = mapping[_SRs][iSR][_SR][_TSs][iTS]['relation_id']
-            ind_tc = dbi.session.query(TestSpecificationTestCaseModel).filter(
-                TestSpecificationTestCaseModel.test_specification_mapping_sw_requirement_id == curr_srts_id
-            ).all()
-
-            mapping[_SRs][iSR][_SR][_TSs][iTS][_TS][_TCs] = [get_dict_without_keys(x.as_dict(db_session=dbi.session),
-                                                                                   undesired_keys + ['api']) for x in
-                                                             ind_tc]
+               _SRs: loader.sw_requirements(),
+               _Js: loader.justifications()}
 
     for iMapping in range(len(mapping[_SRs])):
         current_offset = mapping[_SRs][iMapping]['offset']
@@ -498,100 +464,129 @@ def get_api_sw_requirements_mapping_sections(dbi, api):
 
     ret = {'mapped': mapped_sections,
            'unmapped': unmapped_sections}
-    dbi.engine.dispose()
     return ret
 
 
-def check_direct_work_items_against_another_spec_file(db_session, spec, api):
-    ret = {'sw-requirements': {'ok': [],
-                               'ko': [],
-                               'warning': []},
-           'test-specifications': {'ok': [],
-                                   'ko': [],
-                                   'warning': []},
-           'test-cases': {'ok': [],
-                          'ko': [],
-                          'warning': []},
-           'justifications': {'ok': [],
-                              'ko': [],
-                              'warning': []}
-           }
-
-    # ApiSwRequirement
-    api_srs = db_session.query(ApiSwRequirementModel).filter(
-        ApiSwRequirementModel.api_id == api.id
-    ).all()
-    for api_sr in api_srs:
-        if api_sr.section in spec:
-            if spec.index(api_sr.section) == api_sr.offset:
-                ret['sw-requirements']['ok'].append({'id': api_sr.id,
-                                                     'title': api_sr.sw_requirement.title})
-            else:
-                ret['sw-requirements']['warning'].append({'id': api_sr.id,
-                                                          'old-offset': api_sr.offset,
-                                                          'new-offset': spec.index(api_sr.section),
-                                                          'title': api_sr.sw_requirement.title})
-        else:
-            ret['sw-requirements']['ko'].append({'id': api_sr.id,
-                                                 'title': api_sr.sw_requirement.title})
-
-    # ApiTestSpecification
-    api_tss = db_session.query(ApiTestSpecificationModel).filter(
-        ApiTestSpecificationModel.api_id == api.id
-    ).all()
-    for api_ts in api_tss:
-        if api_ts.section in spec:
-            if spec.index(api_ts.section) == api_ts.offset:
-                ret['test-specifications']['ok'].append({'id': api_ts.id,
-                                                         'title': api_ts.test_specification.title})
-            else:
-                ret['test-specifications']['warning'].append({'id': api_ts.id,
-                                                              'old-offset': api_ts.offset,
-                                                              'new-offset': spec.index(api_ts.section),
-                                                              'title': api_ts.test_specification.title})
-        else:
-            ret['test-specifications']['ko'].append({'id': api_ts.id,
-                                                     'title': api_ts.test_specification.title})
-
-    # ApiTestCase
-    api_tcs = db_session.query(ApiTestCaseModel).filter(
-        ApiTestCaseModel.api_id == api.id
-    ).all()
-    for api_tc in api_tcs:
-        if api_tc.section in spec:
-            if spec.index(api_tc.section) == api_tc.offset:
-                ret['test-cases']['ok'].append({'id': api_tc.id,
-                                                'title': api_tc.test_case.title})
-            else:
-                ret['test-cases']['warning'].append({'id': api_tc.id,
-                                                     'old-offset': api_tc.offset,
-                                                     'new-offset': spec.index(
-                                                         api_tc.section),
-                                                     'title': api_tc.test_case.title})
+def find_sections(_specification, _sections):
+    """
+    _sections: list of sections, duplicates are searched only once
+    return: dict {section: [offset of every occurrence of section in _specification]}
+            overlapping occurrences included
+    """
+    ret = {}
+    for section in set(_sections):
+        offsets = []
+        if len(section) == 0:
+            offsets = [0]
         else:
-            ret['test-cases']['ko'].append({'id': api_tc.id,
-                                            'title': api_tc.test_case.title})
-
-    # ApiJustification
-    api_js = db_session.query(ApiJustificationModel).filter(
-        ApiJustificationModel.api_id == api.id
-    ).all()
-    for api_j in api_js:
-        if api_j.section in spec:
-            if spec.index(api_j.section) == api_j.offset:
-                ret['justifications']['ok'].append({'id': api_j.id,
-                                                    'title': api_j.justification.description})
+            offset = _specification.find(section)
+            while offset != -1:
+                offsets.append(offset)
+                offset = _specification.find(section, offset + 1)
+        ret[section] = offsets
+    return ret
+
+
+def get_direct_mappings(db_session, api):
+    """
+    return: dict {work item type: [direct mappings of api with their work item loaded]}
+    """
+    ret = {}
+    for key, model, item_key, title_key in DIRECT_WORK_ITEMS:
+        ret[key] = db_session.query(model).options(
+            selectinload(getattr(model, item_key))).filter(
+            model.api_id == api.id
+        ).order_by(model.id.asc()).all()
+    return ret
+
+
+def check_direct_work_items_against_another_spec_file(db_session, spec, api):
+    """
+    Check every direct mapping of api against spec
+    return: for each work item type the mappings whose section is still at the same
+            offset (ok), at another offset (warning, new-offset is the first occurrence)
+            or is missing (ko). Sections found more than once are also
+            listed in ambiguous with the offsets of all the occurrences.
+    """
+    ret = {}
+    mappings = get_direct_mappings(db_session, api)
+    for key in mappings.keys():
+        ret[key] = {'ok': [],
+                    'ko': [],
+                    'warning': [],
+                    'ambiguous': []}
+
+    occurrences = find_sections(spec, [x.section for key in mappings.keys() for x in mappings[key]])
+
+    for key, model, item_key, title_key in DIRECT_WORK_ITEMS:
+        for mapping in mappings[key]:
+            title = getattr(getattr(mapping, item_key), title_key)
+            offsets = occurrences[mapping.section]
+            if len(offsets) == 0:
+                ret[key]['ko'].append({'id': mapping.id,
+                                       'title': title})
+                continue
+
+            if offsets[0] == mapping.offset:
+                ret[key]['ok'].append({'id': mapping.id,
+                                       'title': title})
             else:
-                ret['justifications']['warning'].append({'id': api_j.id,
-                                                         'old-offset': api_j.offset,
-                                                         'new-offset': spec.index(
-                                                             api_j.section),
-                                                         'title': api_j.justification.description})
-        else:
-            ret['justifications']['ko'].append({'id': api_j.id,
-                                                'title': api_j.justification.description})
+                ret[key]['warning'].append({'id': mapping.id,
+                                            'old-offset': mapping.offset,
+                                            'new-offset': offsets[0],
+                                            'title': title})
+            if len(offsets) > 1:
+                ret[key]['ambiguous'].append({'id': mapping.id,
+                                              'old-offset': mapping.offset,
+                                              'offsets': offsets,
+                                              'title': title})
+
     return ret
 
+
+def relocate_direct_work_items(db_session, api, spec, old_specs, min_similarity):
+    """
+    Map every direct mapping of api forward to spec
+    old_specs: candidate snapshots of the specification the mappings were
+               created against, the one matching more mappings is used
+    return: (for each work item type the mappings whose section is unchanged (ok),
+            found verbatim at another offset (moved), found with changes (edited)
+            or missing (lost), [(mapping, relocation)])
+    """
+    mappings = get_direct_mappings(db_session, api)
+    sections = [(x.section, x.offset) for key in mappings.keys() for x in mappings[key]]
+
+    old_spec = None
+    matches = 0
+    for candidate in old_specs:
+        candidate_matches = len([x for x in sections if candidate[x[1]:x[1] + len(x[0])] == x[0]])
+        if candidate_matches > matches:
+            old_spec = candidate
+            matches = candidate_matches
+
+    relocator = SectionRelocator(spec, old_spec, min_similarity)
+    ret = {'snapshot': old_spec is not None}
+    relocations = []
+    for key, model, item_key, title_key in DIRECT_WORK_ITEMS:
+        ret[key] = {SectionRelocator.OK: [],
+                    SectionRelocator.MOVED: [],
+                    SectionRelocator.EDITED: [],
+                    SectionRelocator.LOST: []}
+        for mapping in mappings[key]:
+            relocation = relocator.relocate(mapping.section, mapping.offset)
+            relocations.append((mapping, relocation))
+            tmp = {'id': mapping.id,
+                   'old-offset': mapping.offset,
+                   'new-offset': relocation['offset'],
+                   'similarity': relocation['similarity'],
+                   'title': getattr(getattr(mapping, item_key), title_key)}
+            if relocation['status'] == SectionRelocator.EDITED:
+                tmp['old-section'] = mapping.section
+                tmp['new-section'] = relocation['section']
+            ret[key][relocation['status']].append(tmp)
+    return ret, relocations
+
+
 class Token():
 
     def filter(self, token):
@@ -603,38 +598,155 @@ class Token():
 tokenManager = Token()
 
 
+def get_export_jobs():
+    """Export jobs of the SPDX exports, created on first use"""
+    global export_jobs
+    with export_jobs_lock:
+        if export_jobs is None:
+            export_jobs = ExportJobs(spdx_export_dir, workers=int(os.environ.get("BASIL_EXPORT_WORKERS", 2)))
+    return export_jobs
+
+
+def get_export_processes(broken_pool=None):
+    """Process pool of the SPDX exports, created on first use.
+    broken_pool, if it is still the current pool, is replaced by a new one.
+    """
+    global export_processes
+    with export_processes_lock:
+        if export_processes is None or export_processes is broken_pool:
+            export_processes = spdx_batch_export.process_pool(int(os.environ.get("BASIL_EXPORT_WORKERS", 2)))
+    return export_processes
+
+
+def run_spdx_export_job(job):
+    """Export job built by the export workers, in a process of the export pool.
+    A pool broken by a process terminated abruptly is replaced, so the next jobs can run.
+    """
+    pool = get_export_processes()
+    try:
+        report = pool.submit(spdx_batch_export.export_library, job['library'],
+                             spdx_export_dir, job['content_hash']).result()
+    except BrokenProcessPool:
+        get_export_processes(broken_pool=pool)
+        raise
+    if report['status'] == 'failed':
+        raise Exception(report['error'])
+
+
 class SPDXLibrary(Resource):
+    """SPDX export of a library.
+    POST starts an export job and returns it, with libraries a job per library.
+    GET with job-id returns the job status and with download the exported
+    document once the job is done.
+    GET with library returns the exported document if the library data didn't
+    change since the last export, otherwise it starts an export job and returns it.
+    """
     fields = ['library']
 
     def get(self):
-        from spdx_manager import SPDXManager
-        import datetime
-
         args = get_query_string_args(request.args)
+
+        if 'job-id' in args.keys():
+            job = get_export_jobs().get(args['job-id'])
+            if job is None:
+                return 'Export job not found', 404
+            if 'download' not in args.keys():
+                return job
+            if job['status'] != ExportJobs.DONE:
+                return 'Export job not completed', 409
+            return send_file(get_export_jobs().filepath(job))
+
+        if not check_fields_in_request(self.fields, args):
+            return 'bad request!', 400
+
         dbi = db_orm.DbInterface()
+        content_hash = spdx_manager.library_content_hash(dbi.session, args['library'])
+        job = get_export_jobs().submit(args['library'], content_hash, run_spdx_export_job)
+        if job['status'] != ExportJobs.DONE:
+            return job, 202
 
-        query = dbi.session.query(ApiModel).filter(
-            ApiModel.library == args['library']
-        )
-        apis = query.all()
+        return send_file(get_export_jobs().filepath(job))
 
-        spdxManager = SPDXManager(f"SPDX-{args['library'].upper()}-EXPORT")
-        for api in apis:
-            spdxManager.add_api_to_export(api.id)
-        dt = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    def post(self):
+        request_data = request.get_json(force=True)
+
+        dbi = db_orm.DbInterface()
+        if 'libraries' in request_data.keys():
+            # Many libraries, every library when the list is empty
+            libraries = request_data['libraries']
+            if not isinstance(libraries, list):
+                return 'bad request!', 400
+            if not libraries:
+                libraries = sorted([x.library for x in dbi.session.query(ApiModel.library).distinct()])
+            jobs = []
+            for library in libraries:
+                content_hash = spdx_manager.library_content_hash(dbi.session, library)
+                jobs.append(get_export_jobs().submit(library, content_hash, run_spdx_export_job))
+            return jobs, 202
+
+        if not check_fields_in_request(self.fields, request_data):
+            return 'bad request!', 400
+
+        content_hash = spdx_manager.library_content_hash(dbi.session, request_data['library'])
+        job = get_export_jobs().submit(request_data['library'], content_hash, run_spdx_export_job)
+        return job, 202
+
+
+class Search(Resource):
+    """Search of apis, work items and comments, best match first.
+    tables is an optional comma separated list of the tables to search,
+    limit the maximum number of results (default 50).
+    """
+    fields = ['search']
+
+    def get(self):
+        args = get_query_string_args(request.args)
+
+        if not check_fields_in_request(self.fields, args):
+            return 'bad request!', 400
+
+        term = args['search'].strip()
+        if not term:
+            return 'bad request!', 400
+
+        tables = None
+        if 'tables' in args.keys():
+            tables = [x.strip() for x in args['tables'].split(',') if x.strip()]
+            if [x for x in tables if x not in SEARCH_MODELS.keys()]:
+                return 'bad request!', 400
+
+        limit = 50
+        if args['limit'] != '':
+            try:
+                limit = int(args['limit'])
+            except ValueError:
+                return 'bad request!', 400
+            if limit <= 0:
+                return 'bad request!', 400
 
-        spdx_base_path = os.path.dirname(currentdir)
-        spdx_relative_path = f"app{os.sep}public{os.sep}spdx_export"
-        spdx_filename = f"{args['library']}-{dt}.json"
-        spdx_filepath = os.path.join(spdx_base_path, spdx_relative_path, spdx_filename)
-        for iRP in range(1, len(spdx_relative_path.split(os.sep))):
-            currentRelativePath = os.sep.join(spdx_relative_path.split(os.sep)[:iRP+1])
-            if not os.path.exists(os.path.join(spdx_base_path, currentRelativePath)):
-                os.mkdir(os.path.join(spdx_base_path, currentRelativePath))
+        dbi = db_orm.DbInterface()
+        results = search(dbi.session, term, tables, limit)
 
-        spdxManager.export(spdx_filepath)
+        # Read the rows found with a query per table
+        rows = {}
+        for table in set([x[0] for x in results]):
+            model = SEARCH_MODELS[table]
+            ids = [x[1] for x in results if x[0] == table]
+            for row in dbi.session.query(model).filter(model.id.in_(ids)):
+                rows[(table, row.id)] = row
 
-        return send_file(spdx_filepath)
+        ret = []
+        for table, id, rank in results:
+            row = rows[(table, id)]
+            tmp = {'table': table,
+                   'id': id,
+                   'rank': rank,
+                   'item': row.as_dict()}
+            if table == CommentModel.__tablename__:
+                tmp['parent_table'] = row.parent_table
+                tmp['parent_id'] = row.parent_id
+            ret.append(tmp)
+        return ret
 
 
 class Comment(Resource):
@@ -655,14 +767,11 @@ class Comment(Resource):
         )
 
         if "search" in args:
-            query = query.filter(or_(
-                CommentModel.comment.like(f'%{args["search"]}%'),
-                CommentModel.username.like(f'%{args["search"]}%')))
+            query = query.filter(search_clause(dbi.session, CommentModel, args["search"]))
 
         query = query.order_by(CommentModel.created_at.asc())
-        comments = [c.as_dict() for c in query.all()]
+        comments = [c.as_dict() for c in query.yield_per(db_orm.db_yield_per)]
 
-        dbi.engine.dispose()
         return comments
 
     def post(self):
@@ -693,7 +802,6 @@ class Comment(Resource):
         dbi.session.add(new_comment)
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return new_comment.as_dict()
 
 
@@ -725,13 +833,49 @@ class CheckSpecification(Resource):
             spec = get_api_specification(api.raw_specification_url)
 
         ret = check_direct_work_items_against_another_spec_file(dbi.session, spec, api)
-        dbi.engine.dispose()
         return ret
 
 
 class FixNewSpecificationWarnings(Resource):
+    """Move the direct mappings whose section is found at another offset
+    of the api specification (warnings of CheckSpecification).
+    All the mappings are updated in a single transaction, with one UPDATE
+    and one history INSERT per table.
+    POST with dry-run returns the planned changes without applying them.
+    """
     fields = ['id']
 
+    def fix(self, dbi, api_id, dry_run):
+        """
+        return: for each work item type the planned changes, None if the api doesn't exist
+        """
+        query = dbi.session.query(ApiModel).filter(
+            ApiModel.id == api_id
+        )
+        apis = query.all()
+
+        if len(apis) != 1:
+            return None
+
+        api = apis[0]
+
+        spec = get_api_specification(api.raw_specification_url)
+
+        analysis = check_direct_work_items_against_another_spec_file(dbi.session, spec, api)
+
+        ret = {}
+        for key, model, item_key, title_key in DIRECT_WORK_ITEMS:
+            ret[key] = analysis[key]['warning']
+            if not dry_run:
+                bulk_update(dbi.session.connection(), model.__table__,
+                            [{'id': x['id'], 'offset': x['new-offset']} for x in ret[key]])
+        if not dry_run:
+            # Offsets don't affect the stored coverage
+            dbi.session.commit()
+            # bulk_update doesn't emit the mapper events
+            response_cache.invalidate([api.id])
+        return ret
+
     def get(self):
 
         args = get_query_string_args(request.args)
@@ -740,6 +884,41 @@ class FixNewSpecificationWarnings(Resource):
             return 'bad request!', 400
 
         dbi = db_orm.DbInterface()
+        if self.fix(dbi, args['id'], False) is None:
+            return "Unable to find the api", 400
+
+        return True
+
+    def post(self):
+        request_data = request.get_json(force=True)
+
+        if not check_fields_in_request(self.fields, request_data):
+            return 'bad request!', 400
+
+        dbi = db_orm.DbInterface()
+        dry_run = request_data.get('dry-run', False) in [True, 1, '1', 'true', 'True']
+        ret = self.fix(dbi, request_data['id'], dry_run)
+        if ret is None:
+            return "Unable to find the api", 400
+
+        ret['dry-run'] = dry_run
+        return ret
+
+
+class RelocateSpecificationMappings(Resource):
+    """Relocate the direct mappings of an api on a new version of its specification.
+    The old version is read from old-url if provided, otherwise from the api
+    specification when url is provided or from the previous versions of the api
+    specification in the cache.
+    GET returns the relocation, POST applies it in a single transaction.
+    """
+    fields = ['id']
+
+    def relocate(self, dbi, args):
+        try:
+            min_similarity = float(args.get('min-similarity', 0.6))
+        except ValueError:
+            return None, None
 
         query = dbi.session.query(ApiModel).filter(
             ApiModel.id == args['id']
@@ -747,52 +926,65 @@ class FixNewSpecificationWarnings(Resource):
         apis = query.all()
 
         if len(apis) != 1:
-            return "Unable to find the api", 400
+            return None, None
 
         api = apis[0]
 
-        spec = get_api_specification(api.raw_specification_url)
+        old_specs = []
+        if 'old-url' in args.keys():
+            old_specs.append(get_api_specification(args['old-url']))
+        if 'url' in args.keys():
+            spec = get_api_specification(args['url'])
+            old_specs.append(get_api_specification(api.raw_specification_url))
+        else:
+            spec = get_api_specification(api.raw_specification_url)
+        if api.raw_specification_url and api.raw_specification_url.strip().startswith("http"):
+            old_specs += specification_cache.previous_versions(api.raw_specification_url.strip())
 
-        analysis = check_direct_work_items_against_another_spec_file(dbi.session, spec, api)
+        if spec is None:
+            return None, None
 
-        #ApiSwRequirements
-        for i in range(len(analysis['sw-requirements']['warning'])):
-            sr_all = dbi.session.query(ApiSwRequirementModel).filter(
-                ApiSwRequirementModel.id == analysis['sw-requirements']['warning'][i]['id']
-            ).all()
-            if len(sr_all) == 1:
-                sr_all[0].offset = analysis['sw-requirements']['warning'][i]['new-offset']
-                dbi.session.commit()
-
-        # ApiTestSpecification
-        for i in range(len(analysis['test-specifications']['warning'])):
-            ts_all = dbi.session.query(ApiTestSpecificationModel).filter(
-                ApiTestSpecificationModel.id == analysis['test-specifications']['warning'][i]['id']
-            ).all()
-            if len(ts_all) == 1:
-                ts_all[0].offset = analysis['test-specifications']['warning'][i]['new-offset']
-                dbi.session.commit()
-
-        # ApiTestCase
-        for i in range(len(analysis['test-cases']['warning'])):
-            tc_all = dbi.session.query(ApiTestCaseModel).filter(
-                ApiTestCaseModel.id == analysis['test-cases']['warning'][i]['id']
-            ).all()
-            if len(tc_all) == 1:
-                tc_all[0].offset = analysis['test-cases']['warning'][i]['new-offset']
-                dbi.session.commit()
-
-        # ApiJustification
-        for i in range(len(analysis['justifications']['warning'])):
-            j_all = dbi.session.query(ApiJustificationModel).filter(
-                ApiJustificationModel.id == analysis['justifications']['warning'][i]['id']
-            ).all()
-            if len(j_all) == 1:
-                j_all[0].offset = analysis['justifications']['warning'][i]['new-offset']
-                dbi.session.commit()
+        return relocate_direct_work_items(dbi.session, api, spec,
+                                          [x for x in old_specs if x is not None],
+                                          min_similarity)
 
-        dbi.engine.dispose()
-        return True
+    def get(self):
+        args = get_query_string_args(request.args)
+
+        if not check_fields_in_request(self.fields, args):
+            return 'bad request!', 400
+
+        dbi = db_orm.DbInterface()
+        ret, relocations = self.relocate(dbi, args)
+        if ret is None:
+            return 'bad request!', 400
+        return ret
+
+    def post(self):
+        request_data = request.get_json(force=True)
+
+        if not check_fields_in_request(self.fields, request_data):
+            return 'bad request!', 400
+
+        dbi = db_orm.DbInterface()
+        ret, relocations = self.relocate(dbi, request_data)
+        if ret is None:
+            return 'bad request!', 400
+
+        rows = {}
+        for mapping, relocation in relocations:
+            if relocation['status'] in [SectionRelocator.MOVED, SectionRelocator.EDITED]:
+                rows.setdefault(type(mapping), []).append({'id': mapping.id,
+                                                           'section': relocation['section'],
+                                                           'offset': relocation['offset']})
+        for model in rows.keys():
+            bulk_update(dbi.session.connection(), model.__table__, rows[model])
+        # Sections and offsets don't affect the stored coverage
+        dbi.session.commit()
+        # bulk_update doesn't emit the mapper events
+        response_cache.invalidate([mapping.api_id for mapping, relocation in relocations])
+
+        return ret
 
 
 class Api(Resource):
@@ -812,7 +1004,7 @@ class Api(Resource):
         query = dbi.session.query(ApiModel)
 
         for arg_key in args.keys():
-            if "field" in arg_key:
+            if "field" in arg_key and arg_key != "fields":
                 field_n = arg_key.replace('field', '')
                 field = args[f'field{field_n}']
                 filter = args[f'filter{field_n}']
@@ -824,34 +1016,65 @@ class Api(Resource):
                     query = query.filter(ApiModel.id == filter)
 
             if arg_key == "search":
-                query = query.filter(or_(ApiModel.api.like(f'%{args["search"]}%'),
-                                         ApiModel.category.like(f'%{args["search"]}%'),
-                                         ApiModel.tags.like(f'%{args["search"]}%'),
-                                         ApiModel.library_version.like(f'%{args["search"]}%'),
-                                         ApiModel.raw_specification_url.like(f'%{args["search"]}%'),
-                                         ApiModel.implementation_file.like(f'%{args["search"]}%'),
-                                         ))
+                query = query.filter(search_clause(dbi.session, ApiModel, args["search"]))
 
+        # Pagination: limit and an opaque cursor on (api, library_version, id)
+        # the next page cursor is returned in the X-Next-Cursor header
+        limit = None
+        if args["limit"] != "":
+            try:
+                limit = int(args["limit"])
+            except ValueError:
+                return 'bad request!', 400
+            if limit <= 0:
+                return 'bad request!', 400
+
+        if "cursor" in args.keys():
+            try:
+                cursor_api, cursor_version, cursor_id = decode_cursor(args["cursor"])
+            except (ValueError, TypeError):
+                return 'bad request!', 400
+            query = query.filter(or_(ApiModel.api > cursor_api,
+                                     and_(ApiModel.api == cursor_api,
+                                          ApiModel.library_version > cursor_version),
+                                     and_(ApiModel.api == cursor_api,
+                                          ApiModel.library_version == cursor_version,
+                                          ApiModel.id > cursor_id)))
+
+        query = query.order_by(ApiModel.api.asc(),
+                               ApiModel.library_version.asc(),
+                               ApiModel.id.asc())
+        if limit is not None:
+            query = query.limit(limit + 1)
+
+        # The rows are all needed, for the cursor of the next page and the coverage of the page
         apis = query.all()
 
-        if len(apis):
-            apis_dict = [x.as_dict(db_session=dbi.session) for x in apis]
+        headers = {}
+        if limit is not None and len(apis) > limit:
+            apis = apis[:limit]
+            headers['X-Next-Cursor'] = encode_cursor([apis[-1].api, apis[-1].library_version, apis[-1].id])
 
-        total_coverage = -1
-        for iApi in range(len(apis)):
-            sections = get_api_sw_requirements_mapping_sections(dbi, apis[iApi])
-            if sections is not None:
-                if 'mapped' in sections.keys():
-                    total_coverage = get_api_coverage(sections['mapped'])
-                    apis_dict[iApi]['coverage'] = total_coverage
+        # Projection: fields=id,api,coverage returns only the selected keys
+        fields = None
+        if "fields" in args.keys():
+            fields = [x.strip() for x in args["fields"].split(",") if x.strip()]
 
-        if total_coverage == -1:
-            total_coverage = 0
+        for api in apis:
+            api_dict = api.as_dict()
+            if fields is None or 'version' in fields:
+                api_dict['version'] = api.current_version(dbi.session)
+            apis_dict.append(api_dict)
 
-        ret = apis_dict
-        ret = sorted(ret, key=lambda api: (api['api'], api['library_version']))
-        dbi.engine.dispose()
-        return ret
+        if fields is None or 'coverage' in fields:
+            coverage = get_apis_sections_coverage(dbi, apis)
+            for iApi in range(len(apis)):
+                apis_dict[iApi]['coverage'] = coverage[apis[iApi].id]
+
+        if fields is not None:
+            apis_dict = [{k: v for k, v in x.items() if k in fields} for x in apis_dict]
+
+        return apis_dict, 200, headers
 
     def post(self):
         """
@@ -874,7 +1097,6 @@ class Api(Resource):
         ).all()
 
         if len(api) > 0:
-            dbi.engine.dispose()
             return 'Api is already in the db for the selected library', 409
 
         if request_data['action'] == 'fork':
@@ -901,58 +1123,12 @@ class Api(Resource):
         dbi.session.add(new_api)
 
         if request_data['action'] == 'fork':
-            dbi.session.commit()  # to read the id
+            dbi.session.flush()  # to read the id
 
-            # Clone ApiJustification
-            api_justifications = dbi.session.query(ApiJustificationModel).filter(
-                ApiJustificationModel.api_id == source_api[0].id
-            ).all()
-            for api_justification in api_justifications:
-                tmp = ApiJustificationModel(new_api,
-                                            api_justification.justification,
-                                            api_justification.section,
-                                            api_justification.offset,
-                                            api_justification.coverage)
-                dbi.session.add(tmp)
-
-            # Clone ApiSwRequirement
-            api_sw_requirements = dbi.session.query(ApiSwRequirementModel).filter(
-                ApiSwRequirementModel.api_id == source_api[0].id
-            ).all()
-            for api_sw_requirement in api_sw_requirements:
-                tmp = ApiSwRequirementModel(new_api,
-                                            api_sw_requirement.sw_requirement,
-                                            api_sw_requirement.section,
-                                            api_sw_requirement.offset,
-                                            api_sw_requirement.coverage)
-                dbi.session.add(tmp)
-
-            # Clone ApiTestSpecification
-            api_test_specifications = dbi.session.query(ApiTestSpecificationModel).filter(
-                ApiTestSpecificationModel.api_id == source_api[0].id
-            ).all()
-            for api_test_specification in api_test_specifications:
-                tmp = ApiTestSpecificationModel(new_api,
-                                                api_test_specification.test_specification,
-                                                api_test_specification.section,
-                                                api_test_specification.offset,
-                                                api_test_specification.coverage)
-                dbi.session.add(tmp)
-
-            # Clone ApiTestCase
-            api_test_cases = dbi.session.query(ApiTestCaseModel).filter(
-                ApiTestCaseModel.api_id == source_api[0].id
-            ).all()
-            for api_test_case in api_test_cases:
-                tmp = ApiTestCaseModel(new_api,
-                                       api_test_case.test_case,
-                                       api_test_case.section,
-                                       api_test_case.offset,
-                                       api_test_case.coverage)
-                dbi.session.add(tmp)
+            # Clone direct and indirect mappings
+            fork_api_mappings(dbi.session.connection(), source_api[0].id, new_api.id)
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return new_api.as_dict()
 
     def put(self):
@@ -972,7 +1148,6 @@ class Api(Resource):
         api = get_api_from_request(request_data, dbi.session)
 
         if not api:
-            dbi.engine.dispose()
             return 'Api not in the db', 404
 
         # Check that the new api+library+library_version is not already in the db
@@ -986,7 +1161,6 @@ class Api(Resource):
             ApiModel.id != request_data['api-id']).all()
 
         if len(same_existing_apis) > 0:
-            dbi.engine.dispose()
             return 'An Api with selected name and library already exist in the db', 409
 
         if request_data['api'] != api.api:
@@ -1017,7 +1191,6 @@ class Api(Resource):
             api.tags = request_data['tags']
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return api.as_dict()
 
 
@@ -1066,7 +1239,6 @@ class ApiHistory(Resource):
                 break
 
         if not first_found:
-            dbi.engine.dispose()
             return []
 
         ret.append(get_combined_history_object(first_obj, {}, _model_fields, []))
@@ -1078,7 +1250,6 @@ class ApiHistory(Resource):
 
         ret = get_reduced_history_data(ret, _model_fields, [])
         ret = ret[::-1]
-        dbi.engine.dispose()
         return ret
 
 
@@ -1092,7 +1263,6 @@ class Library(Resource):
         # args = get_query_string_args(request.args)
         dbi = db_orm.DbInterface()
         libraries = dbi.session.query(ApiModel.library).distinct().all()
-        dbi.engine.dispose()
         return sorted([x.library for x in libraries])
 
 
@@ -1110,20 +1280,19 @@ class ApiSpecification(Resource):
 
         api = get_api_from_request(args, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         spec = get_api_specification(api.raw_specification_url)
 
         ret = api.as_dict()
         ret['raw_specification'] = spec
-        dbi.engine.dispose()
         return ret
 
 
 class ApiTestSpecificationsMapping(Resource):
     fields = ['api-id', 'test-specification', 'section', 'coverage']
 
+    @conditional_mapping_view
     def get(self):
         """
         curl <API_URL>/api/test-specifications?api-id=<api-id>
@@ -1132,43 +1301,21 @@ class ApiTestSpecificationsMapping(Resource):
         if not check_fields_in_request(['api-id'], args):
             return 'bad request!', 400
 
-        undesired_keys = ['section', 'offset']
-
         dbi = db_orm.DbInterface()
 
         # Find api
         api = get_api_from_request(args, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         api_specification = get_api_specification(api.raw_specification_url)
         if api_specification == None:
-            return []
-
-        ts = dbi.session.query(ApiTestSpecificationModel).filter(
-            ApiTestSpecificationModel.api_id == api.id).order_by(
-            ApiTestSpecificationModel.offset.asc()).all()
-        ts_mapping = [x.as_dict(db_session=dbi.session) for x in ts]
-
-        justifications = dbi.session.query(ApiJustificationModel).filter(
-            ApiJustificationModel.api_id == api.id).order_by(
-            ApiJustificationModel.offset.asc()).all()
-        justifications_mapping = [x.as_dict(db_session=dbi.session) for x in justifications]
+            return [], 200
 
+        loader = MappingTreeLoader(dbi.session, api)
         mapping = {_A: api.as_dict(),
-                   _TSs: ts_mapping,
-                   _Js: justifications_mapping}
-
-        for iTS in range(len(mapping[_TSs])):
-            # Indirect Test Cases
-            curr_ats_id = mapping[_TSs][iTS]['relation_id']
-
-            ind_tc = dbi.session.query(TestSpecificationTestCaseModel).filter(
-                TestSpecificationTestCaseModel.test_specification_mapping_api_id == curr_ats_id
-            ).all()
-            mapping[_TSs][iTS][_TS][_TCs] = [get_dict_without_keys(x.as_dict(db_session=dbi.session),
-                                                                   undesired_keys + ['api']) for x in ind_tc]
+                   _TSs: loader.test_specifications(),
+                   _Js: loader.justifications()}
 
         for iMapping in range(len(mapping[_TSs])):
             current_offset = mapping[_TSs][iMapping]['offset']
@@ -1187,7 +1334,6 @@ class ApiTestSpecificationsMapping(Resource):
         ret = {'mapped': mapped_sections,
                'unmapped': unmapped_sections}
 
-        dbi.engine.dispose()
         return ret
 
     def post(self):
@@ -1201,7 +1347,6 @@ class ApiTestSpecificationsMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         section = request_data['section']
@@ -1213,7 +1358,6 @@ class ApiTestSpecificationsMapping(Resource):
             # Create a new one
             for check_field in TestSpecification.fields:
                 if check_field.replace("_", "-") not in request_data['test-specification'].keys():
-                    dbi.engine.dispose()
                     return "Bad request. Unconsistend data.", 400
 
             title = request_data['test-specification']['title']
@@ -1226,7 +1370,6 @@ class ApiTestSpecificationsMapping(Resource):
                 TestSpecificationModel.preconditions == preconditions).filter(
                 TestSpecificationModel.test_description == test_description).filter(
                 TestSpecificationModel.expected_behavior == expected_behavior).all()) > 0:
-                dbi.engine.dispose()
                 return "Test Specification already associated to the selected api Specification section.", 409
 
             new_test_specification = TestSpecificationModel(request_data['test-specification']['title'],
@@ -1248,7 +1391,6 @@ class ApiTestSpecificationsMapping(Resource):
                     ApiTestSpecificationModel.api_id == api.id).filter(
                 ApiTestSpecificationModel.test_specification_id == id).filter(
                 ApiTestSpecificationModel.section == section).all()) > 0:
-                dbi.engine.dispose()
                 return "Test Specification already associated to the selected api Specification section.", 409
 
             existing_test_specification = dbi.session.query(TestSpecificationModel).filter(
@@ -1262,7 +1404,6 @@ class ApiTestSpecificationsMapping(Resource):
             dbi.session.add(new_test_specification_mapping_api)
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return new_test_specification_mapping_api.as_dict()
 
     def put(self):
@@ -1277,7 +1418,6 @@ class ApiTestSpecificationsMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         test_specification_mapping_api = dbi.session.query(ApiTestSpecificationModel).filter(
@@ -1307,7 +1447,6 @@ class ApiTestSpecificationsMapping(Resource):
             test_specification_mapping_api.coverage = int(request_data["coverage"])
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return test_specification_mapping_api.as_dict()
 
     def delete(self):
@@ -1321,14 +1460,12 @@ class ApiTestSpecificationsMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         # check if api ...
         test_specification_mapping_api = dbi.session.query(ApiTestSpecificationModel).filter(
             ApiTestSpecificationModel.id == request_data["relation-id"]).one()
         if test_specification_mapping_api.api.id != api.id:
-            dbi.engine.dispose()
             return 'bad request!', 401
 
         dbi.session.delete(test_specification_mapping_api)
@@ -1344,13 +1481,13 @@ class ApiTestSpecificationsMapping(Resource):
         """
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return True
 
 
 class ApiTestCasesMapping(Resource):
     fields = ['api-id', 'test-case', 'section', 'coverage']
 
+    @conditional_mapping_view
     def get(self):
         """
         curl <API_URL>/api/test-cases?api-id=<api-id>
@@ -1367,26 +1504,16 @@ class ApiTestCasesMapping(Resource):
         # Find api
         api = get_api_from_request(args, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         api_specification = get_api_specification(api.raw_specification_url)
         if api_specification is None:
-            return []
-
-        tc = dbi.session.query(ApiTestCaseModel).filter(
-            ApiTestCaseModel.api_id == api.id).order_by(
-            ApiTestCaseModel.offset.asc()).all()
-        tc_mapping = [x.as_dict(db_session=dbi.session) for x in tc]
-
-        justifications = dbi.session.query(ApiJustificationModel).filter(
-            ApiJustificationModel.api_id == api.id).order_by(
-            ApiJustificationModel.offset.asc()).all()
-        justifications_mapping = [x.as_dict(db_session=dbi.session) for x in justifications]
+            return [], 200
 
+        loader = MappingTreeLoader(dbi.session, api)
         mapping = {_A: api.as_dict(),
-                   _TCs: tc_mapping,
-                   _Js: justifications_mapping}
+                   _TCs: loader.test_cases(),
+                   _Js: loader.justifications()}
 
         for iMapping in range(len(mapping[_TCs])):
             current_offset = mapping[_TCs][iMapping]['offset']
@@ -1405,7 +1532,6 @@ class ApiTestCasesMapping(Resource):
         ret = {'mapped': mapped_sections,
                'unmapped': unmapped_sections}
 
-        dbi.engine.dispose()
         return ret
 
     def post(self):
@@ -1419,7 +1545,6 @@ class ApiTestCasesMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         section = request_data['section']
@@ -1431,7 +1556,6 @@ class ApiTestCasesMapping(Resource):
             # Create a new one
             for check_field in TestCase.fields:
                 if check_field.replace("_", "-") not in request_data['test-case'].keys():
-                    dbi.engine.dispose()
                     return "Bad request. Not consistent data.", 400
 
             repository = request_data['test-case']['repository']
@@ -1444,7 +1568,6 @@ class ApiTestCasesMapping(Resource):
                     ApiTestCaseModel.section == section).filter(
                 TestCaseModel.repository == repository).filter(
                 TestCaseModel.relative_path == relative_path).all()) > 0:
-                dbi.engine.dispose()
                 return "Test Case already associated to the current api.", 409
 
             new_test_case = TestCaseModel(repository, relative_path,
@@ -1461,7 +1584,6 @@ class ApiTestCasesMapping(Resource):
             id = request_data['test-case']['id']
             if len(dbi.session.query(ApiTestCaseModel).filter(ApiTestCaseModel.api_id == api.id).filter(
                     ApiTestCaseModel.test_case_id == id).filter(ApiTestCaseModel.section == section).all()) > 0:
-                dbi.engine.dispose()
                 return "Test Case already associated to the selected api Specification section.", 409
 
             existing_test_case = dbi.session.query(TestCaseModel).filter(TestCaseModel.id == id).one()
@@ -1474,7 +1596,6 @@ class ApiTestCasesMapping(Resource):
             dbi.session.add(new_test_case_mapping_api)
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return new_test_case_mapping_api.as_dict()
 
     def put(self):
@@ -1488,7 +1609,6 @@ class ApiTestCasesMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         try:
@@ -1496,7 +1616,6 @@ class ApiTestCasesMapping(Resource):
                 ApiTestCaseModel.id == request_data["relation-id"]).one()
             test_case = test_case_mapping_api.test_case
         except:
-            dbi.engine.dispose()
             return "Test Case mapping api not found", 400
 
         # Update only modified fields
@@ -1522,7 +1641,6 @@ class ApiTestCasesMapping(Resource):
             test_case_mapping_api.coverage = int(request_data["coverage"])
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return test_case_mapping_api.as_dict()
 
     def delete(self):
@@ -1536,14 +1654,12 @@ class ApiTestCasesMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         # check if api ...
         test_case_mapping_api = dbi.session.query(ApiTestCaseModel).filter(
             ApiTestCaseModel.id == request_data["relation-id"]).one()
         if test_case_mapping_api.api.id != api.id:
-            dbi.engine.dispose()
             return 'bad request!', 401
 
         dbi.session.delete(test_case_mapping_api)
@@ -1559,7 +1675,6 @@ class ApiTestCasesMapping(Resource):
         """
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return True
 
 
@@ -1569,7 +1684,6 @@ class MappingHistory(Resource):
         dbi = db_orm.DbInterface()
 
         if 'work_item_type' not in args.keys() or 'mapped_to_type' not in args.keys() or 'relation_id' not in args.keys():
-            dbi.engine.dispose()
             return []
 
         if args['mapped_to_type'] == "api":
@@ -1594,7 +1708,6 @@ class MappingHistory(Resource):
                 _model_map_history = ApiTestCaseHistoryModel
                 _model_history = TestCaseHistoryModel
             else:
-                dbi.engine.dispose()
                 return []
 
         elif args['mapped_to_type'] == "sw-requirement":
@@ -1609,7 +1722,6 @@ class MappingHistory(Resource):
                 _model_map_history = SwRequirementTestCaseHistoryModel
                 _model_history = TestCaseHistoryModel
             else:
-                dbi.engine.dispose()
                 return []
 
         elif args['mapped_to_type'] == "test-specification":
@@ -1619,10 +1731,8 @@ class MappingHistory(Resource):
                 _model_map_history = TestSpecificationTestCaseHistoryModel
                 _model_history = TestCaseHistoryModel
             else:
-                dbi.engine.dispose()
                 return []
         else:
-            dbi.engine.dispose()
             return []
 
         _model_fields = _model.__table__.columns.keys()
@@ -1630,7 +1740,6 @@ class MappingHistory(Resource):
 
         relation_rows = dbi.session.query(_model_map).filter(_model_map.id == args['relation_id']).all()
         if len(relation_rows) != 1:
-            dbi.engine.dispose()
             return []
 
         relation_row = relation_rows[0].as_dict()
@@ -1694,7 +1803,6 @@ class MappingHistory(Resource):
                 break
 
         if not first_found:
-            dbi.engine.dispose()
             return []
 
         ret.append(get_combined_history_object(first_obj, first_map, _model_fields, _model_map_fields))
@@ -1711,7 +1819,6 @@ class MappingHistory(Resource):
 
         ret = get_reduced_history_data(ret, _model_fields, _model_map_fields)
         ret = ret[::-1]
-        dbi.engine.dispose()
         return ret
 
 
@@ -1726,7 +1833,6 @@ class MappingUsage(Resource):
         dbi = db_orm.DbInterface()
 
         if 'work_item_type' not in args.keys() or 'id' not in args.keys():
-            dbi.engine.dispose()
             return []
 
         _id = args['id']
@@ -1826,7 +1932,6 @@ class ApiSpecificationsMapping(Resource):
         # Find api
         api = get_api_from_request(args, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         api_specification = get_api_specification(api.raw_specification_url)
@@ -1845,13 +1950,13 @@ class ApiSpecificationsMapping(Resource):
         ret = {'mapped': mapped_sections,
                'unmapped': unmapped_sections}
 
-        dbi.engine.dispose()
         return ret
 
 
 class ApiJustificationsMapping(Resource):
     fields = ['api-id', 'justification', 'section', 'offset', 'coverage']
 
+    @conditional_mapping_view
     def get(self):
         """
         curl <API_URL>/api/justifications?api-id=<api-id>
@@ -1868,20 +1973,15 @@ class ApiJustificationsMapping(Resource):
         # Find api
         api = get_api_from_request(args, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         api_specification = get_api_specification(api.raw_specification_url)
         if api_specification == None:
-            return []
-
-        justifications = dbi.session.query(ApiJustificationModel).filter(
-            ApiJustificationModel.api_id == api.id).order_by(
-            ApiJustificationModel.offset.asc()).all()
-        justifications_mapping = [x.as_dict(db_session=dbi.session) for x in justifications]
+            return [], 200
 
+        loader = MappingTreeLoader(dbi.session, api)
         mapping = {_A: api.as_dict(),
-                   _Js: justifications_mapping}
+                   _Js: loader.justifications()}
 
         for iMapping in range(len(mapping[_Js])):
             current_offset = mapping[_Js][iMapping]['offset']
@@ -1894,7 +1994,6 @@ class ApiJustificationsMapping(Resource):
         ret = {'mapped': mapped_sections,
                'unmapped': unmapped_sections}
 
-        dbi.engine.dispose()
         return ret
 
     def post(self):
@@ -1908,7 +2007,6 @@ class ApiJustificationsMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         section = request_data['section']
@@ -1930,7 +2028,6 @@ class ApiJustificationsMapping(Resource):
             if len(dbi.session.query(ApiJustificationModel).filter(ApiJustificationModel.api_id == api.id).filter(
                     ApiJustificationModel.justification_id == id).filter(
                 ApiJustificationModel.section == section).all()) > 0:
-                dbi.engine.dispose()
                 return "Justification already associated to the selected api Specification section.", 409
 
             existing_justification = dbi.session.query(JustificationModel).filter(JustificationModel.id == id).one()
@@ -1943,7 +2040,6 @@ class ApiJustificationsMapping(Resource):
             dbi.session.add(new_justification_mapping_api)
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return new_justification_mapping_api.as_dict()
 
     def put(self):
@@ -1957,7 +2053,6 @@ class ApiJustificationsMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         # check if api ...
@@ -1979,7 +2074,6 @@ class ApiJustificationsMapping(Resource):
             justification_mapping_api.coverage = request_data["coverage"]
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return justification_mapping_api.as_dict()
 
     def delete(self):
@@ -1993,7 +2087,6 @@ class ApiJustificationsMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         # check if api ...
@@ -2001,13 +2094,11 @@ class ApiJustificationsMapping(Resource):
             ApiJustificationModel.id == request_data["relation-id"]).all()
 
         if len(justification_mapping_api) != 1:
-            dbi.engine.dispose()
             return 'bad request!', 401
 
         justification_mapping_api = justification_mapping_api[0]
 
         if justification_mapping_api.api.id != api.id:
-            dbi.engine.dispose()
             return 'bad request!', 401
 
         dbi.session.delete(justification_mapping_api)
@@ -2023,13 +2114,13 @@ class ApiJustificationsMapping(Resource):
         """
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return True
 
 
 class ApiSwRequirementsMapping(Resource):
     fields = ['api-id', 'sw-requirement', 'section', 'coverage']
 
+    @conditional_mapping_view
     def get(self):
         """
         curl <API_URL>/api/sw-requirements?api-id=<api-id>
@@ -2045,11 +2136,13 @@ class ApiSwRequirementsMapping(Resource):
         # Find api
         api = get_api_from_request(args, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
-        ret = get_api_sw_requirements_mapping_sections(dbi, api)
-        dbi.engine.dispose()
+        api_specification = get_api_specification(api.raw_specification_url)
+        ret = get_api_sw_requirements_mapping_sections(dbi, api, api_specification)
+        if api_specification == None:
+            # Not cached, see conditional_mapping_view
+            return ret, 200
         return ret
 
     def post(self):
@@ -2063,7 +2156,6 @@ class ApiSwRequirementsMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         section = request_data['section']
@@ -2075,7 +2167,6 @@ class ApiSwRequirementsMapping(Resource):
             # Create a new one
             for check_field in SwRequirement.fields:
                 if check_field.replace("_", "-") not in request_data['sw-requirement'].keys():
-                    dbi.engine.dispose()
                     return "Bad request. Not consistent data.", 400
 
             title = request_data['sw-requirement']['title']
@@ -2084,7 +2175,6 @@ class ApiSwRequirementsMapping(Resource):
             if len(dbi.session.query(SwRequirementModel).filter(
                     SwRequirementModel.title == title).filter(
                 SwRequirementModel.description == description).all()) > 0:
-                dbi.engine.dispose()
                 return "SW Requirement already associated to the selected api Specification section.", 409
 
             new_sw_requirement = SwRequirementModel(request_data['sw-requirement']['title'],
@@ -2104,7 +2194,6 @@ class ApiSwRequirementsMapping(Resource):
                     ApiSwRequirementModel.api_id == api.id).filter(
                 ApiSwRequirementModel.sw_requirement_id == id).filter(
                 ApiSwRequirementModel.section == section).all()) > 0:
-                dbi.engine.dispose()
                 return "SW Requirement already associated to the selected api Specification section.", 409
 
             existing_sw_requirement = dbi.session.query(SwRequirementModel).filter(
@@ -2118,7 +2207,6 @@ class ApiSwRequirementsMapping(Resource):
             dbi.session.add(new_sw_requirement_mapping_api)
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return new_sw_requirement_mapping_api.as_dict()
 
     def put(self):
@@ -2132,7 +2220,6 @@ class ApiSwRequirementsMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         sw_requirement_mapping_api = dbi.session.query(ApiSwRequirementModel).filter(
@@ -2156,7 +2243,6 @@ class ApiSwRequirementsMapping(Resource):
             sw_requirement_mapping_api.coverage = int(request_data["coverage"])
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return sw_requirement_mapping_api.as_dict()
 
     def delete(self):
@@ -2170,14 +2256,12 @@ class ApiSwRequirementsMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         # check if api ...
         sw_requirement_mapping_api = dbi.session.query(ApiSwRequirementModel).filter(
             ApiSwRequirementModel.id == request_data["relation-id"]).one()
         if sw_requirement_mapping_api.api.id != api.id:
-            dbi.engine.dispose()
             return 'bad request!', 401
 
         dbi.session.delete(sw_requirement_mapping_api)
@@ -2193,7 +2277,6 @@ class ApiSwRequirementsMapping(Resource):
         """
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return True
 
 
@@ -2213,7 +2296,7 @@ class Justification(Resource):
 
         filter_by_id = False
         for arg_key in args.keys():
-            if "field" in arg_key:
+            if "field" in arg_key and arg_key != "fields":
                 field_n = arg_key.replace('field', '')
                 field = args[f'field{field_n}']
                 filter = args[f'filter{field_n}']
@@ -2222,28 +2305,26 @@ class Justification(Resource):
                     break
         if filter_by_id:
             query = query.filter(JustificationModel.id == filter)
-            dbi.engine.dispose()
-            return [ju.as_dict() for ju in query.all()]
+            return [ju.as_dict() for ju in query.yield_per(db_orm.db_yield_per)]
 
         for arg_key in args.keys():
-            if "field" in arg_key:
+            if "field" in arg_key and arg_key != "fields":
                 field_n = arg_key.replace('field', '')
                 field = args[f'field{field_n}']
                 filter = args[f'filter{field_n}']
                 if field == 'description':
-                    query = query.filter(JustificationModel.description.like(f'%{filter}%'))
+                    query = query.filter(JustificationModel.description.ilike(f'%{filter}%'))
 
             if arg_key == "search":
-                query = query.filter(JustificationModel.description.like(f'%{args["search"]}%'))
+                query = query.filter(search_clause(dbi.session, JustificationModel, args["search"]))
 
-        jus = [ju.as_dict() for ju in query.all()]
+        jus = [ju.as_dict() for ju in query.yield_per(db_orm.db_yield_per)]
 
         if 'mode' in args.keys():
             if args['mode'] == 'minimal':
                 minimal_keys = ['id', 'description']
                 jus = [{key: val for key, val in sub.items() if key in minimal_keys} for sub in jus]
 
-        dbi.engine.dispose()
         return jus
 
 
@@ -2274,7 +2355,7 @@ class TestSpecification(Resource):
 
         filter_by_id = False
         for arg_key in args.keys():
-            if "field" in arg_key:
+            if "field" in arg_key and arg_key != "fields":
                 field_n = arg_key.replace('field', '')
                 field = args[f'field{field_n}']
                 filter = args[f'filter{field_n}']
@@ -2283,38 +2364,32 @@ class TestSpecification(Resource):
                     break
         if filter_by_id:
             query = query.filter(TestSpecificationModel.id == filter)
-            dbi.engine.dispose()
-            return [ts.as_dict() for ts in query.all()]
+            return [ts.as_dict() for ts in query.yield_per(db_orm.db_yield_per)]
 
         for arg_key in args.keys():
-            if "field" in arg_key:
+            if "field" in arg_key and arg_key != "fields":
                 field_n = arg_key.replace('field', '')
                 field = args[f'field{field_n}']
                 filter = args[f'filter{field_n}']
                 if field == 'title':
-                    query = query.filter(TestSpecificationModel.title.like(f'%{filter}%'))
+                    query = query.filter(TestSpecificationModel.title.ilike(f'%{filter}%'))
                 elif field == 'preconditions':
-                    query = query.filter(TestSpecificationModel.preconditions.like(f'%{filter}%'))
+                    query = query.filter(TestSpecificationModel.preconditions.ilike(f'%{filter}%'))
                 elif field == 'test-description':
-                    query = query.filter(TestSpecificationModel.test_description.like(f'%{filter}%'))
+                    query = query.filter(TestSpecificationModel.test_description.ilike(f'%{filter}%'))
                 elif field == 'expected-description':
-                    query = query.filter(TestSpecificationModel.expected_behavior.like(f'%{filter}%'))
+                    query = query.filter(TestSpecificationModel.expected_behavior.ilike(f'%{filter}%'))
 
             if arg_key == "search":
-                query = query.filter(or_(TestSpecificationModel.title.like(f'%{args["search"]}%'),
-                                         TestSpecificationModel.preconditions.like(f'%{args["search"]}%'),
-                                         TestSpecificationModel.test_description.like(f'%{args["search"]}%'),
-                                         TestSpecificationModel.expected_behavior.like(f'%{args["search"]}%')
-                                         ))
+                query = query.filter(search_clause(dbi.session, TestSpecificationModel, args["search"]))
 
-        tss = [ts.as_dict() for ts in query.all()]
+        tss = [ts.as_dict() for ts in query.yield_per(db_orm.db_yield_per)]
 
         if 'mode' in args.keys():
             if args['mode'] == 'minimal':
                 minimal_keys = ['id', 'title']
                 tss = [{key: val for key, val in sub.items() if key in minimal_keys} for sub in tss]
 
-        dbi.engine.dispose()
         return tss
 
 
@@ -2337,14 +2412,13 @@ class SwRequirement(Resource):
                 query = dbi.session.query(SwRequirementModel).filter(
                     SwRequirementModel.id.in_(api_sw_requirement_ids))
             else:
-                dbi.engine.dispose()
                 return []
         else:
             query = dbi.session.query(SwRequirementModel)
 
         filter_by_id = False
         for arg_key in args.keys():
-            if "field" in arg_key:
+            if "field" in arg_key and arg_key != "fields":
                 field_n = arg_key.replace('field', '')
                 field = args[f'field{field_n}']
                 filter = args[f'filter{field_n}']
@@ -2354,32 +2428,28 @@ class SwRequirement(Resource):
 
         if filter_by_id:
             query = query.filter(SwRequirementModel.id == filter)
-            dbi.engine.dispose()
-            return [sr.as_dict() for sr in query.all()]
+            return [sr.as_dict() for sr in query.yield_per(db_orm.db_yield_per)]
 
         for arg_key in args.keys():
-            if "field" in arg_key:
+            if "field" in arg_key and arg_key != "fields":
                 field_n = arg_key.replace('field', '')
                 field = args[f'field{field_n}']
                 filter = args[f'filter{field_n}']
                 if field == 'title':
-                    query = query.filter(SwRequirementModel.title.like(f'%{filter}%'))
+                    query = query.filter(SwRequirementModel.title.ilike(f'%{filter}%'))
                 elif field == 'description':
-                    query = query.filter(SwRequirementModel.description.like(f'%{filter}%'))
+                    query = query.filter(SwRequirementModel.description.ilike(f'%{filter}%'))
 
             if arg_key == "search":
-                query = query.filter(or_(SwRequirementModel.title.like(f'%{args["search"]}%'),
-                                         SwRequirementModel.description.like(f'%{args["search"]}%')
-                                         ))
+                query = query.filter(search_clause(dbi.session, SwRequirementModel, args["search"]))
 
-        srs = [sr.as_dict() for sr in query.all()]
+        srs = [sr.as_dict() for sr in query.yield_per(db_orm.db_yield_per)]
 
         if 'mode' in args.keys():
             if args['mode'] == 'minimal':
                 minimal_keys = ['id', 'title']
                 srs = [{key: val for key, val in sub.items() if key in minimal_keys} for sub in srs]
 
-        dbi.engine.dispose()
         return srs
 
 
@@ -2413,7 +2483,7 @@ class TestCase(Resource):
 
         filter_by_id = False
         for arg_key in args.keys():
-            if "field" in arg_key:
+            if "field" in arg_key and arg_key != "fields":
                 field_n = arg_key.replace('field', '')
                 field = args[f'field{field_n}']
                 filter = args[f'filter{field_n}']
@@ -2422,38 +2492,32 @@ class TestCase(Resource):
                     break
         if filter_by_id:
             query = query.filter(TestCaseModel.id == filter)
-            dbi.engine.dispose()
-            return [tc.as_dict() for tc in query.all()]
+            return [tc.as_dict() for tc in query.yield_per(db_orm.db_yield_per)]
 
         for arg_key in args.keys():
-            if "field" in arg_key:
+            if "field" in arg_key and arg_key != "fields":
                 field_n = arg_key.replace('field', '')
                 field = args[f'field{field_n}']
                 filter = args[f'filter{field_n}']
                 if field == 'title':
-                    query = query.filter(TestCaseModel.title.like(f'%{filter}%'))
+                    query = query.filter(TestCaseModel.title.ilike(f'%{filter}%'))
                 elif field == 'description':
-                    query = query.filter(TestCaseModel.description.like(f'%{filter}%'))
+                    query = query.filter(TestCaseModel.description.ilike(f'%{filter}%'))
                 elif field == 'repository':
-                    query = query.filter(TestCaseModel.repository.like(f'%{filter}%'))
+                    query = query.filter(TestCaseModel.repository.ilike(f'%{filter}%'))
                 elif field == 'relative-path':
-                    query = query.filter(TestCaseModel.relative_path.like(f'%{filter}%'))
+                    query = query.filter(TestCaseModel.relative_path.ilike(f'%{filter}%'))
 
             if arg_key == "search":
-                query = query.filter(or_(TestCaseModel.title.like(f'%{args["search"]}%'),
-                                         TestCaseModel.description.like(f'%{args["search"]}%'),
-                                         TestCaseModel.repository.like(f'%{args["search"]}%'),
-                                         TestCaseModel.relative_path.like(f'%{args["search"]}%')
-                                         ))
+                query = query.filter(search_clause(dbi.session, TestCaseModel, args["search"]))
 
-        tcs = [tc.as_dict() for tc in query.all()]
+        tcs = [tc.as_dict() for tc in query.yield_per(db_orm.db_yield_per)]
 
         if 'mode' in args.keys():
             if args['mode'] == 'minimal':
                 minimal_keys = ['id', 'title']
                 tcs = [{key: val for key, val in sub.items() if key in minimal_keys} for sub in tcs]
 
-        dbi.engine.dispose()
         return tcs
 
 
@@ -2486,13 +2550,11 @@ class SwRequirementTestSpecificationsMapping(Resource):
             sw_requirement = dbi.session.query(SwRequirementModel).filter(
                 SwRequirementModel.id == sw_requirement_id).one()
         except:
-            dbi.engine.dispose()
             return "Sw Requirement not found", 400
 
         # Find ApiModel
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         # Find ApiSwRequirementModel
@@ -2500,7 +2562,6 @@ class SwRequirementTestSpecificationsMapping(Resource):
         srs_api = dbi.session.query(ApiSwRequirementModel).filter(
             ApiSwRequirementModel.id == request_data['relation-id']).all()
         if len(srs_api) != 1:
-            dbi.engine.dispose()
             return "Api not found", 404
         else:
             sr_api = srs_api[0]
@@ -2509,7 +2570,6 @@ class SwRequirementTestSpecificationsMapping(Resource):
             # Create a new one
             for check_field in TestSpecification.fields:
                 if check_field.replace("_", "-") not in request_data['test-specification'].keys():
-                    dbi.engine.dispose()
                     return "Bad request. Not consistent data.", 400
 
             title = request_data['test-specification']['title']
@@ -2530,7 +2590,6 @@ class SwRequirementTestSpecificationsMapping(Resource):
                     SwRequirementTestSpecificationModel.test_specification_id == ts.id).filter(
                     SwRequirementTestSpecificationModel.api_id == api.id).all()
                 if len(ts_mapping) > 0:
-                    dbi.engine.dispose()
                     return "Test Specification already associated to the selected api Specification section.", 409
 
             new_test_specification = TestSpecificationModel(title,
@@ -2552,7 +2611,6 @@ class SwRequirementTestSpecificationsMapping(Resource):
                     SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id == request_data[
                         'relation-id']).filter(
                 SwRequirementTestSpecificationModel.test_specification_id == test_specification_id).all()) > 0:
-                dbi.engine.dispose()
                 return "Test Specification already associated to the selected Api and Sw Requirement.", 409
 
             try:
@@ -2562,7 +2620,6 @@ class SwRequirementTestSpecificationsMapping(Resource):
                 return "Unable to find the selected Test Specification", 400
 
             if not isinstance(test_specification, TestSpecificationModel):
-                dbi.engine.dispose()
                 return "Bad request.", 400
 
             new_test_specification_mapping_sw_requirement = SwRequirementTestSpecificationModel(sr_api,
@@ -2571,7 +2628,6 @@ class SwRequirementTestSpecificationsMapping(Resource):
             dbi.session.add(new_test_specification_mapping_sw_requirement)
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return new_test_specification_mapping_sw_requirement.as_dict()
 
     def put(self):
@@ -2608,7 +2664,6 @@ class SwRequirementTestSpecificationsMapping(Resource):
 
         ret = sw_mapping_ts.as_dict(db_session=dbi.session)
         dbi.session.commit()
-        dbi.engine.dispose()
         return ret
 
     def delete(self):
@@ -2631,7 +2686,6 @@ class SwRequirementTestSpecificationsMapping(Resource):
 
         dbi.session.delete(sw_mapping_ts)
         dbi.session.commit()
-        dbi.engine.dispose()
 
         return ret
 
@@ -2663,7 +2717,6 @@ class SwRequirementTestCasesMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         # Find ApiSwRequirement
@@ -2672,7 +2725,6 @@ class SwRequirementTestCasesMapping(Resource):
         )
         api_sr_list = api_sr_query.all()
         if len(api_sr_list) != 1:
-            dbi.engine.dispose()
             return "Api not found", 404
         else:
             api_sr = api_sr_list[0]
@@ -2684,14 +2736,12 @@ class SwRequirementTestCasesMapping(Resource):
             sw_requirement = dbi.session.query(SwRequirementModel).filter(
                 SwRequirementModel.id == sw_requirement_id).one()
         except:
-            dbi.engine.dispose()
             return "Sw Requirement not found", 400
 
         if 'id' not in request_data['test-case'].keys():
             # Create a new one
             for check_field in TestCase.fields:
                 if check_field.replace("_", "-") not in request_data['test-case'].keys():
-                    dbi.engine.dispose()
                     return "Bad request. Not consistent data.", 400
 
             title = request_data['test-case']['title']
@@ -2710,7 +2760,6 @@ class SwRequirementTestCasesMapping(Resource):
                     SwRequirementTestCaseModel.id == relation_id).filter(
                     SwRequirementTestCaseModel.test_case_id == tc.id).all()
                 if len(tc_mapping) > 0:
-                    dbi.engine.dispose()
                     return "Test Case already associated to the selected api Specification section.", 409
 
             new_test_case = TestCaseModel(repository, relative_path, title, description)
@@ -2729,18 +2778,15 @@ class SwRequirementTestCasesMapping(Resource):
             if len(dbi.session.query(SwRequirementTestCaseModel).filter(
                     SwRequirementTestCaseModel.id == relation_id).filter(
                 SwRequirementTestCaseModel.test_case_id == test_case_id).all()) > 0:
-                dbi.engine.dispose()
                 return "Test Case already associated to the selected Api and Sw Requirement.", 409
 
             try:
                 test_case = dbi.session.query(TestCaseModel).filter(
                     TestCaseModel.id == test_case_id).one()
             except:
-                dbi.engine.dispose()
                 return "Bad request.", 400
 
             if not isinstance(test_case, TestCaseModel):
-                dbi.engine.dispose()
                 return "Bad request.", 400
 
             new_test_case_mapping_sw_requirement = SwRequirementTestCaseModel(api_sr,
@@ -2749,7 +2795,6 @@ class SwRequirementTestCasesMapping(Resource):
             dbi.session.add(new_test_case_mapping_sw_requirement)
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return new_test_case_mapping_sw_requirement.as_dict()
 
     def put(self):
@@ -2785,7 +2830,6 @@ class SwRequirementTestCasesMapping(Resource):
 
         ret = sw_mapping_tc.as_dict(db_session=dbi.session)
         dbi.session.commit()
-        dbi.engine.dispose()
         return ret
 
     def delete(self):
@@ -2808,7 +2852,6 @@ class SwRequirementTestCasesMapping(Resource):
 
         dbi.session.delete(sw_mapping_tc)
         dbi.session.commit()
-        dbi.engine.dispose()
 
         return ret
 
@@ -2837,7 +2880,6 @@ class TestSpecificationTestCasesMapping(Resource):
         # Find api
         api = get_api_from_request(request_data, dbi.session)
         if not api:
-            dbi.engine.dispose()
             return "Api not found", 404
 
         # Find ApiSwRequirement
@@ -2850,12 +2892,10 @@ class TestSpecificationTestCasesMapping(Resource):
                 SwRequirementTestSpecificationModel.id == relation_id
             )
         else:
-            dbi.engine.dispose()
             return "Bad request!!!", 400
 
         relation_to_list = relation_to_query.all()
         if len(relation_to_list) != 1:
-            dbi.engine.dispose()
             return "Parent mapping not found", 404
         else:
             relation_to_item = relation_to_list[0]
@@ -2872,14 +2912,12 @@ class TestSpecificationTestCasesMapping(Resource):
             test_specification = dbi.session.query(TestSpecificationModel).filter(
                 TestSpecificationModel.id == test_specification_id).one()
         except:
-            dbi.engine.dispose()
             return "Test Specification not found", 400
 
         if 'id' not in request_data['test-case'].keys():
             # Create a new one
             for check_field in TestCase.fields:
                 if check_field.replace("_", "-") not in request_data['test-case'].keys():
-                    dbi.engine.dispose()
                     return "Bad request. Not consistent data.", 400
 
             title = request_data['test-case']['title']
@@ -2898,7 +2936,6 @@ class TestSpecificationTestCasesMapping(Resource):
                     TestSpecificationTestCaseModel.id == relation_id).filter(
                     TestSpecificationTestCaseModel.test_case_id == tc.id).all()
                 if len(tc_mapping) > 0:
-                    dbi.engine.dispose()
                     return "Test Case already associated to the selected api Specification section.", 409
 
             new_test_case = TestCaseModel(repository, relative_path, title, description)
@@ -2918,18 +2955,15 @@ class TestSpecificationTestCasesMapping(Resource):
             if len(dbi.session.query(TestSpecificationTestCaseModel).filter(
                     TestSpecificationTestCaseModel.id == relation_id).filter(
                 TestSpecificationTestCaseModel.test_case_id == test_case_id).all()) > 0:
-                dbi.engine.dispose()
                 return "Test Case already associated to the selected Api and Test Specification.", 409
 
             try:
                 test_case = dbi.session.query(TestCaseModel).filter(
                     TestCaseModel.id == test_case_id).one()
             except:
-                dbi.engine.dispose()
                 return "Bad request.", 400
 
             if not isinstance(test_case, TestCaseModel):
-                dbi.engine.dispose()
                 return "Bad request.", 400
 
             new_test_case_mapping_test_specification = TestSpecificationTestCaseModel(api_ts,
@@ -2939,7 +2973,6 @@ class TestSpecificationTestCasesMapping(Resource):
             dbi.session.add(new_test_case_mapping_test_specification)
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return new_test_case_mapping_test_specification.as_dict()
 
     def put(self):
@@ -2975,7 +3008,6 @@ class TestSpecificationTestCasesMapping(Resource):
 
         ret = ts_mapping_tc.as_dict(db_session=dbi.session)
         dbi.session.commit()
-        dbi.engine.dispose()
         return ret
 
     def delete(self):
@@ -2997,7 +3029,6 @@ class TestSpecificationTestCasesMapping(Resource):
 
         dbi.session.delete(ts_mapping_tc)
         dbi.session.commit()
-        dbi.engine.dispose()
 
         return ret
 
@@ -3028,7 +3059,6 @@ class ForkApiSwRequirement(Resource):
         asr_mapping.sw_requirement_id = new_sr.id
 
         dbi.session.commit()
-        dbi.engine.dispose()
         return asr_mapping.as_dict()
 
 
@@ -3056,11 +3086,14 @@ api.add_resource(TestSpecificationTestCasesMapping, '/mapping/test-specification
 api.add_resource(MappingHistory, '/mapping/history')
 api.add_resource(CheckSpecification, '/apis/check-specification')
 api.add_resource(FixNewSpecificationWarnings, '/apis/fix-specification-warnings')
+api.add_resource(RelocateSpecificationMappings, '/apis/relocate-specification')
 
 # Usage
 api.add_resource(MappingUsage, '/mapping/usage')
 # Comments
 api.add_resource(Comment, '/comments')
+# Search
+api.add_resource(Search, '/search')
 # Fork
 api.add_resource(ForkApiSwRequirement, '/fork/api/sw-requirement')
 # api.add_resource(ForkTestSpecification, '/fork/api/test-specification')
@@ -0,0 +1,192 @@
+"""Coverage of the specification sections of many apis.
+
+The direct mappings of every api are held as offset/length/coverage arrays
+and the specification is cut at their boundaries: every section gets the sum
+of the coverage of the mappings over it, limited to 0..100, and the coverage
+of the api is the mean of the coverage of its sections weighted on their length.
+With NumPy installed the sections of all the apis are computed together with
+array operations, otherwise a sweep of the boundaries per api is used.
+"""
+import os, sys
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+db_path = os.path.join(os.path.dirname(currentdir), "db")
+models_path = os.path.join(db_path, "models")
+sys.path.insert(0, models_path)
+sys.path.insert(0, db_path)
+
+from sqlalchemy import and_
+from api_justification import ApiJustificationModel
+from api_sw_requirement import ApiSwRequirementModel
+from mapping_coverage import MappingCoverageModel
+from section_splitter import SECTION_COVERAGE_DECIMALS, sweep_sections
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def weighted_coverage(lengths, coverages):
+    """Coverage of an api from the length and the coverage of its sections"""
+    total_len = sum(lengths)
+    if total_len == 0:
+        return 0
+    # Divided once at the end: summing (len / total) * (cov / 100) of every
+    # section truncates a full coverage to 99 with some lengths.
+    # Summed in order, as np.bincount() does
+    wa = 0
+    for i in range(len(lengths)):
+        wa += lengths[i] * coverages[i]
+    return int(wa / total_len)
+
+
+def matching_items(specification, mapped_items):
+    """(start, end, coverage) of the mapped_items matching the specification"""
+    ret = []
+    for offset, section, coverage in mapped_items:
+        if len(section) == 0:
+            continue
+        if specification[offset:offset + len(section)] != section:
+            continue
+        ret.append((offset, offset + len(section), coverage))
+    return ret
+
+
+def section_coverages(specification, mapped_items):
+    """
+    mapped_items: list of (offset, section, coverage) of the direct mappings
+    return: (lengths, coverages) of the sections, as cut by SpecificationSections
+    """
+    intervals = matching_items(specification, mapped_items)
+    lengths = []
+    coverages = []
+    for start, end, items, coverage in sweep_sections(specification,
+                                                      [x[0] for x in intervals],
+                                                      [x[1] for x in intervals],
+                                                      [x[2] for x in intervals]):
+        lengths.append(end - start)
+        coverages.append(coverage)
+    return lengths, coverages
+
+
+def sections_coverage(specification, mapped_items):
+    """Coverage of an api, the value shown by the sw requirements mapping view"""
+    return weighted_coverage(*section_coverages(specification, mapped_items))
+
+
+def _vectorized_apis_sections_coverage(specifications, mapped_items):
+    """apis_sections_coverage() with NumPy.
+    The specifications are laid one after the other, so the sections of
+    every api are the ones between the sorted boundaries of all the apis.
+    """
+    api_ids = list(specifications.keys())
+    spec_lengths = np.array([len(specifications[x]) for x in api_ids], dtype=np.int64)
+    bases = np.concatenate(([0], np.cumsum(spec_lengths)[:-1])).astype(np.int64)
+
+    item_apis = []
+    starts = []
+    ends = []
+    coverages = []
+    for iApi in range(len(api_ids)):
+        for start, end, coverage in matching_items(specifications[api_ids[iApi]],
+                                                   mapped_items.get(api_ids[iApi], [])):
+            item_apis.append(iApi)
+            starts.append(start)
+            ends.append(end)
+            coverages.append(coverage)
+    item_apis = np.array(item_apis, dtype=np.int64)
+    starts = bases[item_apis] + np.array(starts, dtype=np.int64)
+    ends = bases[item_apis] + np.array(ends, dtype=np.int64)
+    coverages = np.array(coverages, dtype=np.float64)
+
+    boundaries = np.unique(np.concatenate((bases, bases + spec_lengths, starts, ends)))
+    # Coverage and number of mappings of every section from their changes at every boundary
+    coverage_change = np.zeros(len(boundaries), dtype=np.float64)
+    active_change = np.zeros(len(boundaries), dtype=np.int64)
+    np.add.at(coverage_change, np.searchsorted(boundaries, starts), coverages)
+    np.add.at(coverage_change, np.searchsorted(boundaries, ends), -coverages)
+    np.add.at(active_change, np.searchsorted(boundaries, starts), 1)
+    np.add.at(active_change, np.searchsorted(boundaries, ends), -1)
+    section_coverages = np.clip(np.round(np.cumsum(coverage_change)[:-1], SECTION_COVERAGE_DECIMALS), 0, 100)
+    section_active = np.cumsum(active_change)[:-1]
+    section_starts = boundaries[:-1]
+    section_lengths = np.diff(boundaries)
+    section_apis = np.searchsorted(bases, section_starts, side='right') - 1
+
+    # Sections without mappings are dropped when blank
+    keep = section_active > 0
+    for iSection in np.flatnonzero(~keep):
+        iApi = section_apis[iSection]
+        start = section_starts[iSection] - bases[iApi]
+        keep[iSection] = specifications[api_ids[iApi]][start:start + section_lengths[iSection]].strip() != ""
+
+    section_apis = section_apis[keep]
+    section_lengths = section_lengths[keep]
+    total_lengths = np.bincount(section_apis, weights=section_lengths, minlength=len(api_ids))
+    wa = np.bincount(section_apis, weights=section_lengths * section_coverages[keep], minlength=len(api_ids))
+    ret = np.zeros(len(api_ids))
+    covered = total_lengths > 0
+    ret[covered] = np.trunc(wa[covered] / total_lengths[covered])
+    return {api_ids[i]: int(ret[i]) for i in range(len(api_ids))}
+
+
+def apis_sections_coverage(specifications, mapped_items):
+    """
+    specifications: {api id: specification}, None if the specification is not available
+    mapped_items: {api id: list of (offset, section, coverage) of the direct mappings}
+    return: {api id: coverage}, 0 for the apis without specification
+    """
+    ret = {x: 0 for x in specifications.keys() if specifications[x] is None}
+    specifications = {k: v for k, v in specifications.items() if v is not None}
+    if np is None or not specifications:
+        ret.update({x: sections_coverage(specifications[x], mapped_items.get(x, [])) for x in specifications})
+    else:
+        ret.update(_vectorized_apis_sections_coverage(specifications, mapped_items))
+    return ret
+
+
+def load_mapped_items(db_session, api_ids):
+    """
+    (offset, section, coverage) of the sw requirements and justifications mapped to
+    every api in api_ids, read with two queries.
+    The waterfall coverage of the sw requirements comes from the mapping_coverage table.
+    return: dict {api id: list of (offset, section, coverage)}
+    """
+    mapped_items = {x: [] for x in api_ids}
+
+    srs = db_session.query(ApiSwRequirementModel.id,
+                           ApiSwRequirementModel.api_id,
+                           ApiSwRequirementModel.offset,
+                           ApiSwRequirementModel.section,
+                           MappingCoverageModel.coverage).outerjoin(
+        MappingCoverageModel, and_(MappingCoverageModel.parent_table == ApiSwRequirementModel.__tablename__,
+                                   MappingCoverageModel.parent_id == ApiSwRequirementModel.id)).filter(
+        ApiSwRequirementModel.api_id.in_(api_ids)).order_by(
+        ApiSwRequirementModel.offset.asc()).all()
+    for sr in srs:
+        coverage = sr.coverage
+        if coverage is None:
+            coverage = db_session.query(ApiSwRequirementModel).filter(
+                ApiSwRequirementModel.id == sr.id).one().get_waterfall_coverage(db_session)
+        mapped_items[sr.api_id].append((sr.offset, sr.section, coverage))
+
+    justifications = db_session.query(ApiJustificationModel.api_id,
+                                      ApiJustificationModel.offset,
+                                      ApiJustificationModel.section,
+                                      ApiJustificationModel.coverage).filter(
+        ApiJustificationModel.api_id.in_(api_ids)).order_by(
+        ApiJustificationModel.offset.asc()).all()
+    for j in justifications:
+        mapped_items[j.api_id].append((j.offset, j.section, j.coverage))
+    return mapped_items
+
+
+def apis_coverage(db_session, apis, get_specification):
+    """
+    Coverage of every api in apis, as shown by the sw requirements mapping view.
+    get_specification(api) returns the specification of api or None.
+    return: dict {api id: coverage}
+    """
+    mapped_items = load_mapped_items(db_session, [x.id for x in apis])
+    return apis_sections_coverage({x.id: get_specification(x) for x in apis}, mapped_items)
@@ -0,0 +1,95 @@
+import datetime, os, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExportJobs():
+    """Export jobs run by a pool of worker threads.
+
+    A job builds the export of a library into a file of export_dir named after
+    the library and the content hash of its data. Submitting a job for a
+    content already exported, or being exported, returns the existing job,
+    so the export of a library is built once until its data changes.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, export_dir, workers=2, max_jobs=1000):
+        self.export_dir = export_dir
+        self.max_jobs = max_jobs
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="basil-export")
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def filename(self, library, content_hash):
+        return f"{library}-{content_hash}.json"
+
+    def filepath(self, job):
+        return os.path.join(self.export_dir, job['filename'])
+
+    def now(self):
+        return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def get(self, job_id):
+        with self.lock:
+            if job_id not in self.jobs.keys():
+                return None
+            return dict(self.jobs[job_id])
+
+    def submit(self, library, content_hash, build):
+        """Return the job exporting library with content_hash, creating it if needed.
+        build(job) is called by a worker and has to write the export to filepath(job).
+        """
+        with self.lock:
+            for job in self.jobs.values():
+                if job['library'] == library and job['content_hash'] == content_hash:
+                    if job['status'] in [self.QUEUED, self.RUNNING] or \
+                            (job['status'] == self.DONE and os.path.exists(self.filepath(job))):
+                        return dict(job)
+
+            job = {'id': str(uuid.uuid4()),
+                   'library': library,
+                   'content_hash': content_hash,
+                   'filename': self.filename(library, content_hash),
+                   'status': self.QUEUED,
+                   'error': None,
+                   'created_at': self.now(),
+                   'finished_at': None,
+                   'seconds': None}
+            if os.path.exists(self.filepath(job)):
+                # Exported before with the same data
+                job['status'] = self.DONE
+                job['finished_at'] = job['created_at']
+            else:
+                self.executor.submit(self.run, job['id'], build)
+            self.jobs[job['id']] = job
+            self.prune()
+            return dict(job)
+
+    def run(self, job_id, build):
+        with self.lock:
+            self.jobs[job_id]['status'] = self.RUNNING
+            job = dict(self.jobs[job_id])
+
+        os.makedirs(self.export_dir, exist_ok=True)
+        start = time.perf_counter()
+        try:
+            build(job)
+            status, error = self.DONE, None
+        except Exception as exp:
+            print(f"Export job {job_id} of {job['library']} failed: {exp}")
+            status, error = self.FAILED, str(exp)
+
+        with self.lock:
+            self.jobs[job_id].update({'status': status,
+                                      'error': error,
+                                      'finished_at': self.now(),
+                                      'seconds': round(time.perf_counter() - start, 3)})
+
+    def prune(self):
+        """Forget the oldest completed jobs above max_jobs"""
+        completed = [x for x in self.jobs.keys() if self.jobs[x]['status'] in [self.DONE, self.FAILED]]
+        for job_id in completed[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
@@ -0,0 +1,294 @@
+import os, sys
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+db_path = os.path.join(os.path.dirname(currentdir), "db")
+models_path = os.path.join(db_path, "models")
+sys.path.insert(0, models_path)
+sys.path.insert(0, db_path)
+
+from sqlalchemy import and_, func, literal, null, or_, select, union_all
+from sqlalchemy.orm import selectinload
+from api import ApiModel
+from api_justification import ApiJustificationModel, ApiJustificationHistoryModel
+from api_sw_requirement import ApiSwRequirementModel, ApiSwRequirementHistoryModel
+from api_test_case import ApiTestCaseModel, ApiTestCaseHistoryModel
+from api_test_specification import ApiTestSpecificationModel, ApiTestSpecificationHistoryModel
+from comment import CommentModel, comment_counts
+from justification import JustificationModel, JustificationHistoryModel
+from mapping_coverage import MappingCoverageModel
+from sw_requirement import SwRequirementModel, SwRequirementHistoryModel
+from sw_requirement_test_case import SwRequirementTestCaseModel, SwRequirementTestCaseHistoryModel
+from sw_requirement_test_specification import SwRequirementTestSpecificationModel, \
+    SwRequirementTestSpecificationHistoryModel
+from test_case import TestCaseModel, TestCaseHistoryModel
+from test_specification import TestSpecificationModel, TestSpecificationHistoryModel
+from test_specification_test_case import TestSpecificationTestCaseModel, TestSpecificationTestCaseHistoryModel
+
+# Max number of ids in a single IN clause
+CHUNK_SIZE = 500
+
+DIRECT_MAPPINGS = [ApiSwRequirementModel, ApiTestSpecificationModel, ApiTestCaseModel, ApiJustificationModel]
+
+
+class MappingTreeLoader():
+    """Load the mapping tree of an api (direct mappings, indirect mappings
+    and their work items) with a number of queries that doesn't depend
+    on the number of mappings.
+    Mapping rows are read per level with selectinload of their work item,
+    comment counts with one grouped query per view, waterfall coverage with one query per table,
+    versions come from the rows version column. The returned dicts are the ones of the models as_dict(db_session=...).
+    """
+
+    def __init__(self, db_session, api):
+        self.db_session = db_session
+        self.api = api
+        self.direct_comment_counts = None
+
+    def chunks(self, ids):
+        ids = list(ids)
+        for i in range(0, len(ids), CHUNK_SIZE):
+            yield ids[i:i + CHUNK_SIZE]
+
+    def last_versions(self, history_model, rows):
+        """Return {row id: version} from the version column of the rows,
+        reading the history table only for rows created before the column existed
+        """
+        ret = {x.id: x.version for x in rows if x.version is not None}
+        missing = [x.id for x in rows if x.version is None]
+        for chunk in self.chunks(set(missing)):
+            query = select(history_model.id, func.max(history_model.version)).where(
+                history_model.id.in_(chunk)).group_by(history_model.id)
+            ret.update({row[0]: row[1] for row in self.db_session.execute(query)})
+        return ret
+
+    def versions(self, mappings, mapping_history_model, item_history_model, item_key):
+        """Return {mapping id: '<item version>.<mapping version>'}"""
+        mapping_versions = self.last_versions(mapping_history_model, mappings)
+        item_versions = self.last_versions(item_history_model, [getattr(x, item_key) for x in mappings])
+        return {x.id: f'{item_versions.get(getattr(x, f"{item_key}_id"))}.{mapping_versions.get(x.id)}'
+                for x in mappings}
+
+    def comment_counts(self, model, ids):
+        """Return {row id: number of comments} of the rows ids of model.
+        The counts of all the direct mappings of the api are read with a single query
+        the first time and reused by every table of the view.
+        """
+        table = model.__tablename__
+        if self.api is not None and model in DIRECT_MAPPINGS:
+            if self.direct_comment_counts is None:
+                self.direct_comment_counts = comment_counts(
+                    self.db_session, {x.__tablename__: select(x.id).where(x.api_id == self.api.id)
+                                      for x in DIRECT_MAPPINGS})
+            counts = self.direct_comment_counts
+        else:
+            counts = comment_counts(self.db_session, {table: ids})
+        return {x: counts.get((table, x), 0) for x in ids}
+
+    def waterfall_coverages(self, mappings):
+        """Return {mapping id: waterfall coverage} reading the mapping_coverage table"""
+        if not mappings:
+            return {}
+        ret = {}
+        table = mappings[0].__tablename__
+        for chunk in self.chunks([x.id for x in mappings]):
+            query = select(MappingCoverageModel.parent_id, MappingCoverageModel.coverage).where(
+                MappingCoverageModel.parent_table == table).where(
+                MappingCoverageModel.parent_id.in_(chunk))
+            ret.update({row[0]: row[1] for row in self.db_session.execute(query)})
+        for mapping in mappings:
+            if mapping.id not in ret.keys():
+                ret[mapping.id] = mapping.compute_waterfall_coverage(self.db_session)
+        return ret
+
+    def children(self, model, parent_key, parent_ids, item_key):
+        """Return {parent id: [mapping rows]} of model filtered on parent_key in parent_ids"""
+        ret = {x: [] for x in parent_ids}
+        for chunk in self.chunks(parent_ids):
+            rows = self.db_session.query(model).options(
+                selectinload(getattr(model, item_key))).filter(
+                getattr(model, parent_key).in_(chunk)).order_by(model.id.asc()).all()
+            for row in rows:
+                ret[getattr(row, parent_key)].append(row)
+        return ret
+
+    def direct_mappings(self, model, item_key):
+        return self.db_session.query(model).options(
+            selectinload(getattr(model, item_key))).filter(
+            model.api_id == self.api.id).order_by(
+            model.offset.asc()).all()
+
+    def direct_mapping_dicts(self, mappings, item_key, mapping_history_model,
+                             item_history_model, waterfall=True):
+        """as_dict(db_session=...) of ApiSwRequirement, ApiTestSpecification,
+        ApiTestCase and ApiJustification rows
+        """
+        ids = [x.id for x in mappings]
+        mapping_versions = self.last_versions(mapping_history_model, mappings)
+        item_versions = self.last_versions(item_history_model, [getattr(x, item_key) for x in mappings])
+        comment_counts = self.comment_counts(type(mappings[0]), ids) if mappings else {}
+        coverages = self.waterfall_coverages(mappings) if waterfall else {}
+
+        ret = []
+        for mapping in mappings:
+            item_version = item_versions.get(getattr(mapping, f'{item_key}_id'))
+            tmp = mapping.as_dict()
+            tmp[item_key]['version'] = f'{item_version}'
+            tmp[item_key]['comment_count'] = comment_counts[mapping.id]
+            if waterfall:
+                tmp['coverage'] = coverages[mapping.id]
+            tmp['version'] = f'{item_version}.{mapping_versions.get(mapping.id)}'
+            ret.append(tmp)
+        return ret
+
+    def sw_requirements(self):
+        """Direct sw requirements with nested indirect test specifications,
+        their test cases and indirect test cases, as in the sw requirements mapping view
+        """
+        undesired_keys = ['section', 'offset', 'api']
+        api_srs = self.direct_mappings(ApiSwRequirementModel, 'sw_requirement')
+        ret = self.direct_mapping_dicts(api_srs, 'sw_requirement',
+                                        ApiSwRequirementHistoryModel, SwRequirementHistoryModel)
+        api_sr_ids = [x.id for x in api_srs]
+
+        sr_tss = self.children(SwRequirementTestSpecificationModel, 'sw_requirement_mapping_api_id',
+                               api_sr_ids, 'test_specification')
+        sr_tss_rows = [x for rows in sr_tss.values() for x in rows]
+        sr_ts_versions = self.versions(sr_tss_rows, SwRequirementTestSpecificationHistoryModel,
+                                       TestSpecificationHistoryModel, 'test_specification')
+        sr_ts_coverages = self.waterfall_coverages(sr_tss_rows)
+
+        sr_tcs = self.children(SwRequirementTestCaseModel, 'sw_requirement_mapping_api_id',
+                               api_sr_ids, 'test_case')
+        sr_tcs_rows = [x for rows in sr_tcs.values() for x in rows]
+        sr_tc_versions = self.versions(sr_tcs_rows, SwRequirementTestCaseHistoryModel,
+                                       TestCaseHistoryModel, 'test_case')
+
+        ts_tcs = self.children(TestSpecificationTestCaseModel, 'test_specification_mapping_sw_requirement_id',
+                               [x.id for x in sr_tss_rows], 'test_case')
+        ts_tcs_rows = [x for rows in ts_tcs.values() for x in rows]
+        ts_tc_versions = self.versions(ts_tcs_rows, TestSpecificationTestCaseHistoryModel,
+                                       TestCaseHistoryModel, 'test_case')
+
+        for iSR in range(len(api_srs)):
+            ret[iSR]['sw_requirement']['test_specifications'] = []
+            for sr_ts in sr_tss[api_srs[iSR].id]:
+                tmp = sr_ts.as_dict()
+                del tmp['test_specification']
+                tmp['coverage'] = sr_ts_coverages[sr_ts.id]
+                tmp['version'] = sr_ts_versions[sr_ts.id]
+                tmp['test_specification'] = sr_ts.test_specification.as_dict()
+                tmp['test_specification']['test_cases'] = [
+                    self.test_specification_test_case_dict(x, ts_tc_versions, undesired_keys)
+                    for x in ts_tcs[sr_ts.id]]
+                ret[iSR]['sw_requirement']['test_specifications'].append(
+                    self.without_keys(tmp, undesired_keys))
+
+            ret[iSR]['sw_requirement']['test_cases'] = []
+            for sr_tc in sr_tcs[api_srs[iSR].id]:
+                tmp = sr_tc.as_dict()
+                del tmp['test_case']
+                tmp['version'] = sr_tc_versions[sr_tc.id]
+                tmp['test_case'] = sr_tc.test_case.as_dict()
+                ret[iSR]['sw_requirement']['test_cases'].append(
+                    self.without_keys(tmp, undesired_keys + ['sw_requirement_mapping_api']))
+        return ret
+
+    def test_specifications(self):
+        """Direct test specifications with nested test cases,
+        as in the test specifications mapping view
+        """
+        undesired_keys = ['section', 'offset', 'api']
+        api_tss = self.direct_mappings(ApiTestSpecificationModel, 'test_specification')
+        ret = self.direct_mapping_dicts(api_tss, 'test_specification',
+                                        ApiTestSpecificationHistoryModel, TestSpecificationHistoryModel)
+
+        ts_tcs = self.children(TestSpecificationTestCaseModel, 'test_specification_mapping_api_id',
+                               [x.id for x in api_tss], 'test_case')
+        ts_tcs_rows = [x for rows in ts_tcs.values() for x in rows]
+        ts_tc_versions = self.versions(ts_tcs_rows, TestSpecificationTestCaseHistoryModel,
+                                       TestCaseHistoryModel, 'test_case')
+
+        for iTS in range(len(api_tss)):
+            ret[iTS]['test_specification']['test_cases'] = [
+                self.test_specification_test_case_dict(x, ts_tc_versions, undesired_keys)
+                for x in ts_tcs[api_tss[iTS].id]]
+        return ret
+
+    def test_cases(self):
+        """Direct test cases, as in the test cases mapping view"""
+        api_tcs = self.direct_mappings(ApiTestCaseModel, 'test_case')
+        return self.direct_mapping_dicts(api_tcs, 'test_case',
+                                         ApiTestCaseHistoryModel, TestCaseHistoryModel,
+                                         waterfall=False)
+
+    def justifications(self):
+        """Direct justifications, shown in every mapping view"""
+        api_js = self.direct_mappings(ApiJustificationModel, 'justification')
+        return self.direct_mapping_dicts(api_js, 'justification',
+                                         ApiJustificationHistoryModel, JustificationHistoryModel,
+                                         waterfall=False)
+
+    def state(self):
+        """Return [table, rows, max id, max updated_at, sum of version] of every table
+        read by the mapping views of the api, with a single query.
+        Any insert, update or delete of a row of the mapping tree changes them.
+        """
+        api_id = self.api.id
+        api_srs = select(ApiSwRequirementModel.id).where(ApiSwRequirementModel.api_id == api_id)
+        api_tss = select(ApiTestSpecificationModel.id).where(ApiTestSpecificationModel.api_id == api_id)
+        sr_tss = select(SwRequirementTestSpecificationModel.id).where(
+            SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id.in_(api_srs))
+        sr_tcs = select(SwRequirementTestCaseModel.id).where(
+            SwRequirementTestCaseModel.sw_requirement_mapping_api_id.in_(api_srs))
+        ts_tcs = select(TestSpecificationTestCaseModel.id).where(or_(
+            TestSpecificationTestCaseModel.test_specification_mapping_api_id.in_(api_tss),
+            TestSpecificationTestCaseModel.test_specification_mapping_sw_requirement_id.in_(sr_tss)))
+
+        mappings = [(ApiSwRequirementModel, ApiSwRequirementModel.api_id == api_id),
+                    (ApiTestSpecificationModel, ApiTestSpecificationModel.api_id == api_id),
+                    (ApiTestCaseModel, ApiTestCaseModel.api_id == api_id),
+                    (ApiJustificationModel, ApiJustificationModel.api_id == api_id),
+                    (SwRequirementTestSpecificationModel, SwRequirementTestSpecificationModel.id.in_(sr_tss)),
+                    (SwRequirementTestCaseModel, SwRequirementTestCaseModel.id.in_(sr_tcs)),
+                    (TestSpecificationTestCaseModel, TestSpecificationTestCaseModel.id.in_(ts_tcs))]
+        items = [(SwRequirementModel, [(ApiSwRequirementModel, 'sw_requirement_id')]),
+                 (TestSpecificationModel, [(ApiTestSpecificationModel, 'test_specification_id'),
+                                           (SwRequirementTestSpecificationModel, 'test_specification_id')]),
+                 (TestCaseModel, [(ApiTestCaseModel, 'test_case_id'),
+                                  (SwRequirementTestCaseModel, 'test_case_id'),
+                                  (TestSpecificationTestCaseModel, 'test_case_id')]),
+                 (JustificationModel, [(ApiJustificationModel, 'justification_id')])]
+
+        rows = [(ApiModel, ApiModel.id == api_id)] + mappings
+        parent_wheres = dict(mappings)
+        for model, parents in items:
+            rows.append((model, or_(*[model.id.in_(select(getattr(parent, key)).where(parent_wheres[parent]))
+                                      for parent, key in parents])))
+
+        queries = [select(literal(model.__tablename__), func.count(), func.max(model.id),
+                          func.max(model.updated_at), func.sum(model.version)).where(where)
+                   for model, where in rows]
+        queries.append(select(literal(CommentModel.__tablename__), func.count(), func.max(CommentModel.id),
+                              func.max(CommentModel.updated_at), null()).where(or_(
+            *[and_(CommentModel.parent_table == model.__tablename__,
+                   CommentModel.parent_id.in_(select(model.id).where(where)))
+              for model, where in mappings])))
+        queries.append(select(literal(MappingCoverageModel.__tablename__), func.count(),
+                              func.max(MappingCoverageModel.id), func.max(MappingCoverageModel.updated_at),
+                              func.sum(MappingCoverageModel.coverage)).where(
+            MappingCoverageModel.api_id == api_id))
+        return [list(x) for x in self.db_session.execute(union_all(*queries))]
+
+    def test_specification_test_case_dict(self, ts_tc, versions, undesired_keys):
+        tmp = ts_tc.as_dict()
+        del tmp['test_case']
+        tmp['version'] = versions[ts_tc.id]
+        # TestSpecificationTestCaseModel.test_case_as_dict() returns the full data
+        tmp['test_case'] = ts_tc.test_case.as_dict(full_data=True)
+        return self.without_keys(tmp, undesired_keys)
+
+    def without_keys(self, _dict, _undesired_keys):
+        for k in _undesired_keys:
+            if k in _dict.keys():
+                del _dict[k]
+        return _dict
@@ -0,0 +1,201 @@
+import collections, hashlib, json, os, tempfile, threading, time, uuid
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from api import ApiModel
+from api_justification import ApiJustificationModel
+from api_sw_requirement import ApiSwRequirementModel
+from api_test_case import ApiTestCaseModel
+from api_test_specification import ApiTestSpecificationModel
+from comment import CommentModel
+from justification import JustificationModel
+from sw_requirement import SwRequirementModel
+from sw_requirement_test_case import SwRequirementTestCaseModel
+from sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from test_case import TestCaseModel
+from test_specification import TestSpecificationModel
+from test_specification_test_case import TestSpecificationTestCaseModel
+
+DIRECT_MAPPINGS = [ApiSwRequirementModel, ApiTestSpecificationModel, ApiTestCaseModel, ApiJustificationModel]
+MAPPING_MODELS = {x.__tablename__: x for x in DIRECT_MAPPINGS + [SwRequirementTestSpecificationModel,
+                                                                  SwRequirementTestCaseModel,
+                                                                  TestSpecificationTestCaseModel]}
+# Mappings of every work item
+WORK_ITEM_PARENTS = {SwRequirementModel: [(ApiSwRequirementModel, 'sw_requirement_id')],
+                     TestSpecificationModel: [(ApiTestSpecificationModel, 'test_specification_id'),
+                                              (SwRequirementTestSpecificationModel, 'test_specification_id')],
+                     TestCaseModel: [(ApiTestCaseModel, 'test_case_id'),
+                                     (SwRequirementTestCaseModel, 'test_case_id'),
+                                     (TestSpecificationTestCaseModel, 'test_case_id')],
+                     JustificationModel: [(ApiJustificationModel, 'justification_id')]}
+
+
+class ResponseCache():
+    """LRU cache of the responses of the api views, keyed by api id and view.
+
+    Every api has a generation token, changed by invalidate(). An entry is
+    returned only while the token it was built with is the current one, so a
+    response built while its data is changed is never served after the change.
+    With shared_dir the tokens and the responses are stored in that directory
+    as well, so processes serving the same database on the same host share them.
+    Entries expire after ttl seconds anyway, as the specifications can change
+    without any change in the database.
+    """
+
+    def __init__(self, max_entries=256, ttl=300, shared_dir=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_dir = shared_dir
+        self.entries = collections.OrderedDict()
+        self.generations = {}
+        self.lock = threading.Lock()
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+    def key(self, api_id, view):
+        return f"{api_id}", view
+
+    def token_path(self, api_id):
+        return os.path.join(self.shared_dir, f"api-{api_id}.token")
+
+    def entry_path(self, api_id, view):
+        view_hash = hashlib.sha256(view.encode()).hexdigest()[:16]
+        return os.path.join(self.shared_dir, f"api-{api_id}-{view_hash}.json")
+
+    def write_file(self, filepath, data):
+        """Atomic write, readers never see a partial file"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.shared_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+
+    def token(self, api_id):
+        """Current generation token of api_id, to be read before building a response"""
+        api_id = f"{api_id}"
+        if not self.shared_dir:
+            with self.lock:
+                return self.generations.get(api_id, 0)
+        try:
+            with open(self.token_path(api_id), 'r') as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def get(self, api_id, view):
+        key = self.key(api_id, view)
+        token = self.token(api_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry['token'] == token and time.time() - entry['created_at'] < self.ttl:
+                self.entries.move_to_end(key)
+                return entry['value']
+
+        if self.shared_dir:
+            try:
+                with open(self.entry_path(*key), 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if entry['token'] == token and time.time() - entry['created_at'] < self.ttl:
+                self.store(key, entry)
+                return entry['value']
+        return None
+
+    def store(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def put(self, api_id, view, token, value):
+        """Cache value, built after reading token"""
+        key = self.key(api_id, view)
+        entry = {'token': token,
+                 'created_at': time.time(),
+                 'value': value}
+        self.store(key, entry)
+        if self.shared_dir:
+            self.write_file(self.entry_path(*key), json.dumps(entry))
+
+    def invalidate(self, api_ids):
+        for api_id in set([f"{x}" for x in api_ids]):
+            with self.lock:
+                self.generations[api_id] = self.generations.get(api_id, 0) + 1
+                for key in [x for x in self.entries.keys() if x[0] == api_id]:
+                    del self.entries[key]
+            if self.shared_dir:
+                self.write_file(self.token_path(api_id), str(uuid.uuid4()))
+
+
+def mapping_api_ids(connection, model, ids):
+    """Ids of the apis whose mapping tree contains the rows ids of model"""
+    ids = [x for x in ids if x is not None]
+    if not ids:
+        return set()
+    if model is ApiModel:
+        return set(ids)
+    if model in DIRECT_MAPPINGS:
+        return set(connection.execute(select(model.api_id).where(model.id.in_(ids))).scalars())
+    if model in [SwRequirementTestSpecificationModel, SwRequirementTestCaseModel]:
+        asr_ids = connection.execute(select(model.sw_requirement_mapping_api_id).where(
+            model.id.in_(ids))).scalars().all()
+        return mapping_api_ids(connection, ApiSwRequirementModel, asr_ids)
+    if model is TestSpecificationTestCaseModel:
+        rows = connection.execute(select(model.test_specification_mapping_api_id,
+                                         model.test_specification_mapping_sw_requirement_id).where(
+            model.id.in_(ids))).all()
+        return mapping_api_ids(connection, ApiTestSpecificationModel, [x[0] for x in rows]) | \
+            mapping_api_ids(connection, SwRequirementTestSpecificationModel, [x[1] for x in rows])
+
+    # Work items, every api mapping them directly or indirectly
+    ret = set()
+    for parent, key in WORK_ITEM_PARENTS.get(model, []):
+        parent_ids = connection.execute(select(parent.id).where(getattr(parent, key).in_(ids))).scalars().all()
+        ret |= mapping_api_ids(connection, parent, parent_ids)
+    return ret
+
+
+def target_api_ids(connection, target):
+    """Ids of the apis whose mapping tree contains target.
+    The parents of target are read from its attributes, so it works on deleted rows too.
+    """
+    if isinstance(target, ApiModel):
+        return {target.id}
+    if type(target) in DIRECT_MAPPINGS:
+        return {target.api_id}
+    if isinstance(target, (SwRequirementTestSpecificationModel, SwRequirementTestCaseModel)):
+        return mapping_api_ids(connection, ApiSwRequirementModel, [target.sw_requirement_mapping_api_id])
+    if isinstance(target, TestSpecificationTestCaseModel):
+        return mapping_api_ids(connection, ApiTestSpecificationModel, [target.test_specification_mapping_api_id]) | \
+            mapping_api_ids(connection, SwRequirementTestSpecificationModel,
+                            [target.test_specification_mapping_sw_requirement_id])
+    if isinstance(target, CommentModel):
+        model = MAPPING_MODELS.get(target.parent_table)
+        return mapping_api_ids(connection, model, [target.parent_id]) if model else set()
+    return mapping_api_ids(connection, type(target), [target.id])
+
+
+def register_invalidation(cache):
+    """Invalidate the cached views of the apis touched by the flushed rows once they are committed.
+    Changes made with core statements, that don't emit the mapper events, have to call invalidate().
+    """
+    models = [ApiModel, CommentModel] + list(WORK_ITEM_PARENTS.keys()) + list(MAPPING_MODELS.values())
+
+    def receive_change(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('invalidated_api_ids', set()).update(target_api_ids(connection, target))
+
+    def receive_after_commit(session):
+        api_ids = session.info.pop('invalidated_api_ids', None)
+        if api_ids:
+            cache.invalidate(api_ids)
+
+    def receive_after_rollback(session):
+        session.info.pop('invalidated_api_ids', None)
+
+    for model in models:
+        for identifier in ["after_insert", "after_update", "after_delete"]:
+            event.listen(model, identifier, receive_change)
+    event.listen(Session, "after_commit", receive_after_commit)
+    event.listen(Session, "after_rollback", receive_after_rollback)
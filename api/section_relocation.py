@@ -0,0 +1,227 @@
+import bisect, difflib, statistics
+
+
+class SectionRelocator():
+    """Map the sections of a specification forward to a new version of it.
+
+    With a snapshot of the specification the sections were mapped against,
+    a line diff of the two versions gives the new position of every old
+    offset: text on unchanged lines is moved by the diff, offsets on replaced
+    lines by a character diff of the old and new lines, and a section that
+    overlaps changed text is scored with its similarity to the stored section.
+    Without a snapshot, or when a section doesn't match the snapshot at its
+    offset, the lines of the section are searched in the new specification
+    near the old offset.
+    A section not similar enough to the text found this way is compared with
+    the windows of the new specification around the old offset before it is lost.
+    """
+
+    OK = 'ok'  # same section at the same offset
+    MOVED = 'moved'  # same section at another offset
+    EDITED = 'edited'  # section changed, similarity >= min_similarity
+    LOST = 'lost'
+
+    # Characters searched before and after the old offset by fuzzy_range()
+    SEARCH_RADIUS = 2000
+    # Windows compared with ratio() by fuzzy_range()
+    FUZZY_CANDIDATES = 10
+
+    def __init__(self, new_spec, old_spec=None, min_similarity=0.6):
+        self.new_spec = new_spec
+        self.old_spec = old_spec
+        self.min_similarity = min_similarity
+        self.occurrences_cache = {}
+        self.char_opcodes_cache = {}
+        self.new_line_starts = None
+        self.ranges = []
+        if old_spec is not None:
+            self.diff()
+
+    def line_offsets(self, lines):
+        ret = [0]
+        for line in lines:
+            ret.append(ret[-1] + len(line))
+        return ret
+
+    def diff(self):
+        """Line diff of old and new specification, stored as a list of
+        (tag, old start, old end, new start, new end) character ranges
+        sorted by old start. Insertions are not needed to map old offsets.
+        """
+        old_lines = self.old_spec.splitlines(keepends=True)
+        new_lines = self.new_spec.splitlines(keepends=True)
+        old_offsets = self.line_offsets(old_lines)
+        new_offsets = self.line_offsets(new_lines)
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+        self.ranges = [(tag, old_offsets[i1], old_offsets[i2], new_offsets[j1], new_offsets[j2])
+                       for tag, i1, i2, j1, j2 in matcher.get_opcodes() if i2 > i1]
+        self.range_starts = [x[1] for x in self.ranges]
+        self.range_ends = [x[2] for x in self.ranges]
+
+    def map_range(self, start, end):
+        """Return (new start, new end) of the old range [start, end).
+        A boundary on replaced lines is mapped with a character diff of the
+        old and new lines, on deleted lines it is moved to where they were
+        """
+        if not self.ranges or start >= self.range_ends[-1]:
+            return len(self.new_spec), len(self.new_spec)
+
+        i = bisect.bisect_right(self.range_starts, start) - 1
+        new_start = self.map_offset(i, start, False)
+        j = min(bisect.bisect_left(self.range_ends, end), len(self.ranges) - 1)
+        new_end = self.map_offset(j, end, True)
+        return new_start, max(new_start, new_end)
+
+    def map_offset(self, i, offset, is_end):
+        """New offset of the old offset in the range i of the line diff,
+        an end offset is mapped as the end of the character before it
+        """
+        tag, old_start, old_end, new_start, new_end = self.ranges[i]
+        if tag == 'equal':
+            return new_start + offset - old_start
+        if tag != 'replace':
+            return new_start
+
+        relative = offset - old_start
+        for char_tag, i1, i2, j1, j2 in self.char_opcodes(i):
+            if i1 <= relative < i2 or (is_end and i1 < relative <= i2):
+                if char_tag == 'equal':
+                    return new_start + j1 + relative - i1
+                return new_start + (j2 if is_end else j1)
+        return new_end if is_end else new_start
+
+    def char_opcodes(self, i):
+        """Character diff of the old and new lines of the replace range i"""
+        if i not in self.char_opcodes_cache.keys():
+            tag, old_start, old_end, new_start, new_end = self.ranges[i]
+            matcher = difflib.SequenceMatcher(None, self.old_spec[old_start:old_end],
+                                              self.new_spec[new_start:new_end], autojunk=False)
+            self.char_opcodes_cache[i] = [x for x in matcher.get_opcodes() if x[2] > x[1]]
+        return self.char_opcodes_cache[i]
+
+    def anchor_range(self, section, offset):
+        """Return (new start, new end) of the region of the new specification
+        that contains the lines of section nearest to offset, (None, None)
+        if none of them is found
+        """
+        matches = []
+        line_offset = 0
+        for line in section.splitlines(keepends=True):
+            text = line.strip()
+            if text:
+                expected = offset + line_offset + line.find(text)
+                positions = self.occurrences(text)
+                if positions:
+                    position = min(positions, key=lambda x: abs(x - expected))
+                    # Offset of the section implied by this line
+                    matches.append((position - line_offset - line.find(text), position, position + len(text)))
+            line_offset += len(line)
+
+        if not matches:
+            return None, None
+
+        # Discard lines matched far away from the others (e.g. common lines)
+        implied_offset = statistics.median_low([x[0] for x in matches])
+        matches = [x for x in matches if abs(x[0] - implied_offset) <= len(section)]
+        return min([x[1] for x in matches]), max([x[2] for x in matches])
+
+    def fuzzy_range(self, section, offset):
+        """Return (new start, new end) of the window of the new specification
+        near offset most similar to section, (None, None) if none is similar enough.
+        Windows as long as section starting at every line start and every
+        quarter of section are compared, the best one is then aligned to the
+        characters of section it matches.
+        """
+        if self.new_line_starts is None:
+            self.new_line_starts = self.line_offsets(self.new_spec.splitlines(keepends=True))
+        low = max(0, offset - self.SEARCH_RADIUS)
+        high = max(low, min(len(self.new_spec) - 1, offset + self.SEARCH_RADIUS))
+        step = max(1, len(section) // 4)
+        starts = set(range(low, high + 1, step))
+        starts.add(min(max(offset, low), high))
+        starts.update(self.new_line_starts[bisect.bisect_left(self.new_line_starts, low):
+                                           bisect.bisect_right(self.new_line_starts, high)])
+
+        def score(start, end):
+            # Nearest to offset among the most similar
+            return self.similarity(section, self.new_spec[start:end]), -abs(start - offset)
+
+        def quick_score(start):
+            matcher = difflib.SequenceMatcher(None, section, self.new_spec[start:start + len(section)], autojunk=False)
+            return matcher.quick_ratio(), -abs(start - offset)
+
+        # ratio() only on the windows with the best upper bound
+        starts = sorted(starts, key=quick_score, reverse=True)[:self.FUZZY_CANDIDATES]
+        best, start = max([(score(x, x + len(section)), x) for x in starts])
+        if best[0] < self.min_similarity:
+            return None, None
+        end = start + len(section)
+
+        # Align the window to the text of section matched around it
+        region_start = max(0, start - step)
+        matcher = difflib.SequenceMatcher(None, section, self.new_spec[region_start:end + step], autojunk=False)
+        blocks = [x for x in matcher.get_matching_blocks() if x.size > 0]
+        aligned_start = max(0, region_start + blocks[0].b - blocks[0].a)
+        aligned_end = min(len(self.new_spec), region_start + blocks[-1].b + len(section) - blocks[-1].a)
+        if aligned_end > aligned_start and score(aligned_start, aligned_end)[0] >= self.min_similarity:
+            return aligned_start, aligned_end
+        return start, end
+
+    def occurrences(self, text):
+        if text not in self.occurrences_cache.keys():
+            offsets = []
+            offset = self.new_spec.find(text)
+            while offset != -1:
+                offsets.append(offset)
+                offset = self.new_spec.find(text, offset + 1)
+            self.occurrences_cache[text] = offsets
+        return self.occurrences_cache[text]
+
+    def similarity(self, a, b):
+        matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        # Cheap upper bounds first, ratio() is quadratic
+        if matcher.real_quick_ratio() < self.min_similarity or matcher.quick_ratio() < self.min_similarity:
+            return 0.0
+        return matcher.ratio()
+
+    def matches_snapshot(self, section, offset):
+        return self.old_spec is not None and self.old_spec[offset:offset + len(section)] == section
+
+    def relocate(self, section, offset):
+        """
+        return: dict with the status, the new offset and section and the
+                similarity (1.0 for sections found verbatim)
+        """
+        if self.matches_snapshot(section, offset):
+            start, end = self.map_range(offset, offset + len(section))
+        else:
+            start, end = self.anchor_range(section, offset)
+            if start is None:
+                # No line of the section left, it can only be found verbatim
+                start, end = offset, offset
+
+        if len(section) == 0:
+            return self.result(self.OK if start == offset else self.MOVED, start, section, 1.0)
+
+        positions = self.occurrences(section)
+        if positions:
+            new_offset = min(positions, key=lambda x: abs(x - start))
+            return self.result(self.OK if new_offset == offset else self.MOVED, new_offset, section, 1.0)
+
+        new_section = self.new_spec[start:end]
+        similarity = self.similarity(section, new_section) if new_section else 0.0
+        if similarity < self.min_similarity:
+            fuzzy_start, fuzzy_end = self.fuzzy_range(section, offset)
+            if fuzzy_start is not None:
+                start = fuzzy_start
+                new_section = self.new_spec[fuzzy_start:fuzzy_end]
+                similarity = self.similarity(section, new_section)
+        if similarity < self.min_similarity:
+            return self.result(self.LOST, None, None, similarity)
+        return self.result(self.EDITED, start, new_section, similarity)
+
+    def result(self, status, offset, section, similarity):
+        return {'status': status,
+                'offset': offset,
+                'section': section,
+                'similarity': round(similarity, 3)}
@@ -0,0 +1,114 @@
+# Decimals of the coverage of a section, so it doesn't depend on the order the coverages are summed
+SECTION_COVERAGE_DECIMALS = 9
+
+
+def sweep_sections(specification, starts, ends, coverages):
+    """Cut specification at the start and at the end of every mapped item,
+    sweeping the boundaries in order.
+    yield: (start, end, items, coverage) of every section, items are the indexes of
+           the mapped items covering it and coverage the sum of their coverage, limited to 0..100.
+           Sections with only blank characters and no mapped items are skipped.
+    """
+    boundaries = sorted({0, len(specification)}.union(starts, ends))
+    boundary_index = {boundaries[i]: i for i in range(len(boundaries))}
+    starting = [[] for i in range(len(boundaries))]
+    ending = [[] for i in range(len(boundaries))]
+    for iItem in range(len(starts)):
+        starting[boundary_index[starts[iItem]]].append(iItem)
+        ending[boundary_index[ends[iItem]]].append(iItem)
+
+    active_items = set()
+    for iB in range(len(boundaries) - 1):
+        active_items.difference_update(ending[iB])
+        active_items.update(starting[iB])
+
+        if len(active_items) == 0 and \
+                specification[boundaries[iB]:boundaries[iB + 1]].strip() == "":
+            continue
+
+        items = tuple(sorted(active_items))
+        coverage_total = 0
+        for iItem in items:
+            coverage_total += coverages[iItem]
+        coverage_total = min(max(round(coverage_total, SECTION_COVERAGE_DECIMALS), 0), 100)
+        yield boundaries[iB], boundaries[iB + 1], items, coverage_total
+
+
+class MappedSection():
+    """Section of the specification between two consecutive boundaries,
+    with the indexes of the mapped work items covering it, in mapping order.
+    """
+    __slots__ = ('start', 'end', 'coverage', 'items')
+
+    def __init__(self, start, end, coverage, items):
+        self.start = start
+        self.end = end
+        self.coverage = coverage
+        self.items = items
+
+
+class SpecificationSections():
+    """Sections of a specification cut at every boundary of the matching mappings.
+
+    Every section is a MappedSection referencing the work items of the mappings
+    by index, so a work item covering many sections is stored once.
+    as_dicts() builds the json shape of the mapping views, where every
+    section lists its work items, when the response is returned.
+    """
+    __slots__ = ('specification', 'item_keys', 'work_items', 'sections')
+
+    def __init__(self, specification, mapping, work_item_types):
+        """
+        mapping: dict of the mapping rows of every work item type (e.g. ApiSwRequirement),
+                 each row has its own specification section information
+        work_item_types: list of work items type for direct mapping to display in the current view
+        """
+        self.specification = specification
+        self.item_keys = []
+        self.work_items = []
+        self.sections = []
+
+        starts = []
+        ends = []
+        for work_item_type in work_item_types:
+            items_key = f"{work_item_type}s"
+            for current in mapping[items_key]:
+                if not current['match']:
+                    continue
+                start = current['offset']
+                end = current['offset'] + len(current['section'])
+                if end <= start:
+                    continue
+
+                work_item = current[work_item_type]
+                work_item['relation_id'] = current['relation_id']
+                work_item['coverage'] = current['coverage'] if 'coverage' in current.keys() else 0
+                work_item['version'] = current['version']
+
+                self.item_keys.append(items_key)
+                self.work_items.append(work_item)
+                starts.append(start)
+                ends.append(end)
+
+        coverages = [x['coverage'] for x in self.work_items]
+        for start, end, items, coverage in sweep_sections(specification, starts, ends, coverages):
+            self.sections.append(MappedSection(start, end, coverage, items))
+
+    def __len__(self):
+        return len(self.sections)
+
+    def section_dict(self, mapped_section, item_keys):
+        ret = {'section': self.specification[mapped_section.start:mapped_section.end],
+               'offset': mapped_section.start,
+               'coverage': mapped_section.coverage,
+               'delete': 0}
+        ret.update({x: [] for x in item_keys})
+        for iItem in mapped_section.items:
+            ret[self.item_keys[iItem]].append(self.work_items[iItem])
+        return ret
+
+    def as_dicts(self, item_keys):
+        """List of section dicts with a list of work items for each of item_keys.
+        Work items are shared by the sections they cover, not copied.
+        """
+        return [self.section_dict(x, item_keys) for x in self.sections]
@@ -0,0 +1,107 @@
+"""SPDX export of many libraries in a pool of processes.
+
+Every library is exported by a worker process with its own database engine
+and session, the document is written to a temporary file and moved in place.
+
+Run from the BASIL project root directory:
+
+    python3 api/spdx_batch_export.py [--workers N] [--export-dir DIR] [--force] [library ...]
+
+Without libraries every library in the database is exported.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse, multiprocessing, os, sys, time
+import spdx_manager
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+db_path = os.path.join(os.path.dirname(currentdir), "db")
+models_path = os.path.join(db_path, "models")
+sys.path.insert(0, models_path)
+sys.path.insert(0, db_path)
+
+import db_orm
+from api import ApiModel
+
+EXPORT_DIR = os.path.join(os.path.dirname(currentdir), "app", "public", "spdx_export")
+
+
+def export_filename(library, content_hash):
+    return f"{library}-{content_hash}.json"
+
+
+def export_library(library, export_dir, content_hash=None, force=False):
+    """Export library to export_dir, named after its content hash, and return the export report.
+    An existing export of the same content is reused unless force is set.
+    Runs in a worker process, so errors are reported instead of raised.
+    """
+    start = time.perf_counter()
+    report = {'library': library,
+              'filename': None,
+              'status': 'exported',
+              'error': None,
+              'seconds': None}
+    dbi = db_orm.DbInterface()
+    try:
+        if content_hash is None:
+            content_hash = spdx_manager.library_content_hash(dbi.session, library)
+        report['filename'] = export_filename(library, content_hash)
+        filepath = os.path.join(export_dir, report['filename'])
+        if os.path.exists(filepath) and not force:
+            report['status'] = 'reused'
+        else:
+            os.makedirs(export_dir, exist_ok=True)
+            spdx_manager.export_spdx_library(dbi.session, library, filepath)
+    except Exception as exp:
+        report['status'] = 'failed'
+        report['error'] = str(exp)
+    finally:
+        db_orm.remove_sessions()
+    report['seconds'] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def process_pool(workers=None):
+    """Pool of worker processes. Processes are spawned, so they don't inherit
+    the database connections of the parent process.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def all_libraries():
+    dbi = db_orm.DbInterface()
+    try:
+        return sorted([x.library for x in dbi.session.query(ApiModel.library).distinct()])
+    finally:
+        db_orm.remove_sessions()
+
+
+def export_libraries(libraries, export_dir=EXPORT_DIR, workers=None, force=False):
+    """Export libraries concurrently and return their reports sorted by library"""
+    reports = []
+    with process_pool(workers) as pool:
+        futures = [pool.submit(export_library, x, export_dir, None, force) for x in libraries]
+        for future in as_completed(futures):
+            reports.append(future.result())
+    return sorted(reports, key=lambda x: x['library'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the SPDX documents of many libraries")
+    parser.add_argument("libraries", nargs="*", help="libraries to export, all when empty")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--export-dir", default=EXPORT_DIR, help="directory of the exported documents")
+    parser.add_argument("--force", action="store_true", help="export again the libraries exported before")
+    args = parser.parse_args(argv)
+
+    libraries = args.libraries if args.libraries else all_libraries()
+    start = time.perf_counter()
+    reports = export_libraries(libraries, args.export_dir, args.workers, args.force)
+    for report in reports:
+        print(f"{report['library']}: {report['status']} in {report['seconds']}s "
+              f"{report['error'] if report['error'] else report['filename']}")
+    print(f"{len(reports)} libraries in {round(time.perf_counter() - start, 3)}s")
+    return 1 if [x for x in reports if x['status'] == 'failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,11 @@
 from spdx_tools.spdx.model import (Document, CreationInfo, Checksum, ChecksumAlgorithm, File,
                                     Package, FileType, Relationship, RelationshipType, Snippet)
-from spdx_tools.spdx.validation.document_validator import validate_full_spdx_document
-from spdx_tools.spdx.writer.write_anything import write_file
+from spdx_tools.spdx.jsonschema.document_converter import DocumentConverter
+from spdx_tools.spdx.jsonschema.file_converter import FileConverter
+from spdx_tools.spdx.jsonschema.relationship_converter import RelationshipConverter
+from spdx_tools.spdx.jsonschema.snippet_converter import SnippetConverter
 import os, sys
-import hashlib, json
+import hashlib, json, tempfile
 import datetime
 
 currentdir = os.path.dirname(os.path.realpath(__file__))
@@ -13,19 +15,96 @@ sys.path.insert(0, models_path)
 sys.path.insert(0, db_path)
 
 import db_orm
+from sqlalchemy import bindparam, insert, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from db_base import Base
+from mapping_loader import MappingTreeLoader
+from spdx_fragment import SpdxFragmentModel, delete_stale_fragments
 from api import ApiModel
 from api_sw_requirement import ApiSwRequirementModel
 from api_test_specification import ApiTestSpecificationModel
 from api_test_case import ApiTestCaseModel
 from api_justification import ApiJustificationModel
+from justification import JustificationModel
+from sw_requirement import SwRequirementModel
 from sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from test_case import TestCaseModel
+from test_specification import TestSpecificationModel
 from test_specification_test_case import TestSpecificationTestCaseModel
 
+# Number of apis whose mappings are read together
+API_CHUNK_SIZE = 100
+# Number of stored fragments read with a query
+FRAGMENT_CHUNK_SIZE = 500
+
+
+def library_content_hash(db_session, library):
+    """sha256 of id, version and updated_at of the apis of library, of their
+    exported mappings and of the mapped work items.
+    It changes whenever a row read by the export of the library is changed, added or deleted.
+    """
+    apis = select(ApiModel.id).where(ApiModel.library == library)
+    api_srs = select(ApiSwRequirementModel.id).where(ApiSwRequirementModel.api_id.in_(apis))
+    api_tss = select(ApiTestSpecificationModel.id).where(ApiTestSpecificationModel.api_id.in_(apis))
+    sr_tss = select(SwRequirementTestSpecificationModel.id).where(
+        SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id.in_(api_srs))
+    ts_tcs = or_(TestSpecificationTestCaseModel.test_specification_mapping_api_id.in_(api_tss),
+                 TestSpecificationTestCaseModel.test_specification_mapping_sw_requirement_id.in_(sr_tss))
+
+    rows = [(ApiModel, ApiModel.library == library),
+            (ApiSwRequirementModel, ApiSwRequirementModel.api_id.in_(apis)),
+            (ApiTestSpecificationModel, ApiTestSpecificationModel.api_id.in_(apis)),
+            (ApiTestCaseModel, ApiTestCaseModel.api_id.in_(apis)),
+            (ApiJustificationModel, ApiJustificationModel.api_id.in_(apis)),
+            (SwRequirementTestSpecificationModel, SwRequirementTestSpecificationModel.id.in_(sr_tss)),
+            (TestSpecificationTestCaseModel, ts_tcs),
+            (SwRequirementModel, SwRequirementModel.id.in_(
+                select(ApiSwRequirementModel.sw_requirement_id).where(ApiSwRequirementModel.api_id.in_(apis)))),
+            (TestSpecificationModel, or_(
+                TestSpecificationModel.id.in_(select(ApiTestSpecificationModel.test_specification_id).where(
+                    ApiTestSpecificationModel.api_id.in_(apis))),
+                TestSpecificationModel.id.in_(select(SwRequirementTestSpecificationModel.test_specification_id).where(
+                    SwRequirementTestSpecificationModel.id.in_(sr_tss))))),
+            (TestCaseModel, or_(
+                TestCaseModel.id.in_(select(ApiTestCaseModel.test_case_id).where(ApiTestCaseModel.api_id.in_(apis))),
+                TestCaseModel.id.in_(select(TestSpecificationTestCaseModel.test_case_id).where(ts_tcs)))),
+            (JustificationModel, JustificationModel.id.in_(
+                select(ApiJustificationModel.justification_id).where(ApiJustificationModel.api_id.in_(apis))))]
+
+    content_hash = hashlib.sha256()
+    for model, where in rows:
+        content_hash.update(f'{model.__tablename__}\n'.encode())
+        query = select(model.id, model.version, model.updated_at).where(where).order_by(model.id)
+        for row in db_session.execute(query):
+            content_hash.update(f'{row[0]}:{row[1]}:{row[2]}\n'.encode())
+    return content_hash.hexdigest()
+
+def export_spdx_library(db_session, library, filepath):
+    """Write the SPDX export of the apis of library to filepath"""
+    apis = db_session.query(ApiModel).filter(
+        ApiModel.library == library
+    ).all()
+
+    spdxManager = SPDXManager(f"SPDX-{library.upper()}-EXPORT", db_session)
+    spdxManager.add_apis_to_export(apis)
+    spdxManager.delete_stale_fragments()
+    spdxManager.export(filepath)
+
+
 class SPDXManager():
+    """SPDX document of a set of apis and of their mappings.
+
+    Elements are converted to json when they are added and spooled to
+    temporary files, export() writes the document from them, so the memory
+    used doesn't depend on the number of exported elements.
+    Every element is written once, the first time its SPDX id is added.
+    The json of every file and snippet is stored in spdx_fragments with the hash
+    of the data it is built from and reused until the data changes.
+    """
 
     document = None
 
-    def __init__(self, document_name):
+    def __init__(self, document_name, db_session=None):
         ci = CreationInfo(spdx_id=document_name,
                           spdx_version="",
                           name=document_name,
@@ -33,7 +112,18 @@ class SPDXManager():
                           creators=[],
                           created=datetime.datetime.now())
         self.document = Document(ci)
-
+        self.db_session = db_session if db_session else db_orm.DbInterface().session
+        self.loader = MappingTreeLoader(self.db_session, None)
+        self.converters = {'files': FileConverter(),
+                           'snippets': SnippetConverter(),
+                           'relationships': RelationshipConverter()}
+        self.spools = {x: tempfile.TemporaryFile(mode='w+', encoding='utf-8') for x in self.converters.keys()}
+        self.counts = {x: 0 for x in self.converters.keys()}
+        self.spdx_ids = set()
+        self.relationships = set()
+        self.related_spdx_ids = set()
+        self.fragments = {}
+        self.changed_fragments = {}
 
     def dict_hash(self, dictionary) -> str:
         """MD5 hash of a dictionary."""
@@ -44,8 +134,118 @@ class SPDXManager():
         dhash.update(encoded)
         return dhash.hexdigest()
 
-    def ApiSwRequirementSPDX(self, _asr, _dbsession):
-        asr_dict = _asr.as_dict(full_data=True, db_session=_dbsession)
+    def write_fragment(self, section, fragment):
+        if self.counts[section]:
+            self.spools[section].write(',\n')
+        self.spools[section].write(fragment)
+        self.counts[section] += 1
+
+    def write_element(self, section, element):
+        self.write_fragment(section, json.dumps(self.converters[section].convert(element, self.document), indent=4))
+
+    def exported(self, spdx_id):
+        return spdx_id in self.spdx_ids
+
+    def add_element(self, section, spdx_id, builder, source, *args):
+        """Write the element returned by builder(source(*args)) if spdx_id is not exported yet.
+        The json stored by a previous export is written instead if the source dict didn't change.
+        """
+        if self.exported(spdx_id):
+            return
+        self.spdx_ids.add(spdx_id)
+        source_dict = source(*args)
+        source_hash = self.dict_hash(source_dict)
+        fragment = self.fragments.get(spdx_id)
+        if fragment is None or fragment[0] != source_hash:
+            element = builder(source_dict)
+            fragment = (source_hash, json.dumps(self.converters[section].convert(element, self.document), indent=4))
+            self.changed_fragments[spdx_id] = fragment
+        self.write_fragment(section, fragment[1])
+
+    def add_file(self, spdx_id, builder, source, *args):
+        self.add_element('files', spdx_id, builder, source, *args)
+
+    def add_snippet(self, spdx_id, builder, source, *args):
+        self.add_element('snippets', spdx_id, builder, source, *args)
+
+    def add_relationship(self, spdx_element_id, relationship_type, related_spdx_element_id):
+        key = (spdx_element_id, relationship_type, related_spdx_element_id)
+        if key not in self.relationships:
+            self.relationships.add(key)
+            self.related_spdx_ids.update([spdx_element_id, related_spdx_element_id])
+            self.write_element('relationships', Relationship(*key))
+
+    def load_fragments(self, spdx_ids):
+        """Read the stored fragments of the elements not exported yet"""
+        spdx_ids = sorted(set(spdx_ids) - self.spdx_ids)
+        self.fragments = {}
+        for i in range(0, len(spdx_ids), FRAGMENT_CHUNK_SIZE):
+            query = select(SpdxFragmentModel.spdx_id,
+                           SpdxFragmentModel.source_hash,
+                           SpdxFragmentModel.fragment).where(
+                SpdxFragmentModel.spdx_id.in_(spdx_ids[i:i + FRAGMENT_CHUNK_SIZE]))
+            for row in self.db_session.execute(query):
+                self.fragments[row[0]] = (row[1], row[2])
+
+    def store_fragments(self):
+        """Store the fragments built since the last call.
+        They are written in their own transaction, so the export session is not committed.
+        The store is a cache: if it fails the export goes on and the fragments are built again next time.
+        """
+        if not self.changed_fragments:
+            return
+        table = SpdxFragmentModel.__table__
+        now = datetime.datetime.now()
+        rows = [{'b_spdx_id': k, 'source_hash': v[0], 'fragment': v[1], 'updated_at': now}
+                for k, v in self.changed_fragments.items()]
+        updates = [x for x in rows if x['b_spdx_id'] in self.fragments]
+        inserts = [{'spdx_id': x['b_spdx_id'], 'source_hash': x['source_hash'],
+                    'fragment': x['fragment'], 'updated_at': now}
+                   for x in rows if x['b_spdx_id'] not in self.fragments]
+        try:
+            with self.db_session.get_bind().begin() as connection:
+                if updates:
+                    connection.execute(update(table).where(table.c.spdx_id == bindparam('b_spdx_id')),
+                                       updates)
+                if inserts:
+                    connection.execute(insert(table), inserts)
+        except SQLAlchemyError as e:
+            print(f"Unable to store the SPDX fragments: {e}")
+        self.changed_fragments = {}
+
+    def delete_stale_fragments(self):
+        """Delete the stored fragments of the deleted elements, in their own transaction
+        as store_fragments() does.
+        """
+        try:
+            with self.db_session.get_bind().begin() as connection:
+                delete_stale_fragments(connection)
+        except SQLAlchemyError as e:
+            print(f"Unable to delete the stale SPDX fragments: {e}")
+
+    def item_dict(self, item):
+        """Fields of a work item used by the files"""
+        return item.as_dict(full_data=True, db_session=self.db_session)
+
+    def mapping_dict(self, mapping, item_key, coverage):
+        """Fields of a direct mapping used by the snippets"""
+        return {'relation_id': mapping.id,
+                'api': {'raw_specification_url': mapping.api.raw_specification_url},
+                item_key: {'id': getattr(mapping, f'{item_key}_id')},
+                'section': mapping.section,
+                'offset': mapping.offset,
+                'coverage': coverage,
+                'version': mapping.current_version(self.db_session),
+                'updated_at': mapping.updated_at.strftime(Base.dt_format_str)}
+
+    def ApiSPDX(self, api_dict):
+        tmp = File(spdx_id=f"API-{api_dict['id']}",
+                   comment=f"Software Component - category: {api_dict['category']} - library: {api_dict['library']} - library version: {api_dict['library_version']}",
+                   checksums=[Checksum(ChecksumAlgorithm.MD5, self.dict_hash(api_dict))],
+                   name=f"{api_dict['api']}")
+        return tmp
+
+    def ApiSwRequirementSPDX(self, asr_dict):
         tmp = Snippet(spdx_id=f"API-SR-{asr_dict['relation_id']}",
                            comment=f"Software Requirement mapping a Snippet of Software Specification",
                            file_spdx_id=asr_dict['api']['raw_specification_url'],
@@ -58,8 +258,7 @@ class SPDXManager():
                                               f"created: {asr_dict['updated_at']}"])
         return tmp
 
-    def ApiTestSpecificationSPDX(self, _ats, _dbsession):
-        ats_dict = _ats.as_dict(full_data=True, db_session=_dbsession)
+    def ApiTestSpecificationSPDX(self, ats_dict):
 
         tmp = Snippet(spdx_id=f"API-TS-{ats_dict['relation_id']}",
                            comment=f"Test Specification mapping a Snippet of Software Specification",
@@ -73,8 +272,7 @@ class SPDXManager():
                                               f"created: {ats_dict['updated_at']}"])
         return tmp
 
-    def ApiTestCaseSPDX(self, _atc, _dbsession):
-        atc_dict = _atc.as_dict(full_data=True, db_session=_dbsession)
+    def ApiTestCaseSPDX(self, atc_dict):
 
         tmp = Snippet(spdx_id=f"API-TC-{atc_dict['relation_id']}",
                            comment=f"Test Case mapping a Snippet of Software Specification",
@@ -88,8 +286,7 @@ class SPDXManager():
                                               f"created: {atc_dict['updated_at']}"])
         return tmp
 
-    def ApiJustificationSPDX(self, _js, _dbsession):
-        js_dict = _js.as_dict(full_data=True, db_session=_dbsession)
+    def ApiJustificationSPDX(self, js_dict):
 
         tmp = Snippet(spdx_id=f"API-JUST-{js_dict['relation_id']}",
                       comment=f"Justification mapping a Snippet of Software Specification",
@@ -102,8 +299,7 @@ class SPDXManager():
                                           f"created: {js_dict['updated_at']}"])
         return tmp
 
-    def SwRequirementSPDX(self, _sr, _dbsession):
-        sr_dict = _sr.as_dict(full_data=True, db_session=_dbsession)
+    def SwRequirementSPDX(self, sr_dict):
 
         tmp = File(spdx_id=f"SR-{sr_dict['id']}",
                     name=f"{sr_dict['title']}",
@@ -116,9 +312,7 @@ class SPDXManager():
                     comment="Software Requirement")
         return tmp
 
-    def TestSpecificationSPDX(self, _ts, _dbsession):
-        ts_dict = _ts.as_dict(full_data=True, db_session=_dbsession)
-        print(f"ts_dict: {ts_dict}")
+    def TestSpecificationSPDX(self, ts_dict):
         tmp = File(spdx_id=f"TS-{ts_dict['id']}",
                    name=f"{ts_dict['title']}",
                    checksums=[Checksum(ChecksumAlgorithm.MD5, self.dict_hash(ts_dict))],
@@ -132,8 +326,7 @@ class SPDXManager():
                    comment="Test Specification")
         return tmp
 
-    def TestCaseSPDX(self, _tc, _dbsession):
-        tc_dict = _tc.as_dict(full_data=True, db_session=_dbsession)
+    def TestCaseSPDX(self, tc_dict):
 
         tmp = File(spdx_id=f"TC-{tc_dict['id']}",
                    name=f"{tc_dict['title']}",
@@ -148,8 +341,7 @@ class SPDXManager():
                    comment="Test Case")
         return tmp
 
-    def JustificationSPDX(self, _js, _dbsession):
-        js_dict = _js.as_dict(full_data=True, db_session=_dbsession)
+    def JustificationSPDX(self, js_dict):
 
         tmp = File(spdx_id=f"JUST-{js_dict['id']}",
                    name=f"{js_dict['description']}",
@@ -162,132 +354,149 @@ class SPDXManager():
         return tmp
 
     def add_api_to_export(self, api_id):
-        dbi = db_orm.DbInterface()
-        api = dbi.session.query(ApiModel).filter(ApiModel.id == api_id).one()
-
-        api_sw_requirements = dbi.session.query(ApiSwRequirementModel).filter(
-            ApiSwRequirementModel.api_id == api_id
-        ).all()
-
-
-        spdx_api = File(spdx_id=f"API-{api.id}",
-                        comment=f"Software Component - category: {api.category} - library: {api.library} - library version: {api.library_version}",
-                        checksums=[Checksum(ChecksumAlgorithm.MD5, self.dict_hash(api.as_dict()))],
-                        name=f"{api.api}")
-
-        self.document.files += [spdx_api]
-
-        # ApiSwRequirement
-        for asr in api_sw_requirements:
-            #ApiSwRequirement
-            spdx_asr = self.ApiSwRequirementSPDX(asr, dbi.session)
-            api_asr_rel = Relationship(f"API-{api.id}",
-                                      RelationshipType.GENERATES,
-                                      f"API-SR-{asr.id}")
-            spdx_sr = self.SwRequirementSPDX(asr.sw_requirement, dbi.session)
-            asr_sr_rel = Relationship(f"SR-{asr.sw_requirement.id}",
-                                      RelationshipType.REQUIREMENT_DESCRIPTION_FOR,
-                                      f"API-SR-{asr.id}")
-
-            #SwRequirementTestSpecification
-            sr_tss = dbi.session.query(SwRequirementTestSpecificationModel).filter(
-                SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id == asr.id
-            ).all()
-            for sr_ts in sr_tss:
-                spdx_ts = self.TestSpecificationSPDX(sr_ts.test_specification, dbi.session)
-                asr_ts_rel = Relationship(f"TS-{sr_ts.test_specification.id}",
-                                          RelationshipType.TEST_OF,
+        api = self.db_session.query(ApiModel).filter(ApiModel.id == api_id).one()
+        self.add_apis_to_export([api])
+
+    def add_apis_to_export(self, apis):
+        """Add apis with their mappings, reading the mappings
+        of API_CHUNK_SIZE apis with a query per mapping table
+        """
+        for i in range(0, len(apis), API_CHUNK_SIZE):
+            chunk = apis[i:i + API_CHUNK_SIZE]
+            api_ids = [x.id for x in chunk]
+            api_srs = self.loader.children(ApiSwRequirementModel, 'api_id', api_ids, 'sw_requirement')
+            api_tss = self.loader.children(ApiTestSpecificationModel, 'api_id', api_ids, 'test_specification')
+            api_tcs = self.loader.children(ApiTestCaseModel, 'api_id', api_ids, 'test_case')
+            api_js = self.loader.children(ApiJustificationModel, 'api_id', api_ids, 'justification')
+
+            api_srs_rows = [x for rows in api_srs.values() for x in rows]
+            api_tss_rows = [x for rows in api_tss.values() for x in rows]
+            sr_tss = self.loader.children(SwRequirementTestSpecificationModel, 'sw_requirement_mapping_api_id',
+                                          [x.id for x in api_srs_rows], 'test_specification')
+            sr_ts_tcs = self.loader.children(TestSpecificationTestCaseModel,
+                                             'test_specification_mapping_sw_requirement_id',
+                                             [x.id for rows in sr_tss.values() for x in rows], 'test_case')
+            ts_tcs = self.loader.children(TestSpecificationTestCaseModel, 'test_specification_mapping_api_id',
+                                          [x.id for x in api_tss_rows], 'test_case')
+            sr_coverages = self.loader.waterfall_coverages(api_srs_rows)
+            ts_coverages = self.loader.waterfall_coverages(api_tss_rows)
+
+            sr_ts_rows = [x for rows in sr_tss.values() for x in rows]
+            ts_tc_rows = [x for rows in list(sr_ts_tcs.values()) + list(ts_tcs.values()) for x in rows]
+            api_tcs_rows = [x for rows in api_tcs.values() for x in rows]
+            api_js_rows = [x for rows in api_js.values() for x in rows]
+            self.load_fragments([f"API-{x}" for x in api_ids] +
+                                [f"API-SR-{x.id}" for x in api_srs_rows] +
+                                [f"API-TS-{x.id}" for x in api_tss_rows] +
+                                [f"API-TC-{x.id}" for x in api_tcs_rows] +
+                                [f"API-JUST-{x.id}" for x in api_js_rows] +
+                                [f"SR-{x.sw_requirement_id}" for x in api_srs_rows] +
+                                [f"TS-{x.test_specification_id}" for x in api_tss_rows + sr_ts_rows] +
+                                [f"TC-{x.test_case_id}" for x in api_tcs_rows + ts_tc_rows] +
+                                [f"JUST-{x.justification_id}" for x in api_js_rows])
+
+            for api in chunk:
+                self.add_file(f"API-{api.id}", self.ApiSPDX, api.as_dict)
+
+                # ApiSwRequirement
+                for asr in api_srs[api.id]:
+                    #SwRequirementTestSpecification
+                    for sr_ts in sr_tss[asr.id]:
+                        self.add_file(f"TS-{sr_ts.test_specification.id}",
+                                      self.TestSpecificationSPDX, self.item_dict, sr_ts.test_specification)
+                        self.add_relationship(f"TS-{sr_ts.test_specification.id}",
+                                              RelationshipType.TEST_OF,
+                                              f"API-SR-{asr.id}")
+
+                        # TestSpecificationTestCase
+                        for ts_tc in sr_ts_tcs[sr_ts.id]:
+                            self.add_file(f"TC-{ts_tc.test_case.id}", self.TestCaseSPDX, self.item_dict, ts_tc.test_case)
+                            self.add_relationship(f"TC-{ts_tc.test_case.id}",
+                                                  RelationshipType.TEST_CASE_OF,
+                                                  f"API-SR-{asr.id}")
+                            self.add_relationship(f"TS-{sr_ts.test_specification.id}",
+                                                  RelationshipType.SPECIFICATION_FOR,
+                                                  f"TC-{ts_tc.test_case.id}")
+
+                    self.add_snippet(f"API-SR-{asr.id}", self.ApiSwRequirementSPDX,
+                                     self.mapping_dict, asr, 'sw_requirement', sr_coverages[asr.id])
+                    self.add_file(f"SR-{asr.sw_requirement.id}", self.SwRequirementSPDX, self.item_dict, asr.sw_requirement)
+                    self.add_relationship(f"API-{api.id}",
+                                          RelationshipType.GENERATES,
+                                          f"API-SR-{asr.id}")
+                    self.add_relationship(f"SR-{asr.sw_requirement.id}",
+                                          RelationshipType.REQUIREMENT_DESCRIPTION_FOR,
                                           f"API-SR-{asr.id}")
-                self.document.files += [spdx_ts]
-                self.document.relationships += [asr_ts_rel]
-
-                # TestSpecificationTestCase
-                ts_tcs = dbi.session.query(TestSpecificationTestCaseModel).filter(
-                    TestSpecificationTestCaseModel.test_specification_mapping_sw_requirement_id == sr_ts.id
-                ).all()
-                for ts_tc in ts_tcs:
-                    spdx_tc = self.TestCaseSPDX(ts_tc.test_case, dbi.session)
-                    asr_tc_rel = Relationship(f"TC-{ts_tc.test_case.id}",
+
+                # ApiTestSpecification
+                for ats in api_tss[api.id]:
+                    self.add_snippet(f"API-TS-{ats.id}", self.ApiTestSpecificationSPDX,
+                                     self.mapping_dict, ats, 'test_specification', ts_coverages[ats.id])
+                    self.add_file(f"TS-{ats.test_specification.id}",
+                                  self.TestSpecificationSPDX, self.item_dict, ats.test_specification)
+                    self.add_relationship(f"API-{api.id}",
+                                          RelationshipType.GENERATES,
+                                          f"API-TS-{ats.id}")
+                    self.add_relationship(f"TS-{ats.test_specification.id}",
+                                          RelationshipType.TEST_OF,
+                                          f"API-TS-{ats.id}")
+
+                    # TestSpecificationTestCase
+                    for ts_tc in ts_tcs[ats.id]:
+                        self.add_file(f"TC-{ts_tc.test_case.id}", self.TestCaseSPDX, self.item_dict, ts_tc.test_case)
+                        self.add_relationship(f"TC-{ts_tc.test_case.id}",
                                               RelationshipType.TEST_CASE_OF,
-                                              f"API-SR-{asr.id}")
-                    ts_tc_rel = Relationship(f"TS-{sr_ts.test_specification.id}",
-                                             RelationshipType.SPECIFICATION_FOR,
-                                             f"TC-{ts_tc.test_case.id}",)
-                    self.document.files += [spdx_tc]
-                    self.document.relationships += [asr_tc_rel, ts_tc_rel]
-
-            self.document.snippets += [spdx_asr]
-            self.document.files += [spdx_sr]
-            self.document.relationships += [api_asr_rel, asr_sr_rel]
-
-        # ApiTestSpecification
-        api_test_specifications = dbi.session.query(ApiTestSpecificationModel).filter(
-            ApiTestSpecificationModel.api_id == api_id
-        ).all()
-        for ats in api_test_specifications:
-            spdx_ats = self.ApiTestSpecificationSPDX(ats, dbi.session)
-            api_ats_rel = Relationship(f"API-{api.id}",
-                                       RelationshipType.GENERATES,
-                                       f"API-TS-{ats.id}")
-            spdx_ts = self.TestSpecificationSPDX(ats.test_specification, dbi.session)
-            ats_ts_rel = Relationship(f"TS-{ats.test_specification.id}",
-                                      RelationshipType.TEST_OF,
-                                      f"API-TS-{ats.id}")
-
-            # TestSpecificationTestCase
-            ts_tcs = dbi.session.query(TestSpecificationTestCaseModel).filter(
-                TestSpecificationTestCaseModel.test_specification_mapping_api_id == ats.id
-            ).all()
-            for ts_tc in ts_tcs:
-                spdx_tc = self.TestCaseSPDX(ts_tc.test_case, dbi.session)
-                asr_tc_rel = Relationship(f"TC-{ts_tc.test_case.id}",
+                                              f"API-TS-{ats.id}")
+                        self.add_relationship(f"TS-{ats.test_specification.id}",
+                                              RelationshipType.SPECIFICATION_FOR,
+                                              f"TC-{ts_tc.test_case.id}")
+
+                # ApiTestCase
+                for atc in api_tcs[api.id]:
+                    self.add_snippet(f"API-TC-{atc.id}", self.ApiTestCaseSPDX,
+                                     self.mapping_dict, atc, 'test_case', atc.coverage)
+                    self.add_file(f"TC-{atc.test_case.id}", self.TestCaseSPDX, self.item_dict, atc.test_case)
+                    self.add_relationship(f"API-{api.id}",
+                                          RelationshipType.GENERATES,
+                                          f"API-TC-{atc.id}")
+                    self.add_relationship(f"TC-{atc.test_case.id}",
                                           RelationshipType.TEST_CASE_OF,
-                                          f"API-TS-{ats.id}")
-                ts_tc_rel = Relationship(f"TS-{ats.test_specification.id}",
-                                         RelationshipType.SPECIFICATION_FOR,
-                                         f"TC-{ts_tc.test_case.id}", )
-                self.document.files += [spdx_tc]
-                self.document.relationships += [asr_tc_rel, ts_tc_rel]
-
-        # ApiTestCase
-        api_test_cases = dbi.session.query(ApiTestCaseModel).filter(
-            ApiTestCaseModel.api_id == api_id
-        ).all()
-        for atc in api_test_cases:
-            spdx_ats = self.ApiTestCaseSPDX(atc, dbi.session)
-            api_atc_rel = Relationship(f"API-{api.id}",
-                                       RelationshipType.GENERATES,
-                                       f"API-TC-{atc.id}")
-            spdx_tc = self.TestCaseSPDX(atc.test_case, dbi.session)
-            atc_tc_rel = Relationship(f"TC-{atc.test_case.id}",
-                                      RelationshipType.TEST_CASE_OF,
-                                      f"API-TC-{atc.id}")
-            self.document.files += [spdx_tc]
-            self.document.relationships += [api_atc_rel, atc_tc_rel]
-
-        # ApiJustification
-        api_justifications = dbi.session.query(ApiJustificationModel).filter(
-            ApiJustificationModel.api_id == api_id
-        ).all()
-        for aj in api_justifications:
-            spdx_aj = self.ApiJustificationSPDX(aj, dbi.session)
-            api_js_rel = Relationship(f"API-{api.id}",
-                                       RelationshipType.GENERATES,
-                                       f"API-JUST-{aj.id}")
-            spdx_j = self.JustificationSPDX(aj.justification, dbi.session)
-            aj_j_rel = Relationship(f"JUST-{aj.justification.id}",
-                                      RelationshipType.DESCRIBES,
-                                      f"API-JUST-{aj.id}")
-            self.document.files += [spdx_j]
-            self.document.relationships += [api_js_rel, aj_j_rel]
+                                          f"API-TC-{atc.id}")
+
+                # ApiJustification
+                for aj in api_js[api.id]:
+                    self.add_snippet(f"API-JUST-{aj.id}", self.ApiJustificationSPDX,
+                                     self.mapping_dict, aj, 'justification', aj.coverage)
+                    self.add_file(f"JUST-{aj.justification.id}", self.JustificationSPDX, self.item_dict, aj.justification)
+                    self.add_relationship(f"API-{api.id}",
+                                          RelationshipType.GENERATES,
+                                          f"API-JUST-{aj.id}")
+                    self.add_relationship(f"JUST-{aj.justification.id}",
+                                          RelationshipType.DESCRIBES,
+                                          f"API-JUST-{aj.id}")
+
+            self.store_fragments()
 
     def export(self, filepath):
-        validation_messages = validate_full_spdx_document(self.document)
-        for validation_message in validation_messages:
-            print(validation_message.validation_message)
-
-        # if there are no validation messages, the document is valid
-        # and we can safely serialize it without validating again
-        #if not validation_messages:
-        write_file(self.document, filepath, validate=False)
-
+        """Write the document to filepath as json.
+        The file is written to a temporary file and moved, so readers never see a partial document.
+        """
+        missing = self.related_spdx_ids - self.spdx_ids - {self.document.creation_info.spdx_id}
+        for spdx_id in sorted(missing):
+            print(f"Relationship with an element not in the document: {spdx_id}")
+
+        document_dict = DocumentConverter().convert(self.document)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(document_dict, indent=4)[:-2])
+            for section in self.converters.keys():
+                if not self.counts[section]:
+                    continue
+                f.write(f',\n    "{section}": [\n')
+                self.spools[section].seek(0)
+                for line in self.spools[section]:
+                    f.write(f'        {line}')
+                f.write('\n    ]')
+                self.spools[section].close()
+            f.write('\n}')
+        os.replace(tmp_path, filepath)
@@ -0,0 +1,165 @@
+import hashlib, json, os, tempfile, time
+import urllib.request
+from urllib.error import HTTPError, URLError
+
+
+class SpecificationCache():
+    """On disk cache of remote specifications.
+
+    Bodies are stored once per content (sha256) under objects/, every url has
+    a small json file under urls/ with the content hash and the validators
+    (ETag, Last-Modified) returned by the origin.
+    A cached body younger than ttl seconds is served without network access,
+    an older one is revalidated with a conditional request. If the origin is
+    not reachable the stale body is served.
+    The hashes of the last history previous contents of every url are kept,
+    so the mappings can be relocated when a specification changes. Bodies
+    no url references any more are deleted.
+    """
+
+    def __init__(self, cache_dir, ttl=300, timeout=30, history=5):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.history = history
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.urls_dir = os.path.join(cache_dir, "urls")
+
+    def url_key(self, url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def meta_path(self, url):
+        return os.path.join(self.urls_dir, f"{self.url_key(url)}.json")
+
+    def object_path(self, content_hash):
+        return os.path.join(self.objects_dir, content_hash)
+
+    def write_file(self, filepath, data):
+        # Write to a temporary file and move it, so readers never see a partial file
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+
+    def read_meta(self, url):
+        try:
+            with open(self.meta_path(url), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, url, meta):
+        self.write_file(self.meta_path(url), json.dumps(meta).encode())
+
+    def read_body(self, meta):
+        try:
+            with open(self.object_path(meta['hash']), 'rb') as f:
+                return f.read().decode(meta['charset'])
+        except (OSError, KeyError, LookupError, UnicodeDecodeError):
+            return None
+
+    def meta_hashes(self, meta):
+        """Hashes of the bodies referenced by the meta of a url"""
+        return {meta['hash']} | {x['hash'] for x in meta.get('previous', [])}
+
+    def referenced_hashes(self):
+        """Hashes of the bodies referenced by any url"""
+        hashes = set()
+        try:
+            filenames = os.listdir(self.urls_dir)
+        except OSError:
+            return hashes
+        for filename in filenames:
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.urls_dir, filename), 'r') as f:
+                    hashes |= self.meta_hashes(json.load(f))
+            except (OSError, ValueError, KeyError):
+                continue
+        return hashes
+
+    def remove_unreferenced(self, hashes):
+        """Delete the bodies in hashes that no url references any more"""
+        for content_hash in hashes - self.referenced_hashes():
+            try:
+                os.remove(self.object_path(content_hash))
+            except OSError:
+                pass
+
+    def store(self, url, content, headers):
+        content_hash = hashlib.sha256(content).hexdigest()
+        if not os.path.exists(self.object_path(content_hash)):
+            self.write_file(self.object_path(content_hash), content)
+        previous_meta = self.read_meta(url) or {}
+        previous = previous_meta.get('previous', [])
+        if previous_meta.get('hash') not in [None, content_hash]:
+            previous = [{'hash': previous_meta['hash'],
+                         'charset': previous_meta['charset']}] + previous
+        meta = {'url': url,
+                'hash': content_hash,
+                'charset': headers.get_content_charset() or 'utf-8',
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+                'previous': previous[:self.history]}
+        self.write_meta(url, meta)
+        if previous_meta.get('hash'):
+            dropped = self.meta_hashes(previous_meta) - self.meta_hashes(meta)
+            if dropped:
+                self.remove_unreferenced(dropped)
+        return meta
+
+    def cached(self, url):
+        """Return the cached content of url whatever its age, None if it is
+        not in the cache. The origin is never contacted.
+        """
+        meta = self.read_meta(url)
+        return self.read_body(meta) if meta else None
+
+    def get(self, url, revalidate=True):
+        """Return the specification content of url, None if it is not available.
+        With revalidate=False a cached body is served whatever its age.
+        """
+        meta = self.read_meta(url)
+        body = self.read_body(meta) if meta else None
+
+        if body is not None and (not revalidate or time.time() - meta['fetched_at'] < self.ttl):
+            return body
+
+        request_headers = {}
+        if body is not None:
+            if meta['etag']:
+                request_headers['If-None-Match'] = meta['etag']
+            if meta['last_modified']:
+                request_headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            resource = urllib.request.urlopen(urllib.request.Request(url, headers=request_headers),
+                                              timeout=self.timeout)
+            content = resource.read()
+            meta = self.store(url, content, resource.headers)
+            return content.decode(meta['charset'])
+        except HTTPError as exp:
+            if exp.code == 304 and body is not None:
+                meta['fetched_at'] = time.time()
+                self.write_meta(url, meta)
+                return body
+            print(f"HTTPError: {exp.reason} reading {url}")
+        except URLError as exp:
+            print(f"URLError: {exp.reason} reading {url}")
+        except (ValueError, OSError, LookupError, UnicodeDecodeError) as exp:
+            print(f"{type(exp).__name__} reading {url}")
+
+        if body is not None:
+            print(f"Serving stale cached specification of {url}")
+        return body
+
+    def previous_versions(self, url):
+        """Return the previous contents of url still in the cache, newest first"""
+        meta = self.read_meta(url)
+        if not meta:
+            return []
+        bodies = [self.read_body(x) for x in meta.get('previous', [])]
+        return [x for x in bodies if x is not None]
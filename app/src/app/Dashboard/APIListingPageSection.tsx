@@ -68,8 +68,8 @@ const APIListingPageSection: React.FunctionComponent<APIListingPageSectionProps>
     setModalCheckSpecApiData(_api);
   }
 
-  const exportSPDX = () => {
-    fetch(baseApiUrl + '/spdx/libraries?library=' + currentLibrary)
+  const downloadSPDX = (job) => {
+    fetch(baseApiUrl + '/spdx/libraries?download=1&job-id=' + job['id'])
       .then((res) => res.json())
       .then((data) => {
         setSPDXContent(JSON.stringify(data, null, 2));
@@ -80,6 +80,39 @@ const APIListingPageSection: React.FunctionComponent<APIListingPageSectionProps>
       });
   }
 
+  const pollSPDXJob = (job) => {
+    if (job['status'] == 'done') {
+      downloadSPDX(job);
+    } else if (job['status'] == 'failed') {
+      console.log(job['error']);
+    } else {
+      setTimeout(() => {
+        fetch(baseApiUrl + '/spdx/libraries?job-id=' + job['id'])
+          .then((res) => res.json())
+          .then((data) => pollSPDXJob(data))
+          .catch((err) => {
+            console.log(err.message);
+          });
+      }, 1000);
+    }
+  }
+
+  const exportSPDX = () => {
+    fetch(baseApiUrl + '/spdx/libraries', {
+      method: 'POST',
+      headers: {
+        Accept: 'application/json',
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({'library': currentLibrary}),
+    })
+      .then((res) => res.json())
+      .then((data) => pollSPDXJob(data))
+      .catch((err) => {
+        console.log(err.message);
+      });
+  }
+
   const renderPagination = (variant, isCompact) => (
     <Pagination
       isCompact={isCompact}
@@ -163,12 +163,13 @@ export const APICheckSpecModal: React.FunctionComponent<APICheckSpecModalProps>
 
   const handleFixWarnings = () => {
     setMessageValue('');
-    fetch(baseApiUrl + '/apis/fix-specification-warnings?id=' + api.id, {
-        method: 'GET',
+    fetch(baseApiUrl + '/apis/fix-specification-warnings', {
+        method: 'POST',
         headers: {
           Accept: 'application/json',
           'Content-Type': 'application/json',
         },
+        body: JSON.stringify({'id': api.id}),
       })
       .then((response) => {
         if (response.status !== 200) {
@@ -0,0 +1,118 @@
+"""Lookup cost of the hot queries of the mapping views on a seeded SQLite database,
+without the indexes of the models and after init_db.py created them.
+
+    python bench/index_lookups.py [--apis 300] [--mappings 60] [--lookups 200]
+"""
+import argparse, os, random, sys, tempfile, time
+from sqlalchemy import create_engine, text
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(currentdir), "db", "models"))
+
+from db_base import Base
+from init_db import create_missing_indexes
+
+NOW = "2024-01-01 00:00:00"
+VERSIONS = (1, 2, 3)
+
+QUERIES = {
+    "mapping by api ordered by offset": (
+        "SELECT * FROM sw_requirement_mapping_api WHERE api_id = :id ORDER BY offset", "apis"),
+    "last mapping history version": (
+        "SELECT version FROM sw_requirement_mapping_api_history WHERE id = :id "
+        "ORDER BY version DESC LIMIT 1", "mappings"),
+    "last work item history version": (
+        "SELECT version FROM sw_requirements_history WHERE id = :id ORDER BY version DESC LIMIT 1", "mappings"),
+    "indirect ts by sr mapping": (
+        "SELECT * FROM test_specification_mapping_sw_requirement WHERE sw_requirement_mapping_api_id = :id",
+        "mappings"),
+    "indirect tc by sr-ts mapping": (
+        "SELECT * FROM test_case_mapping_test_specification "
+        "WHERE test_specification_mapping_sw_requirement_id = :id", "mappings"),
+    "usage of a sw requirement": (
+        "SELECT * FROM sw_requirement_mapping_api WHERE sw_requirement_id = :id", "mappings"),
+}
+
+
+def insert(connection, table, rows):
+    columns = list(rows[0].keys())
+    connection.execute(text(f"INSERT INTO {table}({', '.join(columns)}) "
+                            f"VALUES ({', '.join(':' + x for x in columns)})"), rows)
+
+
+def seed(connection, n_apis, per_api, rnd):
+    """n_apis apis with per_api sw requirement mappings each, every mapping
+    with an indirect test specification and test case, and 3 versions of
+    every row in the history tables.
+    """
+    n = n_apis * per_api
+    apis = [{"id": i, "api": f"api {i}", "library": "library", "category": "", "library_version": "1",
+             "raw_specification_url": "", "tags": "", "created_at": NOW, "updated_at": NOW}
+            for i in range(1, n_apis + 1)]
+    insert(connection, "apis", [dict(x, version=3) for x in apis])
+    insert(connection, "apis_history", [dict(x, version=v) for x in apis for v in VERSIONS])
+
+    sw_requirements = [{"id": i, "title": "title", "description": "description", "created_at": NOW}
+                       for i in range(1, n + 1)]
+    insert(connection, "sw_requirements", [dict(x, version=3, updated_at=NOW) for x in sw_requirements])
+    insert(connection, "sw_requirements_history", [dict(x, version=v) for x in sw_requirements for v in VERSIONS])
+
+    mappings = [{"id": i, "api_id": (i - 1) // per_api + 1, "sw_requirement_id": i, "section": "section",
+                 "offset": rnd.randint(0, 10000), "coverage": 50, "created_at": NOW}
+                for i in range(1, n + 1)]
+    insert(connection, "sw_requirement_mapping_api", [dict(x, version=3, updated_at=NOW) for x in mappings])
+    insert(connection, "sw_requirement_mapping_api_history",
+           [dict(x, version=v) for x in mappings for v in VERSIONS])
+
+    insert(connection, "test_specification_mapping_sw_requirement",
+           [{"id": i, "sw_requirement_mapping_api_id": i, "test_specification_id": i, "coverage": 50,
+             "version": 1, "created_at": NOW, "updated_at": NOW} for i in range(1, n + 1)])
+    insert(connection, "test_case_mapping_test_specification",
+           [{"id": i, "test_specification_mapping_sw_requirement_id": i, "test_case_id": i, "coverage": 50,
+             "version": 1, "created_at": NOW, "updated_at": NOW} for i in range(1, n + 1)])
+
+
+def bench(connection, label, counts, lookups, rnd):
+    print(label)
+    for name, (query, ids) in QUERIES.items():
+        statement = text(query)
+        start = time.perf_counter()
+        for i in range(lookups):
+            connection.execute(statement, {"id": rnd.randint(1, counts[ids])}).fetchall()
+        print(f"  {name:35s} {(time.perf_counter() - start) / lookups * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apis", type=int, default=300)
+    parser.add_argument("--mappings", type=int, default=60, help="sw requirement mappings of every api")
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rnd = random.Random(args.seed)
+    counts = {"apis": args.apis, "mappings": args.apis * args.mappings}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'basil.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            seed(connection, args.apis, args.mappings, rnd)
+            # The tables as created before the indexes
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.drop(bind=connection)
+            connection.execute(text("ANALYZE"))
+
+        with engine.connect() as connection:
+            bench(connection, f"without indexes ({counts['mappings']} mappings, "
+                              f"{counts['mappings'] * len(VERSIONS)} history rows)", counts, args.lookups, rnd)
+        with engine.begin() as connection:
+            create_missing_indexes(connection)
+            connection.execute(text("ANALYZE"))
+        with engine.connect() as connection:
+            bench(connection, "with indexes", counts, args.lookups, rnd)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
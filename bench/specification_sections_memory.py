@@ -0,0 +1,89 @@
+"""Peak memory and time of the sections of a specification with many overlapping
+mappings, measured with tracemalloc.
+
+The sections built by SpecificationSections share the work item dicts, the
+copied variant copies the work item dicts into every section they cover, as
+get_splitted_sections() did before SpecificationSections.
+
+    python bench/specification_sections_memory.py [--mappings 400] [--length 60000]
+"""
+import argparse, copy, json, os, random, sys, time, tracemalloc
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(currentdir), "api"))
+
+from section_splitter import SpecificationSections
+
+WORK_ITEM_TYPES = ['sw_requirement', 'justification']
+ITEM_KEYS = ['sw_requirements', 'justifications']
+
+
+def random_mapping(rnd, specification, count):
+    """count mappings of 2000 to 10000 characters, one every 5 is a justification"""
+    mapping = {x: [] for x in ITEM_KEYS}
+    for i in range(count):
+        offset = rnd.randint(0, len(specification) - 10000)
+        length = rnd.randint(2000, 10000)
+        work_item_type = WORK_ITEM_TYPES[0] if i % 5 else WORK_ITEM_TYPES[1]
+        mapping[f"{work_item_type}s"].append({
+            'match': True,
+            'offset': offset,
+            'section': specification[offset:offset + length],
+            'relation_id': i,
+            'coverage': rnd.randint(0, 40),
+            'version': '1.1',
+            work_item_type: {'id': i,
+                             'title': 'title ' * 20,
+                             'description': 'description ' * 100,
+                             'status': 'new',
+                             'indirect_test_specifications': [{'id': j, 'title': 'title ' * 20}
+                                                               for j in range(3)]}})
+    return mapping
+
+
+def shared_sections(specification, mapping):
+    return SpecificationSections(specification, mapping, WORK_ITEM_TYPES).as_dicts(ITEM_KEYS)
+
+
+def copied_sections(specification, mapping):
+    sections = SpecificationSections(specification, mapping, WORK_ITEM_TYPES).as_dicts(ITEM_KEYS)
+    for section in sections:
+        for key in ITEM_KEYS:
+            section[key] = [x.copy() for x in section[key]]
+    return sections
+
+
+def measure(name, build, specification, mapping):
+    tracemalloc.start()
+    start = time.perf_counter()
+    sections = build(specification, copy.deepcopy(mapping))
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    document = json.dumps(sections)
+    dumps_seconds = time.perf_counter() - start
+    print(f"{name:8s} {len(sections)} sections, peak {peak / 2 ** 20:.1f} MB, split {seconds * 1000:.0f} ms, "
+          f"json.dumps {dumps_seconds * 1000:.0f} ms, {len(document)} characters")
+    return document
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mappings", type=int, default=400)
+    parser.add_argument("--length", type=int, default=60000, help="characters of the specification")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    specification = "".join(rnd.choice("abcdefgh ij\n") for i in range(args.length))
+    mapping = random_mapping(rnd, specification, args.mappings)
+
+    shared = measure("shared", shared_sections, specification, mapping)
+    copied = measure("copied", copied_sections, specification, mapping)
+    assert shared == copied
+
+
+if __name__ == "__main__":
+    main()
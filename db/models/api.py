@@ -12,10 +12,13 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 
 from db_base import Base
+from mapping_coverage import MappingCoverageModel, get_coverage, refresh_coverage
+from row_version import store_version
 
 class ApiModel(Base):
     __tablename__ = "apis"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_apis_api_library_version", "api", "library_version"),
+                      {"sqlite_autoincrement": True})
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     api: Mapped[str] = mapped_column(String(100))
@@ -27,6 +30,7 @@ class ApiModel(Base):
     implementation_file_to_row: Mapped[Optional[int]] = mapped_column(Integer())
     raw_specification_url: Mapped[str] = mapped_column(String())
     tags: Mapped[str] = mapped_column(String())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -58,12 +62,48 @@ class ApiModel(Base):
                f"tags={self.tags!r})"
 
     def current_version(self, db_session):
+        if self.version is not None:
+            return f'{self.version}'
+
         last_item = db_session.query(ApiHistoryModel).filter(
             ApiHistoryModel.id == self.id).order_by(
             ApiHistoryModel.version.desc()).limit(1).all()[0]
 
         return f'{last_item.version}'
 
+    def get_coverage(self, db_session):
+        coverage = get_coverage(db_session, self.__tablename__, self.id)
+        if coverage is not None:
+            return coverage
+        return self.compute_coverage(db_session)
+
+    def compute_coverage(self, db_session):
+        from api_sw_requirement import ApiSwRequirementModel
+        from api_test_specification import ApiTestSpecificationModel
+        from api_test_case import ApiTestCaseModel
+
+        #Calc coverage
+        srs_query = db_session.query(ApiSwRequirementModel).filter(
+            ApiSwRequirementModel.api_id == self.id
+        )
+        srs = srs_query.all()
+        srs_cov = sum([x.get_waterfall_coverage(db_session) for x in srs])
+
+        tss_query = db_session.query(ApiTestSpecificationModel).filter(
+            ApiTestSpecificationModel.api_id == self.id
+        )
+        tss = tss_query.all()
+        tss_cov = sum([x.get_waterfall_coverage(db_session) for x in tss])
+
+        tcs_query = db_session.query(ApiTestCaseModel).filter(
+            ApiTestCaseModel.api_id == self.id
+        )
+        tcs = tcs_query.all()
+        tcs_cov = sum([x.as_dict()['coverage'] for x in tcs])
+
+        coverage = srs_cov + tss_cov + tcs_cov
+        return coverage
+
     def as_dict(self, full_data=False, db_session=None):
         _dict = {"id": self.id,
                  "api": self.api,
@@ -77,36 +117,8 @@ class ApiModel(Base):
                  "tags": self.tags}
 
         if db_session is not None:
-            from api_sw_requirement import ApiSwRequirementModel
-            from api_test_specification import ApiTestSpecificationModel
-            from api_test_case import ApiTestCaseModel
-
             _dict['version'] = self.current_version(db_session)
-            #Calc coverage
-            srs_query = db_session.query(ApiSwRequirementModel).filter(
-                ApiSwRequirementModel.api_id == self.id
-            )
-            srs = srs_query.all()
-            srs_cov = sum([x.get_waterfall_coverage(db_session) for x in srs])
-            print(f'srs_cov: {srs_cov}')
-
-            tss_query = db_session.query(ApiTestSpecificationModel).filter(
-                ApiTestSpecificationModel.api_id == self.id
-            )
-            tss = tss_query.all()
-            tss_cov = sum([x.get_waterfall_coverage(db_session) for x in tss])
-            print(f'tss_cov: {tss_cov}')
-
-            tcs_query = db_session.query(ApiTestCaseModel).filter(
-                ApiTestCaseModel.api_id == self.id
-            )
-            tcs = tcs_query.all()
-            tcs_cov = sum([x.as_dict()['coverage'] for x in tcs])
-            print(f'tcs_cov: {tcs_cov}')
-
-            coverage = srs_cov + tss_cov + tcs_cov
-            print(f'coverage: {coverage}')
-            _dict['coverage'] = coverage
+            _dict['coverage'] = self.get_coverage(db_session)
 
         if full_data:
             _dict["created_at"] = self.created_at.strftime(Base.dt_format_str)
@@ -135,6 +147,7 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
 
 @event.listens_for(ApiModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -152,10 +165,12 @@ def receive_after_insert(mapper, connection, target):
         version=1
     )
     connection.execute(insert_query)
+    refresh_coverage(connection, ApiModel.__tablename__, target.id)
 
 class ApiHistoryModel(Base):
     __tablename__ = "apis_history"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_apis_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
 
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
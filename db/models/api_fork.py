@@ -0,0 +1,97 @@
+from datetime import datetime
+from sqlalchemy import *
+from db_base import Base
+from mapping_coverage import API_TABLE, API_SR_TABLE, API_TS_TABLE, API_TC_TABLE, \
+    SR_TS_TABLE, SR_TC_TABLE, TS_TC_TABLE, MappingCoverageModel, refresh_coverage
+from row_version import insert_history
+
+API_J_TABLE = "justification_mapping_api"
+
+# Columns not copied from the source rows
+NOT_COPIED_COLUMNS = ['id', 'version', 'created_at', 'updated_at']
+
+
+def _copy(connection, table, parent_column, parent_map, now):
+    """Copy the rows of table whose parent_column is an old id of parent_map,
+    setting it to the new id, with a single INSERT ... SELECT.
+    Other parent columns (test cases of test specifications) are left empty.
+    """
+    columns = [x.name for x in table.columns if x.name not in NOT_COPIED_COLUMNS
+               and not x.name.endswith('_mapping_api_id')
+               and not x.name.endswith('_mapping_sw_requirement_id')
+               and x.name != parent_column]
+    query = select(parent_map.c.new_id, *[table.c[x] for x in columns],
+                   literal(1), literal(now, DateTime()), literal(now, DateTime())).join(
+        parent_map, table.c[parent_column] == parent_map.c.old_id).order_by(table.c.id)
+    connection.execute(insert(table).from_select(
+        [parent_column] + columns + ['version', 'created_at', 'updated_at'], query))
+    insert_history(connection, table,
+                   table.c[parent_column].in_(select(parent_map.c.new_id)), now)
+    return columns
+
+
+def _id_map(table, parent_column, parent_map, columns):
+    """Return a subquery (old_id, new_id) pairing the source rows of table with their copies.
+    Rows are paired on the new parent and on the copied columns, numbered by id
+    when more of them have the same values.
+    """
+    keys = [table.c[x] for x in columns]
+    old = select(table.c.id, parent_map.c.new_id.label('parent'), *keys,
+                 func.row_number().over(partition_by=[parent_map.c.new_id] + keys,
+                                        order_by=table.c.id).label('n')).join(
+        parent_map, table.c[parent_column] == parent_map.c.old_id).subquery()
+    new = select(table.c.id, table.c[parent_column].label('parent'), *keys,
+                 func.row_number().over(partition_by=[table.c[parent_column]] + keys,
+                                        order_by=table.c.id).label('n')).where(
+        table.c[parent_column].in_(select(parent_map.c.new_id))).subquery()
+    return select(old.c.id.label('old_id'), new.c.id.label('new_id')).join(
+        new, and_(old.c.parent == new.c.parent,
+                  old.c.n == new.c.n,
+                  *[old.c[x] == new.c[x] for x in columns])).subquery()
+
+
+def _copy_coverage(connection, table, id_map, api_id, now):
+    """Copy the stored coverage of the source rows to their copies"""
+    cov = Base.metadata.tables[MappingCoverageModel.__tablename__]
+    query = select(cov.c.parent_table, id_map.c.new_id, literal(api_id), cov.c.coverage,
+                   literal(now, DateTime())).join(
+        id_map, cov.c.parent_id == id_map.c.old_id).where(cov.c.parent_table == table.name)
+    connection.execute(insert(cov).from_select(
+        ['parent_table', 'parent_id', 'api_id', 'coverage', 'updated_at'], query))
+
+
+def fork_api_mappings(connection, source_api_id, new_api_id):
+    """Copy the direct and indirect mappings of source_api_id to new_api_id,
+    with their history and their stored coverage, using an INSERT ... SELECT per table.
+    The work items are shared with the source api.
+    The models event listeners are not called.
+    """
+    tables = Base.metadata.tables
+    now = datetime.now()
+    api_map = select(literal(source_api_id, Integer()).label('old_id'),
+                     literal(new_api_id, Integer()).label('new_id')).subquery()
+
+    id_maps = {}
+    for table_name in [API_SR_TABLE, API_TS_TABLE, API_TC_TABLE, API_J_TABLE]:
+        table = tables[table_name]
+        columns = _copy(connection, table, 'api_id', api_map, now)
+        id_maps[table_name] = _id_map(table, 'api_id', api_map, columns)
+
+    for table_name in [SR_TS_TABLE, SR_TC_TABLE]:
+        table = tables[table_name]
+        columns = _copy(connection, table, 'sw_requirement_mapping_api_id', id_maps[API_SR_TABLE], now)
+        id_maps[table_name] = _id_map(table, 'sw_requirement_mapping_api_id', id_maps[API_SR_TABLE], columns)
+
+    table = tables[TS_TC_TABLE]
+    columns = _copy(connection, table, 'test_specification_mapping_api_id', id_maps[API_TS_TABLE], now)
+    id_maps[f'{TS_TC_TABLE}_api'] = _id_map(table, 'test_specification_mapping_api_id',
+                                            id_maps[API_TS_TABLE], columns)
+    _copy(connection, table, 'test_specification_mapping_sw_requirement_id', id_maps[SR_TS_TABLE], now)
+    id_maps[f'{TS_TC_TABLE}_sw_requirement'] = _id_map(table, 'test_specification_mapping_sw_requirement_id',
+                                                       id_maps[SR_TS_TABLE], columns)
+
+    for key in id_maps.keys():
+        if key != API_J_TABLE:
+            table_name = TS_TC_TABLE if key.startswith(TS_TC_TABLE) else key
+            _copy_coverage(connection, tables[table_name], id_maps[key], new_api_id, now)
+    refresh_coverage(connection, API_TABLE, new_api_id)
@@ -1,10 +1,13 @@
 from api import *
 from justification import *
 from comment import *
+from row_version import store_version
 
 class ApiJustificationModel(Base):
     __tablename__ = "justification_mapping_api"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_justification_mapping_api_api_id_offset", "api_id", "offset"),
+                      Index("ix_justification_mapping_api_justification_id", "justification_id"),
+                      {"sqlite_autoincrement": True})
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     api_id: Mapped[int] = mapped_column(ForeignKey("apis.id"))
@@ -15,6 +18,7 @@ class ApiJustificationModel(Base):
     section: Mapped[str] = mapped_column(String())
     offset: Mapped[int] = mapped_column(Integer())
     coverage: Mapped[int] = mapped_column(Integer())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -35,6 +39,9 @@ class ApiJustificationModel(Base):
                f"- {str(self.justification)!r}"
 
     def current_version(self, db_session):
+        if self.version is not None and self.justification.version is not None:
+            return f'{self.justification.version}.{self.version}'
+
         last_mapping_query = db_session.query(ApiJustificationHistoryModel).filter(
                         ApiJustificationHistoryModel.id == self.id).order_by(
                         ApiJustificationHistoryModel.version.desc()).limit(1)
@@ -58,11 +65,7 @@ class ApiJustificationModel(Base):
         if db_session is not None:
             _dict['version'] = self.current_version(db_session)
             #Comments
-            _dict['justification']['comment_count'] = len(db_session.query(CommentModel).filter(
-                CommentModel.parent_table == self.__tablename__
-            ).filter(
-                CommentModel.parent_id == self.id
-            ).all())
+            _dict['justification']['comment_count'] = comment_count(db_session, self.__tablename__, self.id)
 
         if full_data:
             _dict['api'] = self.api.as_dict(full_data=full_data, db_session=db_session)
@@ -102,6 +105,7 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
 
 @event.listens_for(ApiJustificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -117,7 +121,8 @@ def receive_after_insert(mapper, connection, target):
     connection.execute(insert_query)
 class ApiJustificationHistoryModel(Base):
     __tablename__ = "justification_mapping_api_history"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_justification_mapping_api_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
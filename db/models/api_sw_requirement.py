@@ -3,10 +3,14 @@ from sw_requirement import *
 from sw_requirement_test_case import *
 from sw_requirement_test_specification import *
 from comment import *
+from mapping_coverage import get_coverage, refresh_coverage, delete_coverage
+from row_version import store_version
 
 class ApiSwRequirementModel(Base):
     __tablename__ = "sw_requirement_mapping_api"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_sw_requirement_mapping_api_api_id_offset", "api_id", "offset"),
+                      Index("ix_sw_requirement_mapping_api_sw_requirement_id", "sw_requirement_id"),
+                      {"sqlite_autoincrement": True})
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     api_id: Mapped[int] = mapped_column(ForeignKey("apis.id"))
@@ -17,6 +21,7 @@ class ApiSwRequirementModel(Base):
     section: Mapped[str] = mapped_column(String())
     offset: Mapped[int] = mapped_column(Integer())
     coverage: Mapped[int] = mapped_column(Integer())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -79,6 +84,9 @@ class ApiSwRequirementModel(Base):
         return sr_ts_mapping
 
     def current_version(self, db_session):
+        if self.version is not None and self.sw_requirement.version is not None:
+            return f'{self.sw_requirement.version}.{self.version}'
+
         last_mapping = db_session.query(ApiSwRequirementHistoryModel).filter(
                         ApiSwRequirementHistoryModel.id == self.id).order_by(
                         ApiSwRequirementHistoryModel.version.desc()).limit(1).all()[0]
@@ -99,11 +107,7 @@ class ApiSwRequirementModel(Base):
         if db_session:
             _dict['version'] = self.current_version(db_session)
             # Comments
-            _dict['sw_requirement']['comment_count'] = len(db_session.query(CommentModel).filter(
-                CommentModel.parent_table == self.__tablename__
-            ).filter(
-                CommentModel.parent_id == self.id
-            ).all())
+            _dict['sw_requirement']['comment_count'] = comment_count(db_session, self.__tablename__, self.id)
 
         if full_data:
             _dict['api'] = self.api.as_dict(full_data=full_data, db_session=db_session)
@@ -117,6 +121,12 @@ class ApiSwRequirementModel(Base):
         if db_session == None:
             return self.coverage
 
+        coverage = get_coverage(db_session, self.__tablename__, self.id)
+        if coverage is not None:
+            return coverage
+        return self.compute_waterfall_coverage(db_session)
+
+    def compute_waterfall_coverage(self, db_session):
         tss_coverage = 0
         tcs_coverage = 0
         #Test Specifications
@@ -161,6 +171,8 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
+    refresh_coverage(connection, ApiSwRequirementModel.__tablename__, target.id)
 
 @event.listens_for(ApiSwRequirementModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -174,11 +186,18 @@ def receive_after_insert(mapper, connection, target):
         version=1
     )
     connection.execute(insert_query)
+    refresh_coverage(connection, ApiSwRequirementModel.__tablename__, target.id)
+
+@event.listens_for(ApiSwRequirementModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    delete_coverage(connection, ApiSwRequirementModel.__tablename__, target.id,
+                    ApiModel.__tablename__, target.api_id)
 
 
 class ApiSwRequirementHistoryModel(Base):
     __tablename__ = 'sw_requirement_mapping_api_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_sw_requirement_mapping_api_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -1,10 +1,14 @@
 from api import *
 from test_case import *
 from comment import *
+from mapping_coverage import refresh_coverage, delete_coverage
+from row_version import store_version
 
 class ApiTestCaseModel(Base):
     __tablename__ = "test_case_mapping_api"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_test_case_mapping_api_api_id_offset", "api_id", "offset"),
+                      Index("ix_test_case_mapping_api_test_case_id", "test_case_id"),
+                      {"sqlite_autoincrement": True})
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     api_id: Mapped[int] = mapped_column(ForeignKey("apis.id"))
@@ -14,6 +18,7 @@ class ApiTestCaseModel(Base):
     section: Mapped[str] = mapped_column(String())
     offset: Mapped[int] = mapped_column(Integer())
     coverage: Mapped[int] = mapped_column(Integer())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -35,6 +40,9 @@ class ApiTestCaseModel(Base):
                f"{str(self.test_case)!r}"
 
     def current_version(self, db_session):
+        if self.version is not None and self.test_case.version is not None:
+            return f'{self.test_case.version}.{self.version}'
+
         last_mapping = db_session.query(ApiTestCaseHistoryModel).filter(
                         ApiTestCaseHistoryModel.id == self.id).order_by(
                         ApiTestCaseHistoryModel.version.desc()).limit(1).all()[0]
@@ -53,11 +61,7 @@ class ApiTestCaseModel(Base):
         if db_session:
             _dict['version'] = self.current_version(db_session)
             # Comments
-            _dict['test_case']['comment_count'] = len(db_session.query(CommentModel).filter(
-                CommentModel.parent_table == self.__tablename__
-            ).filter(
-                CommentModel.parent_id == self.id
-            ).all())
+            _dict['test_case']['comment_count'] = comment_count(db_session, self.__tablename__, self.id)
 
         if full_data:
             _dict['api'] = self.api.as_dict(full_data=full_data, db_session=db_session)
@@ -85,6 +89,8 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
+    refresh_coverage(connection, ApiTestCaseModel.__tablename__, target.id)
 
 @event.listens_for(ApiTestCaseModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -98,11 +104,18 @@ def receive_after_insert(mapper, connection, target):
         version=1
     )
     connection.execute(insert_query)
+    refresh_coverage(connection, ApiTestCaseModel.__tablename__, target.id)
+
+@event.listens_for(ApiTestCaseModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    delete_coverage(connection, ApiTestCaseModel.__tablename__, target.id,
+                    ApiModel.__tablename__, target.api_id)
 
 
 class ApiTestCaseHistoryModel(Base):
     __tablename__ = 'test_case_mapping_api_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_test_case_mapping_api_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
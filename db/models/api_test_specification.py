@@ -1,10 +1,14 @@
 from api import *
 from test_specification import *
 from comment import *
+from mapping_coverage import get_coverage, refresh_coverage, delete_coverage
+from row_version import store_version
 
 class ApiTestSpecificationModel(Base):
     __tablename__ = "test_specification_mapping_api"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_test_specification_mapping_api_api_id_offset", "api_id", "offset"),
+                      Index("ix_test_specification_mapping_api_test_specification_id", "test_specification_id"),
+                      {"sqlite_autoincrement": True})
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     api_id: Mapped[int] = mapped_column(ForeignKey("apis.id"))
@@ -15,6 +19,7 @@ class ApiTestSpecificationModel(Base):
     section: Mapped[str] = mapped_column(String())
     offset: Mapped[int] = mapped_column(Integer())
     coverage: Mapped[int] = mapped_column(Integer())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -64,6 +69,9 @@ class ApiTestSpecificationModel(Base):
         return ts_tc_mapping
 
     def current_version(self, db_session):
+        if self.version is not None and self.test_specification.version is not None:
+            return f'{self.test_specification.version}.{self.version}'
+
         last_mapping = db_session.query(ApiTestSpecificationHistoryModel).filter(
                         ApiTestSpecificationHistoryModel.id == self.id).order_by(
                         ApiTestSpecificationHistoryModel.version.desc()).limit(1).all()[0]
@@ -84,11 +92,7 @@ class ApiTestSpecificationModel(Base):
         if db_session:
             _dict['version'] = self.current_version(db_session)
             # Comments
-            _dict['test_specification']['comment_count'] = len(db_session.query(CommentModel).filter(
-                CommentModel.parent_table == self.__tablename__
-            ).filter(
-                CommentModel.parent_id == self.id
-            ).all())
+            _dict['test_specification']['comment_count'] = comment_count(db_session, self.__tablename__, self.id)
 
         if full_data:
             _dict['api'] = self.api.as_dict(full_data=full_data, db_session=db_session)
@@ -100,6 +104,12 @@ class ApiTestSpecificationModel(Base):
         if db_session == None:
             return self.coverage
 
+        coverage = get_coverage(db_session, self.__tablename__, self.id)
+        if coverage is not None:
+            return coverage
+        return self.compute_waterfall_coverage(db_session)
+
+    def compute_waterfall_coverage(self, db_session):
         from test_specification_test_case import TestSpecificationTestCaseModel
         tcs_coverage = 0
 
@@ -141,6 +151,8 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
+    refresh_coverage(connection, ApiTestSpecificationModel.__tablename__, target.id)
 
 @event.listens_for(ApiTestSpecificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -154,11 +166,18 @@ def receive_after_insert(mapper, connection, target):
         version=1
     )
     connection.execute(insert_query)
+    refresh_coverage(connection, ApiTestSpecificationModel.__tablename__, target.id)
+
+@event.listens_for(ApiTestSpecificationModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    delete_coverage(connection, ApiTestSpecificationModel.__tablename__, target.id,
+                    ApiModel.__tablename__, target.api_id)
 
 
 class ApiTestSpecificationHistoryModel(Base):
     __tablename__ = 'test_specification_mapping_api_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_test_specification_mapping_api_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -10,9 +10,14 @@ from sqlalchemy.orm import sessionmaker
 
 from db_base import Base
 
+# Max number of parents in a single comment count query
+COMMENT_COUNT_CHUNK_SIZE = 500
+
+
 class CommentModel(Base):
     __tablename__ = "comments"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_comments_parent_table_parent_id", "parent_table", "parent_id"),
+                      {"sqlite_autoincrement": True})
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     parent_table: Mapped[str] = mapped_column(String(100))
@@ -42,4 +47,46 @@ class CommentModel(Base):
                f"username={self.username!r}, " \
                f"comment={self.comment!r}), " \
                f"parent_table={self.parent_table!r}, " \
-               f"parent_id={self.parent_id!r}"
\ No newline at end of file
+               f"parent_id={self.parent_id!r}"
+
+
+def comment_count(db_session, parent_table, parent_id):
+    """Number of comments of a single row"""
+    return db_session.execute(select(func.count()).where(
+        CommentModel.parent_table == parent_table).where(
+        CommentModel.parent_id == parent_id)).scalar()
+
+
+def comment_counts(db_session, parents):
+    """Return {(parent_table, parent_id): number of comments} of the commented rows of parents,
+    {parent_table: ids} where ids is a list or a select of ids, with a query grouped by
+    parent_table, parent_id. Lists are split in chunks of COMMENT_COUNT_CHUNK_SIZE ids,
+    as many conditions as the chunk size allows are read together.
+    """
+    conditions = []
+    for parent_table, ids in parents.items():
+        if isinstance(ids, (list, tuple, set)):
+            ids = list(ids)
+            for i in range(0, len(ids), COMMENT_COUNT_CHUNK_SIZE):
+                chunk = ids[i:i + COMMENT_COUNT_CHUNK_SIZE]
+                conditions.append((len(chunk), and_(CommentModel.parent_table == parent_table,
+                                                    CommentModel.parent_id.in_(chunk))))
+        else:
+            conditions.append((1, and_(CommentModel.parent_table == parent_table,
+                                       CommentModel.parent_id.in_(ids))))
+
+    batches = []
+    size = COMMENT_COUNT_CHUNK_SIZE
+    for weight, condition in conditions:
+        if size + weight > COMMENT_COUNT_CHUNK_SIZE:
+            batches.append([])
+            size = 0
+        batches[-1].append(condition)
+        size += weight
+
+    ret = {}
+    for batch in batches:
+        query = select(CommentModel.parent_table, CommentModel.parent_id, func.count()).where(
+            or_(*batch)).group_by(CommentModel.parent_table, CommentModel.parent_id)
+        ret.update({(row[0], row[1]): row[2] for row in db_session.execute(query)})
+    return ret
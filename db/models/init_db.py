@@ -1,3 +1,4 @@
+import os
 from db_base import Base
 from sqlalchemy import create_engine
 
@@ -8,7 +9,11 @@ from api_test_case import *
 from api_test_specification import *
 from comment import *
 from justification import *
+from mapping_coverage import *
 from note import *
+from row_version import migrate_versions
+from search_index import create_search_index
+from spdx_fragment import *
 from sw_requirement import *
 from sw_requirement_test_case import *
 from sw_requirement_test_specification import *
@@ -16,7 +21,27 @@ from test_case import *
 from test_specification import *
 from test_specification_test_case import *
 
+
+def create_missing_indexes(connection):
+    """create_all() creates the indexes only along with new tables,
+    add the ones missing on tables of existing databases.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
 if __name__ == "__main__":
     db_path = "../basil.db"
-    engine = create_engine(f"sqlite:///{db_path}", echo=True)
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    engine = create_engine(os.environ.get("BASIL_DB_URL", f"sqlite:///{db_path}"), echo=True)
+    Base.metadata.create_all(bind=engine)
+
+    # Migrate databases created before the version column and the indexes
+    with engine.begin() as connection:
+        migrate_versions(connection)
+        create_missing_indexes(connection)
+        create_search_index(connection)
+
+    # Populate the coverage of databases created before the mapping_coverage table
+    with engine.begin() as connection:
+        rebuild_coverage(connection)
@@ -8,6 +8,7 @@ from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import sessionmaker
 from db_base import Base
+from row_version import store_version
 
 class JustificationModel(Base):
     __tablename__ = 'justifications'
@@ -15,6 +16,7 @@ class JustificationModel(Base):
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     description: Mapped[Optional[str]] = mapped_column(String())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -28,6 +30,9 @@ class JustificationModel(Base):
                f"description={self.description!r})"
 
     def current_version(self, db_session):
+        if self.version is not None:
+            return f'{self.version}'
+
         last_item = db_session.query(JustificationHistoryModel).filter(
                      JustificationHistoryModel.id == self.id).order_by(
                      JustificationHistoryModel.version.desc()).limit(1).all()[0]
@@ -68,6 +73,7 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
 
 @event.listens_for(JustificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -82,7 +88,8 @@ def receive_after_insert(mapper, connection, target):
 
 class JustificationHistoryModel(Base):
     __tablename__ = 'justifications_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_justifications_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -0,0 +1,352 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import *
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import mapped_column
+from db_base import Base
+
+API_TABLE = "apis"
+API_SR_TABLE = "sw_requirement_mapping_api"
+API_TS_TABLE = "test_specification_mapping_api"
+API_TC_TABLE = "test_case_mapping_api"
+SR_TS_TABLE = "test_specification_mapping_sw_requirement"
+SR_TC_TABLE = "test_case_mapping_sw_requirement"
+TS_TC_TABLE = "test_case_mapping_test_specification"
+
+
+class MappingCoverageModel(Base):
+    """Waterfall coverage of every mapping row and of every api.
+    Rows are kept up to date by the mapping models event listeners, so
+    reading the coverage doesn't need to walk the work items tree.
+    parent_table/parent_id identify the mapping row (or the api).
+    """
+    __tablename__ = "mapping_coverage"
+    __table_args__ = (UniqueConstraint("parent_table", "parent_id"),
+                      {"sqlite_autoincrement": True})
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
+                                    primary_key=True)
+    parent_table: Mapped[str] = mapped_column(String(100))
+    parent_id: Mapped[int] = mapped_column(Integer())
+    api_id: Mapped[Optional[int]] = mapped_column(Integer(), index=True)
+    coverage: Mapped[float] = mapped_column(Float())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __init__(self, parent_table, parent_id, api_id, coverage):
+        self.parent_table = parent_table
+        self.parent_id = parent_id
+        self.api_id = api_id
+        self.coverage = coverage
+        self.updated_at = datetime.now()
+
+    def __repr__(self) -> str:
+        return f"MappingCoverageModel(id={self.id!r}, " \
+               f"parent_table={self.parent_table!r}, " \
+               f"parent_id={self.parent_id!r}, " \
+               f"api_id={self.api_id!r}, " \
+               f"coverage={self.coverage!r})"
+
+
+def get_coverage(db_session, parent_table, parent_id):
+    """Return the stored coverage of a mapping row (or api),
+    None if it has not been computed yet.
+    """
+    return db_session.query(MappingCoverageModel.coverage).filter(
+        MappingCoverageModel.parent_table == parent_table).filter(
+        MappingCoverageModel.parent_id == parent_id).scalar()
+
+
+def _waterfall(coverage, children_coverage, children_count, no_children_coverage):
+    if children_count == 0:
+        children_coverage = no_children_coverage
+    children_coverage = min(max(0, children_coverage), 100)
+    return min(max(0, (children_coverage * coverage) / 100.0), 100)
+
+
+def _sum_count(connection, column, where):
+    row = connection.execute(select(func.coalesce(func.sum(column), 0), func.count()).where(where)).one()
+    return row[0], row[1]
+
+
+def _api_id_of_sw_requirement_mapping(connection, sr_mapping_id):
+    t = Base.metadata.tables[API_SR_TABLE]
+    return connection.execute(select(t.c.api_id).where(t.c.id == sr_mapping_id)).scalar()
+
+
+def _compute(connection, parent_table, parent_id):
+    """Compute the coverage of a single row reading the already stored
+    coverage of its children.
+    Return (coverage, api_id, (parent_table, parent_id)) or None if the row doesn't exist.
+    """
+    tables = Base.metadata.tables
+    cov = tables[MappingCoverageModel.__tablename__]
+
+    if parent_table == API_TABLE:
+        coverage, _ = _sum_count(connection, cov.c.coverage,
+                                 and_(cov.c.api_id == parent_id,
+                                      cov.c.parent_table.in_([API_SR_TABLE, API_TS_TABLE, API_TC_TABLE])))
+        return coverage, parent_id, None
+
+    t = tables[parent_table]
+    row = connection.execute(select(t).where(t.c.id == parent_id)).first()
+    if row is None:
+        return None
+
+    if parent_table == API_SR_TABLE:
+        sr_ts = tables[SR_TS_TABLE]
+        sr_tc = tables[SR_TC_TABLE]
+        tss_coverage, tss_count = _sum_count(
+            connection, cov.c.coverage,
+            and_(cov.c.parent_table == SR_TS_TABLE,
+                 cov.c.parent_id.in_(select(sr_ts.c.id).where(sr_ts.c.sw_requirement_mapping_api_id == row.id))))
+        tcs_coverage, tcs_count = _sum_count(connection, sr_tc.c.coverage,
+                                             sr_tc.c.sw_requirement_mapping_api_id == row.id)
+        coverage = _waterfall(row.coverage, tss_coverage + tcs_coverage, tss_count + tcs_count, 100)
+        return coverage, row.api_id, (API_TABLE, row.api_id)
+
+    if parent_table == API_TS_TABLE:
+        ts_tc = tables[TS_TC_TABLE]
+        tcs_coverage, tcs_count = _sum_count(connection, ts_tc.c.coverage,
+                                             ts_tc.c.test_specification_mapping_api_id == row.id)
+        coverage = _waterfall(row.coverage, tcs_coverage, tcs_count, 100)
+        return coverage, row.api_id, (API_TABLE, row.api_id)
+
+    if parent_table == API_TC_TABLE:
+        return row.coverage, row.api_id, (API_TABLE, row.api_id)
+
+    if parent_table == SR_TS_TABLE:
+        ts_tc = tables[TS_TC_TABLE]
+        tcs_coverage, tcs_count = _sum_count(connection, ts_tc.c.coverage,
+                                             ts_tc.c.test_specification_mapping_sw_requirement_id == row.id)
+        coverage = _waterfall(row.coverage, tcs_coverage, tcs_count, 100)
+        api_id = _api_id_of_sw_requirement_mapping(connection, row.sw_requirement_mapping_api_id)
+        return coverage, api_id, (API_SR_TABLE, row.sw_requirement_mapping_api_id)
+
+    if parent_table == SR_TC_TABLE:
+        api_id = _api_id_of_sw_requirement_mapping(connection, row.sw_requirement_mapping_api_id)
+        return row.coverage, api_id, (API_SR_TABLE, row.sw_requirement_mapping_api_id)
+
+    if parent_table == TS_TC_TABLE:
+        if row.test_specification_mapping_api_id:
+            api_ts = tables[API_TS_TABLE]
+            api_id = connection.execute(select(api_ts.c.api_id).where(
+                api_ts.c.id == row.test_specification_mapping_api_id)).scalar()
+            return row.coverage, api_id, (API_TS_TABLE, row.test_specification_mapping_api_id)
+        sr_ts = tables[SR_TS_TABLE]
+        sr_mapping_id = connection.execute(select(sr_ts.c.sw_requirement_mapping_api_id).where(
+            sr_ts.c.id == row.test_specification_mapping_sw_requirement_id)).scalar()
+        api_id = _api_id_of_sw_requirement_mapping(connection, sr_mapping_id)
+        return row.coverage, api_id, (SR_TS_TABLE, row.test_specification_mapping_sw_requirement_id)
+
+    return None
+
+
+def _store(connection, parent_table, parent_id, api_id, coverage):
+    cov = Base.metadata.tables[MappingCoverageModel.__tablename__]
+    update_query = update(cov).where(cov.c.parent_table == parent_table).where(
+        cov.c.parent_id == parent_id).values(api_id=api_id, coverage=coverage, updated_at=datetime.now())
+    if connection.execute(update_query).rowcount == 0:
+        insert_query = insert(cov).values(parent_table=parent_table,
+                                          parent_id=parent_id,
+                                          api_id=api_id,
+                                          coverage=coverage,
+                                          updated_at=datetime.now())
+        connection.execute(insert_query)
+
+
+def refresh_coverage(connection, parent_table, parent_id, propagate=True):
+    """Recompute the stored coverage of a row and, if propagate,
+    of all its ancestors up to the api.
+    Indirect mappings left by a deleted direct mapping belong to no api
+    and have no coverage.
+    To be called from the mapping models event listeners.
+    """
+    while parent_table and parent_id is not None:
+        computed = _compute(connection, parent_table, parent_id)
+        if computed is None:
+            return
+        coverage, api_id, parent = computed
+        if api_id is None:
+            return
+        _store(connection, parent_table, parent_id, api_id, coverage)
+        if not propagate or parent is None:
+            return
+        parent_table, parent_id = parent
+
+
+def _indirect_mapping_ids(parent_table, parent_id):
+    """[(table, select of the ids)] of the indirect mappings of a mapping row"""
+    tables = Base.metadata.tables
+    sr_ts = tables[SR_TS_TABLE]
+    sr_tc = tables[SR_TC_TABLE]
+    ts_tc = tables[TS_TC_TABLE]
+
+    if parent_table == API_SR_TABLE:
+        sr_ts_ids = select(sr_ts.c.id).where(sr_ts.c.sw_requirement_mapping_api_id == parent_id)
+        return [(SR_TS_TABLE, sr_ts_ids),
+                (TS_TC_TABLE, select(ts_tc.c.id).where(
+                    ts_tc.c.test_specification_mapping_sw_requirement_id.in_(sr_ts_ids))),
+                (SR_TC_TABLE, select(sr_tc.c.id).where(sr_tc.c.sw_requirement_mapping_api_id == parent_id))]
+    if parent_table == API_TS_TABLE:
+        return [(TS_TC_TABLE, select(ts_tc.c.id).where(ts_tc.c.test_specification_mapping_api_id == parent_id))]
+    if parent_table == SR_TS_TABLE:
+        return [(TS_TC_TABLE, select(ts_tc.c.id).where(
+            ts_tc.c.test_specification_mapping_sw_requirement_id == parent_id))]
+    return []
+
+
+def delete_coverage(connection, parent_table, parent_id, ancestor_table, ancestor_id):
+    """Remove the stored coverage of a deleted row and of its indirect mappings,
+    that are left without an api, and refresh its ancestors
+    """
+    cov = Base.metadata.tables[MappingCoverageModel.__tablename__]
+    for table, ids in _indirect_mapping_ids(parent_table, parent_id):
+        connection.execute(delete(cov).where(cov.c.parent_table == table).where(cov.c.parent_id.in_(ids)))
+    connection.execute(delete(cov).where(cov.c.parent_table == parent_table).where(
+        cov.c.parent_id == parent_id))
+    refresh_coverage(connection, ancestor_table, ancestor_id)
+
+
+def _clamp_sql(value):
+    return case((value < 0, 0), (value > 100, 100), else_=value)
+
+
+def _waterfall_sql(coverage, children_coverage, children_count):
+    """_waterfall() as a sql expression, children_coverage and children_count can be null"""
+    children_coverage = case((func.coalesce(children_count, 0) == 0, 100),
+                             else_=func.coalesce(children_coverage, 0))
+    return _clamp_sql(_clamp_sql(children_coverage) * coverage / 100.0)
+
+
+def coverage_query(api_ids=None):
+    """Select (parent_table, parent_id, api_id, coverage) of every mapping row and api
+    of api_ids (every row if None), computing the waterfall coverage of every level
+    from the mapping rows in a single statement:
+    the children of every level are aggregated by a CTE read by the level above.
+    It returns the same coverage of refresh_coverage(), that computes a row at a time.
+    """
+    tables = Base.metadata.tables
+    api = tables[API_TABLE]
+    api_sr = tables[API_SR_TABLE]
+    api_ts = tables[API_TS_TABLE]
+    api_tc = tables[API_TC_TABLE]
+    sr_ts = tables[SR_TS_TABLE]
+    sr_tc = tables[SR_TC_TABLE]
+    ts_tc = tables[TS_TC_TABLE]
+
+    def in_apis(column):
+        # Indirect mappings left by a deleted direct mapping have no api
+        return column.isnot(None) if api_ids is None else column.in_(api_ids)
+
+    api_sr_ids = select(api_sr.c.id).where(in_apis(api_sr.c.api_id))
+    api_ts_ids = select(api_ts.c.id).where(in_apis(api_ts.c.api_id))
+    sr_ts_ids = select(sr_ts.c.id).where(sr_ts.c.sw_requirement_mapping_api_id.in_(api_sr_ids))
+
+    # Test cases of the test specifications
+    ts_tc_by_api_ts = select(ts_tc.c.test_specification_mapping_api_id.label('parent_id'),
+                             func.sum(ts_tc.c.coverage).label('coverage'),
+                             func.count().label('children')).where(
+        ts_tc.c.test_specification_mapping_api_id.in_(api_ts_ids)).group_by(
+        ts_tc.c.test_specification_mapping_api_id).cte('ts_tc_by_api_ts')
+    ts_tc_by_sr_ts = select(ts_tc.c.test_specification_mapping_sw_requirement_id.label('parent_id'),
+                            func.sum(ts_tc.c.coverage).label('coverage'),
+                            func.count().label('children')).where(
+        ts_tc.c.test_specification_mapping_sw_requirement_id.in_(sr_ts_ids)).group_by(
+        ts_tc.c.test_specification_mapping_sw_requirement_id).cte('ts_tc_by_sr_ts')
+
+    # Test specifications and test cases of the sw requirements
+    sr_ts_coverage = select(sr_ts.c.id,
+                            sr_ts.c.sw_requirement_mapping_api_id,
+                            _waterfall_sql(sr_ts.c.coverage, ts_tc_by_sr_ts.c.coverage,
+                                           ts_tc_by_sr_ts.c.children).label('coverage')).select_from(
+        sr_ts.outerjoin(ts_tc_by_sr_ts, ts_tc_by_sr_ts.c.parent_id == sr_ts.c.id)).where(
+        sr_ts.c.sw_requirement_mapping_api_id.in_(api_sr_ids) if api_ids is not None else true()).cte(
+        'sr_ts_coverage')
+    sr_ts_by_api_sr = select(sr_ts_coverage.c.sw_requirement_mapping_api_id.label('parent_id'),
+                             func.sum(sr_ts_coverage.c.coverage).label('coverage'),
+                             func.count().label('children')).group_by(
+        sr_ts_coverage.c.sw_requirement_mapping_api_id).cte('sr_ts_by_api_sr')
+    sr_tc_by_api_sr = select(sr_tc.c.sw_requirement_mapping_api_id.label('parent_id'),
+                             func.sum(sr_tc.c.coverage).label('coverage'),
+                             func.count().label('children')).where(
+        sr_tc.c.sw_requirement_mapping_api_id.in_(api_sr_ids)).group_by(
+        sr_tc.c.sw_requirement_mapping_api_id).cte('sr_tc_by_api_sr')
+
+    # Direct mappings
+    api_sr_coverage = select(api_sr.c.id, api_sr.c.api_id, _waterfall_sql(
+        api_sr.c.coverage,
+        func.coalesce(sr_ts_by_api_sr.c.coverage, 0) + func.coalesce(sr_tc_by_api_sr.c.coverage, 0),
+        func.coalesce(sr_ts_by_api_sr.c.children, 0) + func.coalesce(sr_tc_by_api_sr.c.children, 0)).label(
+        'coverage')).select_from(
+        api_sr.outerjoin(sr_ts_by_api_sr, sr_ts_by_api_sr.c.parent_id == api_sr.c.id).outerjoin(
+            sr_tc_by_api_sr, sr_tc_by_api_sr.c.parent_id == api_sr.c.id)).where(
+        in_apis(api_sr.c.api_id)).cte('api_sr_coverage')
+    api_ts_coverage = select(api_ts.c.id, api_ts.c.api_id, _waterfall_sql(
+        api_ts.c.coverage, ts_tc_by_api_ts.c.coverage, ts_tc_by_api_ts.c.children).label(
+        'coverage')).select_from(
+        api_ts.outerjoin(ts_tc_by_api_ts, ts_tc_by_api_ts.c.parent_id == api_ts.c.id)).where(
+        in_apis(api_ts.c.api_id)).cte('api_ts_coverage')
+    api_tc_coverage = select(api_tc.c.id, api_tc.c.api_id, api_tc.c.coverage).where(
+        in_apis(api_tc.c.api_id)).cte('api_tc_coverage')
+
+    # Apis, sum of their direct mappings
+    direct = union_all(select(api_sr_coverage.c.api_id, api_sr_coverage.c.coverage),
+                       select(api_ts_coverage.c.api_id, api_ts_coverage.c.coverage),
+                       select(api_tc_coverage.c.api_id, api_tc_coverage.c.coverage)).subquery('direct')
+    direct_by_api = select(direct.c.api_id, func.sum(direct.c.coverage).label('coverage')).group_by(
+        direct.c.api_id).subquery('direct_by_api')
+
+    # Indirect mappings take the api of their direct mapping
+    sr_api = api_sr.alias('sr_api')
+    ts_sr = sr_ts.alias('ts_sr')
+    ts_sr_api = api_sr.alias('ts_sr_api')
+    ts_api = api_ts.alias('ts_api')
+    ts_tc_api_id = case((ts_tc.c.test_specification_mapping_api_id.isnot(None), ts_api.c.api_id),
+                        else_=ts_sr_api.c.api_id)
+
+    return union_all(
+        select(literal(TS_TC_TABLE), ts_tc.c.id, ts_tc_api_id, ts_tc.c.coverage).select_from(
+            ts_tc.outerjoin(ts_api, ts_api.c.id == ts_tc.c.test_specification_mapping_api_id).outerjoin(
+                ts_sr, ts_sr.c.id == ts_tc.c.test_specification_mapping_sw_requirement_id).outerjoin(
+                ts_sr_api, ts_sr_api.c.id == ts_sr.c.sw_requirement_mapping_api_id)).where(
+            in_apis(ts_tc_api_id)),
+        select(literal(SR_TS_TABLE), sr_ts_coverage.c.id, sr_api.c.api_id, sr_ts_coverage.c.coverage).select_from(
+            sr_ts_coverage.outerjoin(sr_api, sr_api.c.id == sr_ts_coverage.c.sw_requirement_mapping_api_id)).where(
+            in_apis(sr_api.c.api_id)),
+        select(literal(SR_TC_TABLE), sr_tc.c.id, sr_api.c.api_id, sr_tc.c.coverage).select_from(
+            sr_tc.outerjoin(sr_api, sr_api.c.id == sr_tc.c.sw_requirement_mapping_api_id)).where(
+            in_apis(sr_api.c.api_id)),
+        select(literal(API_SR_TABLE), api_sr_coverage.c.id, api_sr_coverage.c.api_id, api_sr_coverage.c.coverage),
+        select(literal(API_TS_TABLE), api_ts_coverage.c.id, api_ts_coverage.c.api_id, api_ts_coverage.c.coverage),
+        select(literal(API_TC_TABLE), api_tc_coverage.c.id, api_tc_coverage.c.api_id, api_tc_coverage.c.coverage),
+        select(literal(API_TABLE), api.c.id, api.c.id, func.coalesce(direct_by_api.c.coverage, 0)).select_from(
+            api.outerjoin(direct_by_api, direct_by_api.c.api_id == api.c.id)).where(in_apis(api.c.id)))
+
+
+def compute_coverages(connection, api_ids=None):
+    """Return {(parent_table, parent_id): (api_id, coverage)} of every mapping row
+    and api of api_ids (every row if None), see coverage_query()
+    """
+    return {(row[0], row[1]): (row[2], row[3]) for row in connection.execute(coverage_query(api_ids))}
+
+
+def store_coverages(connection, api_ids=None):
+    """Replace the stored coverage of every mapping row and api of api_ids
+    (every row if None) with the one computed by coverage_query()
+    """
+    cov = Base.metadata.tables[MappingCoverageModel.__tablename__]
+    now = datetime.now()
+    rows = [{'parent_table': k[0], 'parent_id': k[1], 'api_id': v[0], 'coverage': v[1], 'updated_at': now}
+            for k, v in compute_coverages(connection, api_ids).items()]
+    if api_ids is None:
+        connection.execute(delete(cov))
+    else:
+        connection.execute(delete(cov).where(cov.c.api_id.in_(api_ids)))
+    if rows:
+        connection.execute(insert(cov), rows)
+
+
+def rebuild_coverage(connection):
+    """Compute the coverage of every row from scratch.
+    Used to populate the table on existing databases.
+    """
+    store_coverages(connection)
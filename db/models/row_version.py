@@ -0,0 +1,74 @@
+from datetime import datetime
+from sqlalchemy import *
+from sqlalchemy.orm.attributes import set_committed_value
+from db_base import Base
+
+# Max number of ids in a single IN clause
+CHUNK_SIZE = 500
+
+
+def store_version(connection, target, version):
+    """Copy the version of the last history row on the live row,
+    so current_version() doesn't need to read the history table.
+    To be called from the models after_update event listeners.
+    """
+    table = type(target).__table__
+    connection.execute(update(table).where(table.c.id == target.id).values(
+        version=version, updated_at=table.c.updated_at))
+    set_committed_value(target, 'version', version)
+
+
+def versioned_tables():
+    """Return the list of (table, history table) of the models with history"""
+    tables = Base.metadata.tables
+    return [(tables[x], tables[f'{x}_history']) for x in tables.keys() if f'{x}_history' in tables.keys()]
+
+
+def migrate_versions(connection):
+    """Add the version column to the tables created before it
+    and populate it from the history tables.
+    """
+    inspector = inspect(connection)
+    for table, history_table in versioned_tables():
+        if 'version' not in [x['name'] for x in inspector.get_columns(table.name)]:
+            connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN version INTEGER'))
+        last_version = select(func.max(history_table.c.version)).where(
+            history_table.c.id == table.c.id).scalar_subquery()
+        connection.execute(update(table).where(table.c.version == None).values(
+            version=last_version, updated_at=table.c.updated_at))
+
+
+def bulk_update(connection, table, rows):
+    """Update many rows of a table with history: one UPDATE executed with all the
+    rows (executemany) and one INSERT ... SELECT of their history rows per chunk of ids.
+    rows: list of dicts with the id and the new values of every row, same keys for all of them
+    The models event listeners are not called, the caller has to refresh
+    the stored coverage if the updated columns affect it.
+    """
+    if not rows:
+        return
+    history_table = Base.metadata.tables[f'{table.name}_history']
+    keys = [x for x in rows[0].keys() if x != 'id']
+    now = datetime.now()
+
+    last_version = select(func.max(history_table.c.version)).where(
+        history_table.c.id == table.c.id).scalar_subquery()
+    values = {x: bindparam(f'b_{x}') for x in keys}
+    values['version'] = func.coalesce(table.c.version, last_version) + 1
+    values['updated_at'] = now
+    connection.execute(update(table).where(table.c.id == bindparam('b_id')).values(values),
+                       [{f'b_{k}': v for k, v in x.items()} for x in rows])
+
+    ids = [x['id'] for x in rows]
+    for i in range(0, len(ids), CHUNK_SIZE):
+        insert_history(connection, table, table.c.id.in_(ids[i:i + CHUNK_SIZE]), now)
+
+
+def insert_history(connection, table, where, created_at):
+    """Copy the rows of table matching where, with their current version,
+    to the history table with a single INSERT ... SELECT
+    """
+    history_table = Base.metadata.tables[f'{table.name}_history']
+    columns = [x.name for x in history_table.columns if x.name not in ['row_id', 'created_at']]
+    query = select(*[table.c[x] for x in columns], literal(created_at, DateTime())).where(where)
+    connection.execute(insert(history_table).from_select(columns + ['created_at'], query))
@@ -0,0 +1,113 @@
+from sqlalchemy import *
+from sqlalchemy.exc import OperationalError
+
+# Columns of every searchable table
+SEARCH_COLUMNS = {"apis": ["api", "library_version", "category", "tags",
+                           "raw_specification_url", "implementation_file"],
+                  "sw_requirements": ["title", "description"],
+                  "test_specifications": ["title", "preconditions", "test_description", "expected_behavior"],
+                  "test_cases": ["title", "description", "repository", "relative_path"],
+                  "justifications": ["description"],
+                  "comments": ["comment", "username"]}
+
+# The trigram tokenizer matches terms of at least 3 characters
+MIN_TERM_LENGTH = 3
+
+
+def fts_table(table):
+    return f"{table}_fts"
+
+
+def create_search_index(connection):
+    """Create the SQLite FTS5 index of every searchable table, if missing.
+
+    Every table gets an external content FTS5 table <table>_fts, with the trigram
+    tokenizer so a term matches case insensitive substrings as LIKE '%term%' does,
+    and triggers keeping it in sync with every insert, update and delete.
+    Other databases, and SQLite builds without FTS5, are searched with LIKE.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+
+    for table, columns in SEARCH_COLUMNS.items():
+        fts = fts_table(table)
+        exists = connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                                    {"name": fts}).first()
+        if exists:
+            continue
+
+        fields = ", ".join(columns)
+        new_values = ", ".join([f"new.{x}" for x in columns])
+        old_values = ", ".join([f"old.{x}" for x in columns])
+        try:
+            connection.execute(text(f"CREATE VIRTUAL TABLE {fts} USING fts5({fields}, "
+                                    f"content='{table}', content_rowid='id', tokenize='trigram')"))
+        except OperationalError as e:
+            print(f"Full text search index not available: {e}")
+            return
+        connection.execute(text(f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                                f"INSERT INTO {fts}(rowid, {fields}) VALUES (new.id, {new_values}); END"))
+        connection.execute(text(f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                                f"INSERT INTO {fts}({fts}, rowid, {fields}) VALUES ('delete', old.id, {old_values}); "
+                                f"END"))
+        connection.execute(text(f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {fields} ON {table} BEGIN "
+                                f"INSERT INTO {fts}({fts}, rowid, {fields}) VALUES ('delete', old.id, {old_values}); "
+                                f"INSERT INTO {fts}(rowid, {fields}) VALUES (new.id, {new_values}); END"))
+        # Index the existing rows
+        connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def search_index_available(connection, table):
+    """True if table has a full text search index"""
+    if connection.dialect.name != "sqlite":
+        return False
+    return connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                              {"name": fts_table(table)}).first() is not None
+
+
+def match_expression(term):
+    """FTS5 query matching term as a substring, the term is quoted so it is never parsed as a query"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def use_search_index(connection, table, term):
+    return len(term) >= MIN_TERM_LENGTH and search_index_available(connection, table)
+
+
+def search_clause(db_session, model, term):
+    """Filter on the rows of model containing term in one of their searchable columns"""
+    table = model.__tablename__
+    if use_search_index(db_session.connection(), table, term):
+        fts = fts_table(table)
+        ids = select(literal_column("rowid")).select_from(text(fts)).where(
+            text(f"{fts} MATCH :search_term").bindparams(search_term=match_expression(term)))
+        return model.id.in_(ids)
+    return or_(*[getattr(model, x).ilike(f"%{term}%") for x in SEARCH_COLUMNS[table]])
+
+
+def search(db_session, term, tables=None, limit=50):
+    """Return (table, id, rank) of the rows containing term, best match first.
+    With the full text search index the rank is the bm25 score (lower is better),
+    without it every row has rank 0 and rows are sorted by table and id.
+    """
+    connection = db_session.connection()
+    tables = [x for x in SEARCH_COLUMNS.keys() if not tables or x in tables]
+    queries = []
+    for table in tables:
+        if use_search_index(connection, table, term):
+            fts = fts_table(table)
+            queries.append(f"SELECT '{table}' AS parent_table, rowid AS id, bm25({fts}) AS rank "
+                           f"FROM {fts} WHERE {fts} MATCH :search_term")
+        else:
+            where = " OR ".join([f"lower({x}) LIKE :like_term" for x in SEARCH_COLUMNS[table]])
+            queries.append(f"SELECT '{table}' AS parent_table, id, 0.0 AS rank "
+                           f"FROM {table} WHERE {where}")
+    if not queries:
+        return []
+
+    query = " UNION ALL ".join([f"SELECT * FROM ({x}) AS q{i}" for i, x in enumerate(queries)])
+    rows = connection.execute(text(f"{query} ORDER BY rank, parent_table, id LIMIT :limit"),
+                              {"search_term": match_expression(term),
+                               "like_term": f"%{term.lower()}%",
+                               "limit": limit})
+    return [(x[0], x[1], x[2]) for x in rows]
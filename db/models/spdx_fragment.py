@@ -0,0 +1,50 @@
+from datetime import datetime
+from sqlalchemy import *
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import mapped_column
+from db_base import Base
+
+# Table of the rows exported as the elements of every SPDX id prefix
+SPDX_ID_TABLES = {"API-": "apis",
+                  "API-SR-": "sw_requirement_mapping_api",
+                  "API-TS-": "test_specification_mapping_api",
+                  "API-TC-": "test_case_mapping_api",
+                  "API-JUST-": "justification_mapping_api",
+                  "SR-": "sw_requirements",
+                  "TS-": "test_specifications",
+                  "TC-": "test_cases",
+                  "JUST-": "justifications"}
+
+
+class SpdxFragmentModel(Base):
+    """SPDX json of an exported element with the hash of the data it was built from.
+    The SPDX export reuses the fragment of an element while the hash doesn't change.
+    """
+    __tablename__ = "spdx_fragments"
+    __table_args__ = {"sqlite_autoincrement": True}
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
+                                    primary_key=True)
+    spdx_id: Mapped[str] = mapped_column(String(100), unique=True)
+    source_hash: Mapped[str] = mapped_column(String(32))
+    fragment: Mapped[str] = mapped_column(String())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __init__(self, spdx_id, source_hash, fragment):
+        self.spdx_id = spdx_id
+        self.source_hash = source_hash
+        self.fragment = fragment
+        self.updated_at = datetime.now()
+
+    def __repr__(self) -> str:
+        return f"SpdxFragmentModel(id={self.id!r}, " \
+               f"spdx_id={self.spdx_id!r}, " \
+               f"source_hash={self.source_hash!r})"
+
+
+def delete_stale_fragments(connection):
+    """Delete the fragments of the elements whose row doesn't exist anymore"""
+    tables = Base.metadata.tables
+    spdx_ids = union_all(*[select(literal(prefix, String()).concat(cast(tables[table].c.id, String())))
+                           for prefix, table in SPDX_ID_TABLES.items()])
+    table = SpdxFragmentModel.__table__
+    return connection.execute(delete(table).where(table.c.spdx_id.not_in(spdx_ids))).rowcount
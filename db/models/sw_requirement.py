@@ -9,6 +9,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from db_base import Base
+from row_version import store_version
 
 class SwRequirementModel(Base):
     __tablename__ = 'sw_requirements'
@@ -17,6 +18,7 @@ class SwRequirementModel(Base):
                                     primary_key=True)
     title: Mapped[str] = mapped_column(String())
     description: Mapped[Optional[str]] = mapped_column(String())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -32,6 +34,9 @@ class SwRequirementModel(Base):
                f"description={self.description!r})"
 
     def current_version(self, db_session):
+        if self.version is not None:
+            return f'{self.version}'
+
         last_item = db_session.query(SwRequirementHistoryModel).filter(
                      SwRequirementHistoryModel.id == self.id).order_by(
                      SwRequirementHistoryModel.version.desc()).limit(1).all()[0]
@@ -68,6 +73,7 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
 
 @event.listens_for(SwRequirementModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -82,7 +88,8 @@ def receive_after_insert(mapper, connection, target):
 
 class SwRequirementHistoryModel(Base):
     __tablename__ = 'sw_requirements_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_sw_requirements_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -1,10 +1,14 @@
 from api_sw_requirement import *
 from test_case import *
 from test_specification_test_case import *
+from mapping_coverage import API_SR_TABLE, refresh_coverage, delete_coverage
+from row_version import store_version
 
 class SwRequirementTestCaseModel(Base):
     __tablename__ = "test_case_mapping_sw_requirement"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_sr_tc_sw_requirement_mapping_api_id", "sw_requirement_mapping_api_id"),
+                      Index("ix_sr_tc_test_case_id", "test_case_id"),
+                      {"sqlite_autoincrement": True})
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     sw_requirement_mapping_api: Mapped["ApiSwRequirementModel"] = relationship("ApiSwRequirementModel", foreign_keys="SwRequirementTestCaseModel.sw_requirement_mapping_api_id")
@@ -12,6 +16,7 @@ class SwRequirementTestCaseModel(Base):
     test_case_id: Mapped[int] = mapped_column(ForeignKey("test_cases.id"))
     test_case: Mapped["TestCaseModel"] = relationship("TestCaseModel", foreign_keys="SwRequirementTestCaseModel.test_case_id")
     coverage: Mapped[int] = mapped_column(Integer())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -31,6 +36,9 @@ class SwRequirementTestCaseModel(Base):
                f"coverage={self.coverage!r})"
 
     def current_version(self, db_session):
+        if self.version is not None and self.test_case.version is not None:
+            return f'{self.test_case.version}.{self.version}'
+
         last_mapping = db_session.query(SwRequirementTestCaseHistoryModel).filter(
             SwRequirementTestCaseHistoryModel.id == self.id).order_by(
             SwRequirementTestCaseHistoryModel.version.desc()).limit(1).all()[0]
@@ -108,6 +116,8 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
+    refresh_coverage(connection, SwRequirementTestCaseModel.__tablename__, target.id)
 
 @event.listens_for(SwRequirementTestCaseModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -119,11 +129,18 @@ def receive_after_insert(mapper, connection, target):
         version=1
     )
     connection.execute(insert_query)
+    refresh_coverage(connection, SwRequirementTestCaseModel.__tablename__, target.id)
+
+@event.listens_for(SwRequirementTestCaseModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    delete_coverage(connection, SwRequirementTestCaseModel.__tablename__, target.id,
+                    API_SR_TABLE, target.sw_requirement_mapping_api_id)
 
 
 class SwRequirementTestCaseHistoryModel(Base):
     __tablename__ = 'test_case_mapping_sw_requirement_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_sr_tc_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -1,9 +1,13 @@
 from api_sw_requirement import *
 from test_specification import *
+from mapping_coverage import API_SR_TABLE, get_coverage, refresh_coverage, delete_coverage
+from row_version import store_version
 
 class SwRequirementTestSpecificationModel(Base):
     __tablename__ = "test_specification_mapping_sw_requirement"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_sr_ts_sw_requirement_mapping_api_id", "sw_requirement_mapping_api_id"),
+                      Index("ix_sr_ts_test_specification_id", "test_specification_id"),
+                      {"sqlite_autoincrement": True})
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     sw_requirement_mapping_api: Mapped["ApiSwRequirementModel"] = relationship("ApiSwRequirementModel", foreign_keys="SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id")
@@ -11,6 +15,7 @@ class SwRequirementTestSpecificationModel(Base):
     test_specification_id: Mapped[int] = mapped_column(ForeignKey("test_specifications.id"))
     test_specification: Mapped["TestSpecificationModel"] = relationship("TestSpecificationModel", foreign_keys="SwRequirementTestSpecificationModel.test_specification_id")
     coverage: Mapped[int] = mapped_column(Integer())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -30,6 +35,9 @@ class SwRequirementTestSpecificationModel(Base):
                f"coverage={self.coverage!r})"
 
     def current_version(self, db_session):
+        if self.version is not None and self.test_specification.version is not None:
+            return f'{self.test_specification.version}.{self.version}'
+
         last_mapping = db_session.query(SwRequirementTestSpecificationHistoryModel).filter(
             SwRequirementTestSpecificationHistoryModel.id == self.id).order_by(
             SwRequirementTestSpecificationHistoryModel.version.desc()).limit(1).all()[0]
@@ -69,6 +77,12 @@ class SwRequirementTestSpecificationModel(Base):
         if db_session == None:
             return self.coverage
 
+        coverage = get_coverage(db_session, self.__tablename__, self.id)
+        if coverage is not None:
+            return coverage
+        return self.compute_waterfall_coverage(db_session)
+
+    def compute_waterfall_coverage(self, db_session):
         from test_specification_test_case import TestSpecificationTestCaseModel
         #Calc children(TestSpecificationTestCase) coverage
         #filtering with test_specification_mapping_sw_requirement_id
@@ -110,6 +124,8 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
+    refresh_coverage(connection, SwRequirementTestSpecificationModel.__tablename__, target.id)
 
 @event.listens_for(SwRequirementTestSpecificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -121,11 +137,18 @@ def receive_after_insert(mapper, connection, target):
         version=1
     )
     connection.execute(insert_query)
+    refresh_coverage(connection, SwRequirementTestSpecificationModel.__tablename__, target.id)
+
+@event.listens_for(SwRequirementTestSpecificationModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    delete_coverage(connection, SwRequirementTestSpecificationModel.__tablename__, target.id,
+                    API_SR_TABLE, target.sw_requirement_mapping_api_id)
 
 
 class SwRequirementTestSpecificationHistoryModel(Base):
     __tablename__ = 'test_specification_mapping_sw_requirement_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_sr_ts_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
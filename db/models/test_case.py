@@ -10,6 +10,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from db_base import Base
+from row_version import store_version
 
 class TestCaseModel(Base):
     __tablename__ = "test_cases"
@@ -20,6 +21,7 @@ class TestCaseModel(Base):
     relative_path: Mapped[str] = mapped_column(String())
     title: Mapped[str] = mapped_column(String())
     description: Mapped[str] = mapped_column(String())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -39,6 +41,9 @@ class TestCaseModel(Base):
                f"description={self.description!r})"
 
     def current_version(self, db_session):
+        if self.version is not None:
+            return f'{self.version}'
+
         last_item = db_session.query(TestCaseHistoryModel).filter(
                      TestCaseHistoryModel.id == self.id).order_by(
                      TestCaseHistoryModel.version.desc()).limit(1).all()[0]
@@ -79,6 +84,7 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
 
 @event.listens_for(TestCaseModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -95,7 +101,8 @@ def receive_after_insert(mapper, connection, target):
 
 class TestCaseHistoryModel(Base):
     __tablename__ = 'test_cases_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_test_cases_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -9,6 +9,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from db_base import Base
+from row_version import store_version
 
 class TestSpecificationModel(Base):
     __tablename__ = 'test_specifications'
@@ -19,6 +20,7 @@ class TestSpecificationModel(Base):
     preconditions: Mapped[Optional[str]] = mapped_column(String(), nullable=True)
     test_description: Mapped[str] = mapped_column(String())
     expected_behavior: Mapped[str] = mapped_column(String())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -35,6 +37,9 @@ class TestSpecificationModel(Base):
                f"test_description={self.test_description!r}, expected_behavior={self.expected_behavior!r})"
 
     def current_version(self, db_session):
+        if self.version is not None:
+            return f'{self.version}'
+
         last_item = db_session.query(TestSpecificationHistoryModel).filter(
                      TestSpecificationHistoryModel.id == self.id).order_by(
                      TestSpecificationHistoryModel.version.desc()).limit(1).all()[0]
@@ -75,6 +80,7 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
 
 @event.listens_for(TestSpecificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -91,7 +97,8 @@ def receive_after_insert(mapper, connection, target):
 
 class TestSpecificationHistoryModel(Base):
     __tablename__ = 'test_specifications_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_test_specifications_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
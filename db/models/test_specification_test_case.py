@@ -2,10 +2,15 @@ from test_case import *
 from api_test_specification import ApiTestSpecificationModel
 from sw_requirement_test_specification import *
 from db_base import Base
+from mapping_coverage import API_TS_TABLE, SR_TS_TABLE, refresh_coverage, delete_coverage
+from row_version import store_version
 
 class TestSpecificationTestCaseModel(Base):
     __tablename__ = "test_case_mapping_test_specification"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_ts_tc_test_specification_mapping_api_id", "test_specification_mapping_api_id"),
+                      Index("ix_ts_tc_test_specification_mapping_sw_requirement_id", "test_specification_mapping_sw_requirement_id"),
+                      Index("ix_ts_tc_test_case_id", "test_case_id"),
+                      {"sqlite_autoincrement": True})
     id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                     primary_key=True)
     test_specification_mapping_api_id: Mapped[Optional[int]] = mapped_column(
@@ -19,6 +24,7 @@ class TestSpecificationTestCaseModel(Base):
     test_case_id: Mapped[int] = mapped_column(ForeignKey("test_cases.id"))
     test_case: Mapped["TestCaseModel"] = relationship("TestCaseModel", foreign_keys="TestSpecificationTestCaseModel.test_case_id")
     coverage: Mapped[int] = mapped_column(Integer())
+    version: Mapped[Optional[int]] = mapped_column(Integer(), default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -75,6 +81,9 @@ class TestSpecificationTestCaseModel(Base):
         return _dict
 
     def current_version(self, db_session):
+        if self.version is not None and self.test_case.version is not None:
+            return f'{self.test_case.version}.{self.version}'
+
         last_mapping = db_session.query(TestSpecificationTestCaseHistoryModel).filter(
             TestSpecificationTestCaseHistoryModel.id == self.id).order_by(
             TestSpecificationTestCaseHistoryModel.version.desc()).limit(1).all()[0]
@@ -113,6 +122,8 @@ def receive_after_update(mapper, connection, target):
             version=version + 1
         )
         connection.execute(insert_query)
+        store_version(connection, target, version + 1)
+    refresh_coverage(connection, TestSpecificationTestCaseModel.__tablename__, target.id)
 
 @event.listens_for(TestSpecificationTestCaseModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
@@ -125,11 +136,22 @@ def receive_after_insert(mapper, connection, target):
         version=1
     )
     connection.execute(insert_query)
+    refresh_coverage(connection, TestSpecificationTestCaseModel.__tablename__, target.id)
+
+@event.listens_for(TestSpecificationTestCaseModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    if target.test_specification_mapping_api_id:
+        delete_coverage(connection, TestSpecificationTestCaseModel.__tablename__, target.id,
+                        API_TS_TABLE, target.test_specification_mapping_api_id)
+    else:
+        delete_coverage(connection, TestSpecificationTestCaseModel.__tablename__, target.id,
+                        SR_TS_TABLE, target.test_specification_mapping_sw_requirement_id)
 
 
 class TestSpecificationTestCaseHistoryModel(Base):
     __tablename__ = 'test_case_mapping_test_specification_history'
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (Index("ix_ts_tc_history_id_version", "id", "version"),
+                      {"sqlite_autoincrement": True})
     row_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"),
                                         primary_key=True)
     id: Mapped[int] = mapped_column(Integer())
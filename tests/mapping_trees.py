@@ -0,0 +1,91 @@
+"""Builders of api mapping trees for the tests"""
+from api import ApiModel
+from api_justification import ApiJustificationModel
+from api_sw_requirement import ApiSwRequirementModel
+from api_test_case import ApiTestCaseModel
+from api_test_specification import ApiTestSpecificationModel
+from comment import CommentModel
+from justification import JustificationModel
+from sw_requirement import SwRequirementModel
+from sw_requirement_test_case import SwRequirementTestCaseModel
+from sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from test_case import TestCaseModel
+from test_specification import TestSpecificationModel
+from test_specification_test_case import TestSpecificationTestCaseModel
+
+
+def add(db_session, row):
+    db_session.add(row)
+    db_session.flush()
+    return row
+
+
+def add_api(db_session, name, library="library"):
+    return add(db_session, ApiModel(name, library, "1.0", "", "category", "", 0, 0, ""))
+
+
+def add_sw_requirement(db_session, api, offset, coverage):
+    sr = add(db_session, SwRequirementModel(f"sr {offset}", "description"))
+    return add(db_session, ApiSwRequirementModel(api, sr, "section", offset, coverage))
+
+
+def add_test_specification(db_session, api, offset, coverage):
+    ts = add(db_session, TestSpecificationModel(f"ts {offset}", "preconditions", "description", "expected"))
+    return add(db_session, ApiTestSpecificationModel(api, ts, "section", offset, coverage))
+
+
+def add_test_case(db_session, api, offset, coverage):
+    tc = add(db_session, TestCaseModel("repository", "path", f"tc {offset}", "description"))
+    return add(db_session, ApiTestCaseModel(api, tc, "section", offset, coverage))
+
+
+def add_justification(db_session, api, offset, coverage):
+    j = add(db_session, JustificationModel(f"justification {offset}"))
+    return add(db_session, ApiJustificationModel(api, j, "section", offset, coverage))
+
+
+def add_sr_test_specification(db_session, api_sr, coverage):
+    ts = add(db_session, TestSpecificationModel("indirect ts", "preconditions", "description", "expected"))
+    return add(db_session, SwRequirementTestSpecificationModel(api_sr, ts, coverage))
+
+
+def add_sr_test_case(db_session, api_sr, coverage):
+    tc = add(db_session, TestCaseModel("repository", "path", "indirect tc", "description"))
+    return add(db_session, SwRequirementTestCaseModel(api_sr, tc, coverage))
+
+
+def add_ts_test_case(db_session, api_ts, sr_ts, coverage):
+    tc = add(db_session, TestCaseModel("repository", "path", "indirect tc", "description"))
+    return add(db_session, TestSpecificationTestCaseModel(api_ts, sr_ts, tc, coverage))
+
+
+def add_comment(db_session, row):
+    return add(db_session, CommentModel(row.__tablename__, row.id, "user", "comment"))
+
+
+def mapping_rows(db_session):
+    """Every direct and indirect mapping row"""
+    rows = []
+    for model in [ApiSwRequirementModel, ApiTestSpecificationModel, ApiTestCaseModel,
+                  SwRequirementTestSpecificationModel, SwRequirementTestCaseModel,
+                  TestSpecificationTestCaseModel]:
+        rows += db_session.query(model).order_by(model.id).all()
+    return rows
+
+
+def indirect_mappings(db_session, row):
+    """Indirect mappings of row, they are deleted before it"""
+    if isinstance(row, ApiSwRequirementModel):
+        ret = []
+        for sr_ts in db_session.query(SwRequirementTestSpecificationModel).filter(
+                SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id == row.id).all():
+            ret += indirect_mappings(db_session, sr_ts) + [sr_ts]
+        return ret + db_session.query(SwRequirementTestCaseModel).filter(
+            SwRequirementTestCaseModel.sw_requirement_mapping_api_id == row.id).all()
+    if isinstance(row, ApiTestSpecificationModel):
+        return db_session.query(TestSpecificationTestCaseModel).filter(
+            TestSpecificationTestCaseModel.test_specification_mapping_api_id == row.id).all()
+    if isinstance(row, SwRequirementTestSpecificationModel):
+        return db_session.query(TestSpecificationTestCaseModel).filter(
+            TestSpecificationTestCaseModel.test_specification_mapping_sw_requirement_id == row.id).all()
+    return []
@@ -0,0 +1,123 @@
+"""Mappings of an api copied by fork_api_mappings() with a statement per table"""
+from sqlalchemy import select
+from api_fork import API_J_TABLE, NOT_COPIED_COLUMNS, fork_api_mappings
+from api_sw_requirement import ApiSwRequirementModel
+from db_base import Base
+from mapping_coverage import API_TABLE, API_SR_TABLE, API_TS_TABLE, API_TC_TABLE, SR_TS_TABLE, SR_TC_TABLE, \
+    TS_TC_TABLE, MappingCoverageModel, compute_coverages
+from sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from mapping_trees import add, add_api, add_justification, add_sr_test_case, add_sr_test_specification, \
+    add_sw_requirement, add_test_case, add_test_specification, add_ts_test_case
+import mapping_trees
+
+# Indirect mapping tables of every mapping table, with their parent column
+CHILDREN = {API_SR_TABLE: [(SR_TS_TABLE, 'sw_requirement_mapping_api_id'),
+                           (SR_TC_TABLE, 'sw_requirement_mapping_api_id')],
+            API_TS_TABLE: [(TS_TC_TABLE, 'test_specification_mapping_api_id')],
+            SR_TS_TABLE: [(TS_TC_TABLE, 'test_specification_mapping_sw_requirement_id')]}
+PARENT_COLUMNS = ['api_id', 'sw_requirement_mapping_api_id', 'test_specification_mapping_api_id',
+                  'test_specification_mapping_sw_requirement_id']
+
+
+def copied_values(row):
+    return {k: v for k, v in row._mapping.items() if k not in NOT_COPIED_COLUMNS + PARENT_COLUMNS}
+
+
+def walk(connection, table_name, column, parent_id):
+    """(table, row) of the rows of table_name whose column is parent_id and of their
+    indirect mappings, depth first in id order
+    """
+    table = Base.metadata.tables[table_name]
+    ret = []
+    for row in connection.execute(select(table).where(table.c[column] == parent_id).order_by(table.c.id)):
+        ret.append((table_name, row))
+        for child_table, child_column in CHILDREN.get(table_name, []):
+            ret += walk(connection, child_table, child_column, row.id)
+    return ret
+
+
+def api_mappings(connection, api_id):
+    ret = []
+    for table_name in [API_SR_TABLE, API_TS_TABLE, API_TC_TABLE, API_J_TABLE]:
+        ret += walk(connection, table_name, 'api_id', api_id)
+    return ret
+
+
+def history(connection, table_name, id):
+    table = Base.metadata.tables[f'{table_name}_history']
+    return connection.execute(select(table).where(table.c.id == id).order_by(table.c.version)).all()
+
+
+def stored_coverages(db_session, api_id):
+    return {(x.parent_table, x.parent_id): x.coverage for x in db_session.query(MappingCoverageModel).filter(
+        MappingCoverageModel.api_id == api_id).all()}
+
+
+def add_duplicated_mappings(db_session, api):
+    """Mappings with the same values under the same parent, every one with different indirect mappings"""
+    api_srs = [add_sw_requirement(db_session, api, 0, 50)]
+    api_srs.append(add(db_session, ApiSwRequirementModel(api, api_srs[0].sw_requirement, "section", 0, 50)))
+    sr_ts = add_sr_test_specification(db_session, api_srs[0], 40)
+    duplicated_sr_ts = add(db_session, SwRequirementTestSpecificationModel(api_srs[0], sr_ts.test_specification, 40))
+    add_ts_test_case(db_session, None, sr_ts, 10)
+    add_ts_test_case(db_session, None, duplicated_sr_ts, 30)
+    add_ts_test_case(db_session, None, duplicated_sr_ts, 30)
+    add_sr_test_case(db_session, api_srs[1], 20)
+    add_sr_test_specification(db_session, api_srs[1], 60)
+
+    api_ts = add_test_specification(db_session, api, 10, 50)
+    duplicated_api_ts = add(db_session, mapping_trees.ApiTestSpecificationModel(
+        api, api_ts.test_specification, "section", 10, 50))
+    add_ts_test_case(db_session, api_ts, None, 70)
+    add_ts_test_case(db_session, duplicated_api_ts, None, 80)
+
+    add_test_case(db_session, api, 20, 30)
+    add_test_case(db_session, api, 20, 30)
+    add_justification(db_session, api, 30, 100)
+    db_session.commit()
+
+    # History versions of the source rows
+    api_srs[1].coverage = 55
+    sr_ts.coverage = 45
+    db_session.commit()
+
+
+def test_fork_api_mappings(db_session):
+    source_api = add_api(db_session, "api")
+    other_api = add_api(db_session, "other api")
+    add_duplicated_mappings(db_session, source_api)
+    add_duplicated_mappings(db_session, other_api)
+    new_api = add_api(db_session, "api", library="forked")
+    db_session.commit()
+
+    fork_api_mappings(db_session.connection(), source_api.id, new_api.id)
+    db_session.commit()
+    connection = db_session.connection()
+
+    # Same values and same tree, the copies of duplicated rows get the indirect mappings of their source
+    sources = api_mappings(connection, source_api.id)
+    copies = api_mappings(connection, new_api.id)
+    assert len(sources) == 16
+    assert [(x[0], copied_values(x[1])) for x in copies] == [(x[0], copied_values(x[1])) for x in sources]
+    assert not set((x[0], x[1].id) for x in copies) & set((x[0], x[1].id) for x in sources)
+    assert len(api_mappings(connection, other_api.id)) == 16
+
+    # A single history version of every copy
+    for table_name, row in copies:
+        assert row.version == 1
+        rows = history(connection, table_name, row.id)
+        assert [x.version for x in rows] == [1]
+        # The offset of the test specification history is a string column
+        assert {k: str(v) for k, v in rows[0]._mapping.items() if k in copied_values(row)} == \
+            {k: str(v) for k, v in copied_values(row).items()}
+    assert [[x.version for x in history(connection, API_SR_TABLE, row.id)]
+            for table_name, row in sources if table_name == API_SR_TABLE] == [[1], [1, 2]]
+
+    # Stored coverage of the copies, equal to the one of their source rows and to the computed one
+    source_coverages = stored_coverages(db_session, source_api.id)
+    coverages = stored_coverages(db_session, new_api.id)
+    for (table_name, source), (_, copy) in zip(sources, copies):
+        if table_name != API_J_TABLE:
+            assert coverages[(table_name, copy.id)] == source_coverages[(table_name, source.id)]
+    assert coverages[(API_TABLE, new_api.id)] == source_coverages[(API_TABLE, source_api.id)]
+    assert coverages == {k: v[1] for k, v in compute_coverages(connection, [new_api.id]).items()}
@@ -0,0 +1,58 @@
+import urllib.request
+from email.message import Message
+from urllib.error import URLError
+import pytest
+from mapping_trees import add_api, add_sw_requirement
+
+# 7 characters of the specification mapped with coverage 50
+SPECIFICATION = "section" + " of the specification" * 5
+REMOTE_URL = "http://127.0.0.1:9/specification.txt"
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Urls the specification cache tries to fetch"""
+    urls = []
+
+    def urlopen(request, timeout=None):
+        urls.append(request.full_url)
+        raise URLError("no network in the tests")
+    monkeypatch.setattr(urllib.request, "urlopen", urlopen)
+    return urls
+
+
+def add_mapped_api(app_session, name, url):
+    api = add_api(app_session, name)
+    api.raw_specification_url = url
+    add_sw_requirement(app_session, api, 0, 50)
+    app_session.commit()
+    return api
+
+
+def listed_coverage(api_client):
+    response = api_client.get("/apis?fields=api,coverage")
+    assert response.status_code == 200
+    return {x['api']: x['coverage'] for x in response.json}
+
+
+def test_listing_doesnt_fetch_specifications(api_client, app_session, fetches):
+    add_mapped_api(app_session, "remote", REMOTE_URL)
+    # Not cached, the stored coverage of the direct mappings
+    assert listed_coverage(api_client) == {"remote": 50}
+    assert fetches == []
+
+
+def test_listing_reads_cached_specifications(basil_api, api_client, app_session, fetches, tmp_path):
+    add_mapped_api(app_session, "remote", REMOTE_URL)
+    headers = Message()
+    headers['Content-Type'] = 'text/plain; charset=utf-8'
+    basil_api.specification_cache.store(REMOTE_URL, SPECIFICATION.encode(), headers)
+
+    local_path = tmp_path / "specification.txt"
+    local_path.write_text(SPECIFICATION)
+    add_mapped_api(app_session, "local", str(local_path))
+
+    # Sections coverage, 7 characters out of SPECIFICATION covered at 50%
+    coverage = int(7 * 50 / len(SPECIFICATION))
+    assert listed_coverage(api_client) == {"local": coverage, "remote": coverage}
+    assert fetches == []
@@ -0,0 +1,71 @@
+import random
+import pytest
+import coverage_kernel
+from coverage_kernel import apis_sections_coverage, section_coverages, sections_coverage, weighted_coverage
+from section_splitter import SpecificationSections
+
+
+def random_specifications(rnd, count):
+    specifications = {}
+    mapped_items = {}
+    for api_id in range(count):
+        specification = "".join(rnd.choice("ab \n") for i in range(rnd.randint(0, 300)))
+        items = []
+        for i in range(rnd.randint(0, 8)):
+            offset = rnd.randint(0, len(specification))
+            section = specification[offset:offset + rnd.randint(0, 60)]
+            items.append((offset, section, rnd.choice([0, 50, 100, rnd.uniform(0, 100)])))
+        # Sections not matching the specification are ignored
+        items.append((0, "not in the specification", 100))
+        specifications[api_id] = specification if rnd.random() > 0.1 else None
+        mapped_items[api_id] = items
+    return specifications, mapped_items
+
+
+def test_weighted_coverage_full():
+    # Summing (len / total) * (cov / 100) of every section returned 99
+    assert weighted_coverage([1, 4, 2], [100, 100, 100]) == 100
+    assert weighted_coverage([1, 10, 10], [100, 100, 100]) == 100
+
+
+def test_weighted_coverage():
+    assert weighted_coverage([], []) == 0
+    assert weighted_coverage([1, 3], [100, 0]) == 25
+    assert weighted_coverage([2, 1], [50, 100]) == 66
+
+
+def test_sections_coverage_full():
+    specification = "a" + "b" * 4 + "cc"
+    mapped_items = [(0, "a", 100), (1, "bbbb", 100), (5, "cc", 100)]
+    assert sections_coverage(specification, mapped_items) == 100
+    assert apis_sections_coverage({1: specification}, {1: mapped_items}) == {1: 100}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_vectorized_coverage(monkeypatch, seed):
+    if coverage_kernel.np is None:
+        pytest.skip("NumPy is not installed")
+    specifications, mapped_items = random_specifications(random.Random(seed), 50)
+    vectorized = apis_sections_coverage(specifications, mapped_items)
+    monkeypatch.setattr(coverage_kernel, "np", None)
+    assert vectorized == apis_sections_coverage(specifications, mapped_items)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sections_of_the_mapping_view(seed):
+    """The kernel sections are the ones of the sw requirements mapping view, with the same coverage"""
+    specifications, mapped_items = random_specifications(random.Random(seed), 50)
+    for api_id, specification in specifications.items():
+        if specification is None:
+            continue
+        mapping = {'sw_requirements': [{'relation_id': i,
+                                        'offset': offset,
+                                        'section': section,
+                                        'match': specification[offset:offset + len(section)] == section,
+                                        'coverage': coverage,
+                                        'version': '1.1',
+                                        'sw_requirement': {'id': i}}
+                                       for i, (offset, section, coverage) in enumerate(mapped_items[api_id])]}
+        sections = SpecificationSections(specification, mapping, ['sw_requirement']).sections
+        assert section_coverages(specification, mapped_items[api_id]) == \
+            ([x.end - x.start for x in sections], [x.coverage for x in sections])
@@ -0,0 +1,49 @@
+"""Queries whose syntax depends on the database, run against BASIL_DB_URL when it is set.
+The coverage statements are checked by test_mapping_coverage.py with the same databases.
+"""
+import pytest
+import search_index
+from search_index import search
+from mapping_trees import add_api, add_comment, add_justification, add_sw_requirement, add_test_case, \
+    add_test_specification
+
+FILTERS = [("/sw-requirements", "title", "SR 1"),
+           ("/test-specifications", "title", "TS 1"),
+           ("/test-cases", "title", "TC 1"),
+           ("/justifications", "description", "JUSTIFICATION 1")]
+
+
+def add_work_items(app_session):
+    api = add_api(app_session, "Api")
+    for i in range(3):
+        add_comment(app_session, add_sw_requirement(app_session, api, i, 50))
+        add_test_specification(app_session, api, i, 50)
+        add_test_case(app_session, api, i, 50)
+        add_justification(app_session, api, i, 50)
+    app_session.commit()
+
+
+@pytest.mark.parametrize("url, field, value", FILTERS)
+def test_filters_are_case_insensitive(api_client, app_session, url, field, value):
+    add_work_items(app_session)
+    response = api_client.get(f"{url}?field1={field}&filter1={value}")
+    assert response.status_code == 200
+    assert [x[field] for x in response.json] == [value.lower()]
+
+    response = api_client.get(f"{url}?search={value.lower()[:2].upper()}")
+    assert response.status_code == 200
+    assert len(response.json) == 3
+
+
+@pytest.mark.parametrize("term", ["Sr", "SR 2", "COMMENT", "Api", "missing"])
+def test_search_like_fallback(app_session, monkeypatch, term):
+    """Search with LIKE, as on databases without the full text search index, and with the index if any"""
+    add_work_items(app_session)
+    results = search(app_session, term, limit=100)
+    monkeypatch.setattr(search_index, "search_index_available", lambda connection, table: False)
+    like_results = search(app_session, term, limit=100)
+
+    assert [x[2] for x in like_results] == [0.0] * len(like_results)
+    assert like_results == sorted(like_results)
+    assert sorted(x[:2] for x in results) == sorted(x[:2] for x in like_results)
+    assert len(like_results) == {"Sr": 3, "SR 2": 1, "COMMENT": 3, "Api": 1, "missing": 0}[term]
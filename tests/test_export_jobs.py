@@ -0,0 +1,139 @@
+import json, os, threading, time
+import pytest
+from sqlalchemy.orm import Session
+from export_jobs import ExportJobs
+from spdx_manager import export_spdx_library
+from mapping_trees import add_api, add_sw_requirement
+
+TIMEOUT = 10
+
+
+def wait(jobs, job_id):
+    """Job once it is completed"""
+    deadline = time.monotonic() + TIMEOUT
+    while jobs.get(job_id)['status'] not in [ExportJobs.DONE, ExportJobs.FAILED]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return jobs.get(job_id)
+
+
+def writer(jobs, calls, release=None):
+    """Build writing the library to the job file, once release is set"""
+    def build(job):
+        calls.append(job['content_hash'])
+        if release:
+            release.wait(TIMEOUT)
+        with open(jobs.filepath(job), 'w') as f:
+            f.write(job['library'])
+    return build
+
+
+@pytest.fixture
+def release():
+    release = threading.Event()
+    yield release
+    release.set()
+
+
+@pytest.fixture
+def jobs(tmp_path, release):
+    jobs = ExportJobs(str(tmp_path / "export"), workers=1, max_jobs=2)
+    yield jobs
+    release.set()
+    jobs.executor.shutdown(wait=True)
+
+
+def test_jobs_of_the_same_content_are_shared(jobs, release):
+    calls = []
+    build = writer(jobs, calls, release)
+
+    job = jobs.submit("library", "hash", build)
+    assert job['status'] in [ExportJobs.QUEUED, ExportJobs.RUNNING]
+    assert jobs.submit("library", "hash", build)['id'] == job['id']
+    other = jobs.submit("library", "changed hash", build)
+    assert other['id'] != job['id']
+    release.set()
+
+    assert wait(jobs, job['id'])['status'] == ExportJobs.DONE
+    assert wait(jobs, other['id'])['status'] == ExportJobs.DONE
+    assert calls == ["hash", "changed hash"]
+    with open(jobs.filepath(job)) as f:
+        assert f.read() == "library"
+
+    # Done, with its file
+    assert jobs.submit("library", "hash", build)['id'] == job['id']
+    assert calls == ["hash", "changed hash"]
+
+
+def test_existing_export_is_reused(jobs):
+    calls = []
+    os.makedirs(jobs.export_dir)
+    with open(os.path.join(jobs.export_dir, jobs.filename("library", "hash")), 'w') as f:
+        f.write("exported before")
+
+    job = jobs.submit("library", "hash", writer(jobs, calls))
+    assert job['status'] == ExportJobs.DONE
+    assert job['finished_at'] is not None
+    assert calls == []
+
+    # Built again once the file is deleted
+    os.remove(jobs.filepath(job))
+    new_job = jobs.submit("library", "hash", writer(jobs, calls))
+    assert new_job['id'] != job['id']
+    assert wait(jobs, new_job['id'])['status'] == ExportJobs.DONE
+    assert calls == ["hash"]
+
+
+def test_failed_job(jobs):
+    def build(job):
+        raise ValueError("no data")
+
+    job = wait(jobs, jobs.submit("library", "hash", build)['id'])
+    assert job['status'] == ExportJobs.FAILED
+    assert job['error'] == "no data"
+    assert job['seconds'] is not None
+    assert not os.path.exists(jobs.filepath(job))
+
+    # A failed job is not reused
+    assert jobs.submit("library", "hash", build)['id'] != job['id']
+
+
+def test_completed_jobs_are_pruned(jobs, release):
+    done = [wait(jobs, jobs.submit("library", f"hash {i}", writer(jobs, []))['id']) for i in range(2)]
+    running = jobs.submit("library", "running", writer(jobs, [], release))
+    queued = jobs.submit("library", "queued", writer(jobs, [], release))
+
+    # The oldest completed jobs above max_jobs are forgotten, the ones still to build are kept
+    assert [jobs.get(x['id']) for x in done] == [None, None]
+    assert jobs.get(running['id'])['status'] in [ExportJobs.QUEUED, ExportJobs.RUNNING]
+    assert jobs.get(queued['id'])['status'] == ExportJobs.QUEUED
+    release.set()
+    assert wait(jobs, queued['id'])['status'] == ExportJobs.DONE
+    assert len(jobs.jobs) == 2
+
+
+def test_get_library_starts_a_job(basil_api, api_client, app_engine, app_session, monkeypatch, jobs):
+    """GET with library returns the job building the export, then the exported document"""
+    def build(job):
+        with Session(app_engine) as session:
+            export_spdx_library(session, job['library'], jobs.filepath(job))
+    monkeypatch.setattr(basil_api, "export_jobs", jobs)
+    monkeypatch.setattr(basil_api, "run_spdx_export_job", build)
+    api_sr = add_sw_requirement(app_session, add_api(app_session, "api"), 0, 50)
+    app_session.commit()
+
+    response = api_client.get("/spdx/libraries?library=library")
+    assert response.status_code == 202
+    assert wait(jobs, response.json['id'])['status'] == ExportJobs.DONE
+
+    response = api_client.get("/spdx/libraries?library=library")
+    assert response.status_code == 200
+    assert f"API-SR-{api_sr.id}" in [x['SPDXID'] for x in json.loads(response.data)['snippets']]
+    response.close()
+
+    # Exported again once the data changed
+    api_sr.sw_requirement.title = "changed"
+    app_session.commit()
+    response = api_client.get("/spdx/libraries?library=library")
+    assert response.status_code == 202
+    assert wait(jobs, response.json['id'])['status'] == ExportJobs.DONE
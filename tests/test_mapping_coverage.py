@@ -0,0 +1,142 @@
+"""Coverage of every mapping row computed by a single statement (compute_coverages())
+against the one stored a row at a time by the mapping models event listeners.
+"""
+import random
+import pytest
+
+from api import ApiModel
+from mapping_coverage import MappingCoverageModel, compute_coverages
+from mapping_trees import add_api, add_sr_test_case, add_sr_test_specification, add_sw_requirement, \
+    add_test_case, add_test_specification, add_ts_test_case, indirect_mappings, mapping_rows
+
+SEEDS = range(5)
+
+
+def random_coverage(rnd):
+    return rnd.choice([0, 25, 50, 100, rnd.randint(0, 100), rnd.uniform(0, 100)])
+
+
+def add_random_mappings(db_session, rnd, api):
+    """Direct mappings of api with random indirect mappings, as the mapping views build them"""
+    for i in range(rnd.randint(0, 4)):
+        api_sr = add_sw_requirement(db_session, api, i * 10, random_coverage(rnd))
+        for j in range(rnd.randint(0, 3)):
+            sr_ts = add_sr_test_specification(db_session, api_sr, random_coverage(rnd))
+            for k in range(rnd.randint(0, 3)):
+                add_ts_test_case(db_session, None, sr_ts, random_coverage(rnd))
+        for j in range(rnd.randint(0, 2)):
+            add_sr_test_case(db_session, api_sr, random_coverage(rnd))
+    for i in range(rnd.randint(0, 3)):
+        api_ts = add_test_specification(db_session, api, i * 10, random_coverage(rnd))
+        for j in range(rnd.randint(0, 3)):
+            add_ts_test_case(db_session, api_ts, None, random_coverage(rnd))
+    for i in range(rnd.randint(0, 2)):
+        add_test_case(db_session, api, i * 10, random_coverage(rnd))
+
+
+def stored_coverages(db_session):
+    return {(x.parent_table, x.parent_id): (x.api_id, x.coverage)
+            for x in db_session.query(MappingCoverageModel).all()}
+
+
+def assert_equal_coverages(coverages, expected):
+    """The coverages are sums of floats, added in a different order"""
+    assert coverages.keys() == expected.keys()
+    for key in coverages.keys():
+        assert coverages[key][0] == expected[key][0], key
+        assert coverages[key][1] == pytest.approx(expected[key][1]), key
+
+
+def assert_same_coverages(db_session):
+    computed = compute_coverages(db_session.connection())
+    assert_equal_coverages(computed, stored_coverages(db_session))
+
+    # Coverage of the models, walking the work items tree
+    for row in mapping_rows(db_session):
+        if (row.__tablename__, row.id) not in computed:
+            # Indirect mapping of a deleted mapping
+            continue
+        coverage = computed[(row.__tablename__, row.id)][1]
+        if hasattr(row, 'compute_waterfall_coverage'):
+            assert row.get_waterfall_coverage(db_session) == pytest.approx(coverage)
+            assert row.compute_waterfall_coverage(db_session) == pytest.approx(coverage)
+        else:
+            assert row.coverage == pytest.approx(coverage)
+    for api in db_session.query(ApiModel).all():
+        assert api.compute_coverage(db_session) == pytest.approx(computed[(api.__tablename__, api.id)][1])
+
+    # Rows of a part of the apis
+    api_ids = sorted(x.id for x in db_session.query(ApiModel).all())
+    subset = api_ids[::2]
+    assert_equal_coverages(compute_coverages(db_session.connection(), subset),
+                           {k: v for k, v in computed.items() if v[0] in subset})
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_inserted_mappings(db_session, seed):
+    rnd = random.Random(seed)
+    for i in range(5):
+        add_random_mappings(db_session, rnd, add_api(db_session, f"api {i}"))
+    db_session.commit()
+    assert_same_coverages(db_session)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_updated_mappings(db_session, seed):
+    rnd = random.Random(seed)
+    apis = [add_api(db_session, f"api {i}") for i in range(5)]
+    for api in apis:
+        add_random_mappings(db_session, rnd, api)
+    db_session.commit()
+
+    for iteration in range(3):
+        rows = mapping_rows(db_session)
+        for row in rnd.sample(rows, len(rows) // 2):
+            row.coverage = random_coverage(rnd)
+        # Mappings added to the trees already in the database
+        add_random_mappings(db_session, rnd, rnd.choice(apis))
+        db_session.commit()
+        assert_same_coverages(db_session)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_deleted_mappings(db_session, seed):
+    rnd = random.Random(seed)
+    for i in range(5):
+        add_random_mappings(db_session, rnd, add_api(db_session, f"api {i}"))
+    db_session.commit()
+
+    for iteration in range(3):
+        rows = mapping_rows(db_session)
+        if not rows:
+            break
+        for row in rnd.sample(rows, max(1, len(rows) // 4)):
+            if row not in db_session:
+                continue
+            # The indirect mappings are deleted before their parent
+            for child in indirect_mappings(db_session, row) + [row]:
+                db_session.delete(child)
+                db_session.flush()
+        db_session.commit()
+        assert_same_coverages(db_session)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_deleted_parent_mappings(db_session, seed):
+    """The mapping views delete a mapping without its indirect mappings"""
+    rnd = random.Random(seed)
+    for i in range(5):
+        add_random_mappings(db_session, rnd, add_api(db_session, f"api {i}"))
+    db_session.commit()
+
+    rows = [x for x in mapping_rows(db_session) if indirect_mappings(db_session, x)]
+    for row in rnd.sample(rows, len(rows) // 2):
+        db_session.delete(row)
+    db_session.commit()
+    assert_same_coverages(db_session)
+
+    # Changes of the indirect mappings left without an api
+    for row in mapping_rows(db_session):
+        row.coverage = random_coverage(rnd)
+    db_session.commit()
+    assert_same_coverages(db_session)
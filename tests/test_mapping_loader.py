@@ -0,0 +1,135 @@
+import pytest
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from api import ApiModel
+from api_justification import ApiJustificationModel
+from api_sw_requirement import ApiSwRequirementModel
+from api_test_case import ApiTestCaseModel
+from api_test_specification import ApiTestSpecificationModel
+from mapping_loader import MappingTreeLoader
+from sw_requirement import SwRequirementModel
+from sw_requirement_test_case import SwRequirementTestCaseModel
+from sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from mapping_trees import add_api, add_comment, add_justification, add_sr_test_case, add_sr_test_specification, \
+    add_sw_requirement, add_test_case, add_test_specification, add_ts_test_case, mapping_rows
+import mapping_trees
+
+
+def add_mapping_tree(db_session, api, count):
+    """count direct mappings of every type, every one with indirect mappings and a comment"""
+    for i in range(count):
+        api_sr = add_sw_requirement(db_session, api, i, 50)
+        sr_ts = add_sr_test_specification(db_session, api_sr, 50)
+        add_ts_test_case(db_session, None, sr_ts, 50)
+        add_sr_test_case(db_session, api_sr, 50)
+        api_ts = add_test_specification(db_session, api, i, 50)
+        add_ts_test_case(db_session, api_ts, None, 50)
+        for row in [api_sr, api_ts,
+                    add_test_case(db_session, api, i, 50),
+                    add_justification(db_session, api, i, 50)]:
+            add_comment(db_session, row)
+    db_session.commit()
+
+
+def view_statements(db_engine, api_id, view):
+    """Number of statements executed to load view of api with a new session"""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with Session(db_engine) as db_session:
+        api = db_session.query(ApiModel).filter(ApiModel.id == api_id).one()
+        event.listen(db_engine, "before_cursor_execute", count)
+        try:
+            getattr(MappingTreeLoader(db_session, api), view)()
+        finally:
+            event.remove(db_engine, "before_cursor_execute", count)
+    return len(statements)
+
+
+@pytest.mark.parametrize("view", ["sw_requirements", "test_specifications", "test_cases", "justifications"])
+def test_query_count_independent_of_mappings(db_engine, db_session, view):
+    small = add_api(db_session, "small")
+    large = add_api(db_session, "large")
+    add_mapping_tree(db_session, small, 3)
+    add_mapping_tree(db_session, large, 30)
+
+    assert view_statements(db_engine, small.id, view) == view_statements(db_engine, large.id, view)
+
+
+# Mapping views tree as built before MappingTreeLoader, with as_dict(db_session=...) of every row
+def without_keys(_dict, keys):
+    return {k: v for k, v in _dict.items() if k not in keys}
+
+
+def direct_mapping_dicts(db_session, api, model):
+    return [x.as_dict(db_session=db_session) for x in db_session.query(model).filter(
+        model.api_id == api.id).order_by(model.offset.asc()).all()]
+
+
+def indirect_test_case_dicts(db_session, parent_key, parent_id):
+    model = mapping_trees.TestSpecificationTestCaseModel
+    return [without_keys(x.as_dict(db_session=db_session), ['section', 'offset', 'api'])
+            for x in db_session.query(model).filter(getattr(model, parent_key) == parent_id).all()]
+
+
+def reference_sw_requirements(db_session, api):
+    undesired_keys = ['section', 'offset']
+    ret = direct_mapping_dicts(db_session, api, ApiSwRequirementModel)
+    for sr in ret:
+        ind_ts = db_session.query(SwRequirementTestSpecificationModel).filter(
+            SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id == sr['relation_id']).all()
+        sr['sw_requirement']['test_specifications'] = [
+            without_keys(x.as_dict(db_session=db_session), undesired_keys + ['api']) for x in ind_ts]
+        ind_tc = db_session.query(SwRequirementTestCaseModel).filter(
+            SwRequirementTestCaseModel.sw_requirement_mapping_api_id == sr['relation_id']).all()
+        sr['sw_requirement']['test_cases'] = [
+            without_keys(x.as_dict(db_session=db_session), undesired_keys + ['api', 'sw_requirement_mapping_api'])
+            for x in ind_tc]
+        for ts in sr['sw_requirement']['test_specifications']:
+            ts['test_specification']['test_cases'] = indirect_test_case_dicts(
+                db_session, 'test_specification_mapping_sw_requirement_id', ts['relation_id'])
+    return ret
+
+
+def reference_test_specifications(db_session, api):
+    ret = direct_mapping_dicts(db_session, api, ApiTestSpecificationModel)
+    for ts in ret:
+        ts['test_specification']['test_cases'] = indirect_test_case_dicts(
+            db_session, 'test_specification_mapping_api_id', ts['relation_id'])
+    return ret
+
+
+REFERENCE_VIEWS = {
+    "sw_requirements": reference_sw_requirements,
+    "test_specifications": reference_test_specifications,
+    "test_cases": lambda db_session, api: direct_mapping_dicts(db_session, api, ApiTestCaseModel),
+    "justifications": lambda db_session, api: direct_mapping_dicts(db_session, api, ApiJustificationModel),
+}
+
+
+@pytest.mark.parametrize("view", REFERENCE_VIEWS.keys())
+def test_views_match_per_row_dicts(db_engine, db_session, view):
+    api = add_api(db_session, "api")
+    other = add_api(db_session, "other")
+    add_mapping_tree(db_session, api, 4)
+    add_mapping_tree(db_session, other, 2)
+
+    # Comments on the indirect mappings, new versions of some rows and work items
+    for row in mapping_rows(db_session)[::3]:
+        add_comment(db_session, row)
+        row.coverage = 70
+    for sr in db_session.query(SwRequirementModel).all()[::2]:
+        sr.title = f"{sr.title} changed"
+    db_session.commit()
+    # Rows created before the version column
+    db_session.execute(update(ApiSwRequirementModel).where(ApiSwRequirementModel.id % 2 == 0).values(version=None))
+    db_session.commit()
+
+    with Session(db_engine) as session:
+        api = session.query(ApiModel).filter(ApiModel.id == api.id).one()
+        expected = REFERENCE_VIEWS[view](session, api)
+    with Session(db_engine) as session:
+        api = session.query(ApiModel).filter(ApiModel.id == api.id).one()
+        assert getattr(MappingTreeLoader(session, api), view)() == expected
@@ -0,0 +1,156 @@
+"""ETag and response cache of the mapping views"""
+import pytest
+from api_sw_requirement import ApiSwRequirementModel
+from sw_requirement import SwRequirementModel
+from mapping_trees import add, add_api, add_comment, add_justification, add_sr_test_case, \
+    add_sr_test_specification, add_sw_requirement, add_test_case, add_test_specification, add_ts_test_case
+
+SPECIFICATION = "section of the specification"
+VIEWS = ["/mapping/api/sw-requirements", "/mapping/api/test-specifications",
+         "/mapping/api/test-cases", "/mapping/api/justifications"]
+
+
+def add_mapped_api(app_session, specification_path):
+    api = add_api(app_session, "api")
+    api.raw_specification_url = str(specification_path)
+    add_sw_requirement(app_session, api, 0, 50)
+    add_test_specification(app_session, api, 0, 50)
+    add_test_case(app_session, api, 0, 50)
+    add_justification(app_session, api, 0, 50)
+    app_session.commit()
+    return api
+
+
+@pytest.mark.parametrize("view", VIEWS)
+def test_view_of_missing_specification_is_not_cached(basil_api, api_client, app_session, tmp_path, view):
+    specification_path = tmp_path / "specification.txt"
+    api = add_mapped_api(app_session, specification_path)
+
+    response = api_client.get(f"{view}?api-id={api.id}")
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+    assert basil_api.response_cache.entries == {}
+
+    # The view of the specification once available
+    specification_path.write_text(SPECIFICATION)
+    response = api_client.get(f"{view}?api-id={api.id}")
+    assert response.status_code == 200
+    assert "ETag" in response.headers
+    assert "".join(x['section'] for x in response.json['mapped']) == SPECIFICATION
+    assert len(basil_api.response_cache.entries) == 1
+
+
+def add_mapping_tree(app_session, name):
+    """Rows of a mapping tree of every type of a new api"""
+    api = add_api(app_session, name)
+    rows = {'api': api, 'sr': add_sw_requirement(app_session, api, 0, 50)}
+    rows['sr_ts'] = add_sr_test_specification(app_session, rows['sr'], 50)
+    rows['sr_ts_tc'] = add_ts_test_case(app_session, None, rows['sr_ts'], 50)
+    rows['sr_tc'] = add_sr_test_case(app_session, rows['sr'], 50)
+    rows['ts'] = add_test_specification(app_session, api, 0, 50)
+    rows['ts_tc'] = add_ts_test_case(app_session, rows['ts'], None, 50)
+    rows['tc'] = add_test_case(app_session, api, 0, 50)
+    rows['j'] = add_justification(app_session, api, 0, 50)
+    rows['comment'] = add_comment(app_session, rows['sr_ts'])
+    return rows
+
+
+def delete_work_item(app_session, mapping, item):
+    app_session.delete(mapping)
+    app_session.flush()
+    app_session.delete(item)
+
+
+# Change of the first of two apis, and the apis whose views it invalidates
+CHANGES = {
+    "insert direct mapping": (lambda s, a, b: add_test_case(s, a['api'], 10, 50), {'a'}),
+    "insert indirect mapping": (lambda s, a, b: add_ts_test_case(s, None, a['sr_ts'], 50), {'a'}),
+    "insert comment": (lambda s, a, b: add_comment(s, a['ts_tc']), {'a'}),
+    "insert unmapped work item": (lambda s, a, b: add(s, SwRequirementModel("sr", "description")), set()),
+    "update api": (lambda s, a, b: setattr(a['api'], 'tags', "changed"), {'a'}),
+    "update direct mapping": (lambda s, a, b: setattr(a['j'], 'coverage', 10), {'a'}),
+    "update indirect mapping": (lambda s, a, b: setattr(a['sr_ts_tc'], 'coverage', 10), {'a'}),
+    "update work item": (lambda s, a, b: setattr(a['sr_tc'].test_case, 'title', "changed"), {'a'}),
+    "update shared work item": (lambda s, a, b: setattr(b['shared'].sw_requirement, 'title', "changed"),
+                                {'a', 'b'}),
+    "update comment": (lambda s, a, b: setattr(a['comment'], 'comment', "changed"), {'a'}),
+    "delete direct mapping": (lambda s, a, b: s.delete(a['tc']), {'a'}),
+    "delete indirect mapping": (lambda s, a, b: s.delete(a['sr_ts_tc']), {'a'}),
+    "delete comment": (lambda s, a, b: s.delete(a['comment']), {'a'}),
+    "delete work item": (lambda s, a, b: delete_work_item(s, a['j'], a['j'].justification), {'a'}),
+}
+
+
+@pytest.fixture
+def two_apis(app_session):
+    a = add_mapping_tree(app_session, "a")
+    b = add_mapping_tree(app_session, "b")
+    # Sw requirement of a mapped by b too
+    b['shared'] = add(app_session, ApiSwRequirementModel(b['api'], a['sr'].sw_requirement, "section", 10, 50))
+    app_session.commit()
+    return a, b
+
+
+def invalidated(basil_api, apis, change):
+    """Names of the apis whose cached views are invalidated by change()"""
+    generations = dict(basil_api.response_cache.generations)
+    change()
+    return set(name for name, rows in apis.items()
+               if basil_api.response_cache.generations.get(f"{rows['api'].id}") !=
+               generations.get(f"{rows['api'].id}"))
+
+
+@pytest.mark.parametrize("change", CHANGES.keys())
+def test_committed_changes_invalidate_their_apis(basil_api, app_session, two_apis, change):
+    a, b = two_apis
+    apply, expected = CHANGES[change]
+
+    def commit():
+        apply(app_session, a, b)
+        app_session.flush()
+        # Not before the commit
+        assert basil_api.response_cache.generations == generations
+        app_session.commit()
+
+    generations = dict(basil_api.response_cache.generations)
+    assert invalidated(basil_api, {'a': a, 'b': b}, commit) == expected
+
+
+@pytest.mark.parametrize("change", CHANGES.keys())
+def test_rolled_back_changes_dont_invalidate(basil_api, app_session, two_apis, change):
+    a, b = two_apis
+    apply, expected = CHANGES[change]
+
+    def rollback():
+        apply(app_session, a, b)
+        app_session.flush()
+        app_session.rollback()
+
+    assert invalidated(basil_api, {'a': a, 'b': b}, rollback) == set()
+    # The next commit doesn't invalidate the rolled back changes
+    assert invalidated(basil_api, {'a': a, 'b': b}, app_session.commit) == set()
+
+
+def test_view_is_fresh_after_bulk_update(api_client, app_session, tmp_path):
+    """The offsets fixed by a bulk update are in the next view"""
+    specification_path = tmp_path / "specification.txt"
+    specification_path.write_text(SPECIFICATION)
+    api = add_mapped_api(app_session, specification_path)
+    view = f"/mapping/api/sw-requirements?api-id={api.id}"
+
+    def sw_requirement_offsets():
+        """Offsets of the sections matching a sw requirement, of the unmatched sw requirements"""
+        response = api_client.get(view)
+        assert response.status_code == 200
+        return [x['offset'] for x in response.json['mapped'] if x['sw_requirements']], \
+            [x['offset'] for x in response.json['unmapped'] if 'sw_requirement' in x]
+
+    assert sw_requirement_offsets() == ([0], [])
+    specification_path.write_text(f"moved {SPECIFICATION}")
+    # Cached until the ttl, a cached view is served without reading the specification
+    assert sw_requirement_offsets() == ([0], [])
+
+    response = api_client.post("/apis/fix-specification-warnings", json={'id': api.id})
+    assert response.status_code == 200
+    assert [x['new-offset'] for x in response.json['sw-requirements']] == [len("moved ")]
+    assert sw_requirement_offsets() == ([len("moved ")], [])
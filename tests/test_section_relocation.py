@@ -0,0 +1,32 @@
+import pytest
+from section_relocation import SectionRelocator
+
+OLD_SPEC = "zero line\none alpha two beta gamma delta\nthree line here\n"
+NEW_SPEC = "zero line\none alpha two beta GAMMA delta\nthree line here\n"
+SECTION = "two beta gam"
+
+
+@pytest.mark.parametrize("inserted", ["", "inserted line\n" * 30])
+def test_partially_edited_line_with_snapshot(inserted):
+    relocation = SectionRelocator(inserted + NEW_SPEC, OLD_SPEC).relocate(SECTION, OLD_SPEC.index(SECTION))
+    assert relocation['status'] == SectionRelocator.EDITED
+    assert relocation['offset'] == len(inserted) + OLD_SPEC.index(SECTION)
+    assert relocation['section'] == "two beta GAMMA"
+
+
+@pytest.mark.parametrize("inserted", ["", "inserted line\n" * 30])
+def test_edited_line_without_snapshot(inserted):
+    relocation = SectionRelocator(inserted + NEW_SPEC).relocate(SECTION, OLD_SPEC.index(SECTION))
+    assert relocation['status'] == SectionRelocator.EDITED
+    assert relocation['offset'] == len(inserted) + OLD_SPEC.index(SECTION)
+    assert relocation['section'] == "two beta GAM"
+
+
+def test_unchanged_and_removed_sections():
+    relocator = SectionRelocator("inserted line\n" + NEW_SPEC, OLD_SPEC)
+    assert relocator.relocate("three line", OLD_SPEC.index("three line"))['status'] == SectionRelocator.MOVED
+    assert relocator.relocate("zero line", 0)['status'] == SectionRelocator.MOVED
+    assert SectionRelocator(NEW_SPEC, OLD_SPEC).relocate("zero line", 0)['status'] == SectionRelocator.OK
+
+    relocation = SectionRelocator("totally different text\n" * 5).relocate(SECTION, OLD_SPEC.index(SECTION))
+    assert relocation['status'] == SectionRelocator.LOST
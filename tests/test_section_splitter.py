@@ -0,0 +1,280 @@
+import copy, random
+import pytest
+from section_splitter import SpecificationSections
+
+_SRs = 'sw_requirements'
+_TSs = 'test_specifications'
+_TCs = 'test_cases'
+_Js = 'justifications'
+ITEM_KEYS = [_TCs, _TSs, _SRs, _Js]
+
+
+# split_section() and get_splitted_sections() replaced by the boundaries sweep
+def reference_split_section(_to_splits, _that_split, _work_item_type):
+    sections = []
+    _work_items = []
+    _current_work_item = _that_split[_work_item_type]
+    _current_work_item['relation_id'] = _that_split['relation_id']
+    _current_work_item['coverage'] = _that_split['coverage'] if 'coverage' in _that_split.keys() else 0
+    _current_work_item['version'] = _that_split['version']
+
+    for _to_split in _to_splits:
+        _to_split_range = range(_to_split['offset'],
+                                _to_split['offset'] + len(_to_split['section']))
+        that_split_range = range(_that_split['offset'], _that_split['offset'] + len(_that_split['section']))
+        overlap = len(list(set(_to_split_range) & set(that_split_range))) > 0
+        if not overlap:
+            tmp_section = {'section': _to_split['section'],
+                           'offset': _to_split['offset'],
+                           'coverage': _to_split['coverage'],
+                           'delete': 0,
+                           _Js: [],
+                           _TCs: [],
+                           _TSs: [],
+                           _SRs: []}
+
+            for j in range(len(_to_split[_SRs])):
+                tmp_section[_SRs].append(_to_split[_SRs][j].copy())
+            for j in range(len(_to_split[_TCs])):
+                tmp_section[_TCs].append(_to_split[_TCs][j].copy())
+            for j in range(len(_to_split[_TSs])):
+                tmp_section[_TSs].append(_to_split[_TSs][j].copy())
+            for j in range(len(_to_split[_Js])):
+                tmp_section[_Js].append(_to_split[_Js][j].copy())
+
+            sections.append(tmp_section)
+
+        else:
+            idx = [_to_split['offset'],
+                   _to_split['offset'] + len(_to_split['section']),
+                   _that_split['offset'],
+                   _that_split['offset'] + len(_that_split['section'])]
+            idx_set = set(idx)
+            idx = sorted(list(idx_set))
+            for i in range(1, len(idx)):
+                tmp_section = {'section': _to_split['section'][idx[i - 1] - idx[0]:idx[i] - idx[0]],
+                               'offset': idx[i - 1],
+                               'coverage': _to_split['coverage'],
+                               'delete': 0,
+                               _Js: [],
+                               _TCs: [],
+                               _TSs: [],
+                               _SRs: []}
+
+                for j in range(len(_to_split[_SRs])):
+                    tmp_section[_SRs].append(_to_split[_SRs][j].copy())
+                for j in range(len(_to_split[_TCs])):
+                    tmp_section[_TCs].append(_to_split[_TCs][j].copy())
+                for j in range(len(_to_split[_TSs])):
+                    tmp_section[_TSs].append(_to_split[_TSs][j].copy())
+                for j in range(len(_to_split[_Js])):
+                    tmp_section[_Js].append(_to_split[_Js][j].copy())
+                sections.append(tmp_section)
+
+    for iSection in range(len(sections)):
+        section_range = range(sections[iSection]['offset'],
+                              sections[iSection]['offset'] + len(sections[iSection]['section']))
+        that_split_range = range(_that_split['offset'], _that_split['offset'] + len(_that_split['section']))
+        overlap = len(list(set(section_range) & set(that_split_range))) > 0
+        if overlap:
+            sections[iSection][f'{_work_item_type}s'].append(_current_work_item)
+
+    return sections
+
+
+def reference_splitted_sections(_specification, _mapping, _work_item_types):
+    """
+    _mapping: list of x_y (e.g. ApiSwRequirement) with nested mapping
+              each row has its own specification section information
+    _work_item_types: list of work items type for direct mapping that I
+              what to display in the current view
+    return: list of sections with related mapping
+    """
+    mapped_sections = [{'section': _specification,
+                        'offset': 0,
+                        'coverage': 0,
+                        'delete': 0,
+                        _TCs: [],
+                        _TSs: [],
+                        _SRs: [],
+                        _Js: []}]
+
+    for iWIT in range(len(_work_item_types)):
+        _items_key = f"{_work_item_types[iWIT]}s"
+        for iMapping in range(len(_mapping[_items_key])):
+            if not _mapping[_items_key][iMapping]['match']:
+                continue
+            mapped_sections = sorted(mapped_sections, key=lambda k: k['offset'])
+            # get overlapping sections
+            overlapping_section_indexes = []
+            for j in range(len(mapped_sections)):
+                section_range = range(mapped_sections[j]['offset'],
+                                      mapped_sections[j]['offset'] + len(mapped_sections[j]['section']))
+                that_split_range = range(_mapping[_items_key][iMapping]['offset'],
+                                         _mapping[_items_key][iMapping]['offset'] + len(
+                                             _mapping[_items_key][iMapping]['section']))
+                overlap = len(list(set(section_range) & set(that_split_range))) > 0
+                if overlap:
+                    overlapping_section_indexes.append(j)
+
+            if len(overlapping_section_indexes) > 0:
+                for k in overlapping_section_indexes:
+                    mapped_sections[k]['delete'] = 1
+
+                mapped_sections += reference_split_section([x for x in mapped_sections if x['delete'] == 1],
+                                                           _mapping[_items_key][iMapping], _work_item_types[iWIT])
+                mapped_sections = [x for x in mapped_sections if x['delete'] == 0]
+
+    for iS in range(len(mapped_sections)):
+        if mapped_sections[iS]['section'].strip() == "":
+            if sum([len(mapped_sections[iS][_SRs]),
+                    len(mapped_sections[iS][_TSs]),
+                    len(mapped_sections[iS][_TCs]),
+                    len(mapped_sections[iS][_Js])]) == 0:
+                mapped_sections[iS]['delete'] = True
+        coverage_total = 0
+        for j in range(len(mapped_sections[iS][_SRs])):
+            coverage_total += mapped_sections[iS][_SRs][j]['coverage']
+        for j in range(len(mapped_sections[iS][_TCs])):
+            coverage_total += mapped_sections[iS][_TCs][j]['coverage']
+        for j in range(len(mapped_sections[iS][_TSs])):
+            coverage_total += mapped_sections[iS][_TSs][j]['coverage']
+        for j in range(len(mapped_sections[iS][_Js])):
+            coverage_total += mapped_sections[iS][_Js][j]['coverage']
+        mapped_sections[iS]['coverage'] = min(max(coverage_total, 0), 100)
+
+    # Remove Section with section: \n and no work items
+    mapped_sections = [x for x in mapped_sections if not x['delete']]
+    return sorted(mapped_sections, key=lambda k: k['offset'])
+
+
+def random_specification(rnd, length):
+    return ''.join([rnd.choice('abc de\n  ') for i in range(length)])
+
+
+def disjoint_ranges(rnd, specification, count):
+    cuts = sorted(rnd.sample(range(len(specification) + 1), min(2 * count, len(specification) + 1)))
+    return [(cuts[i], cuts[i + 1]) for i in range(0, len(cuts) - 1, 2)]
+
+
+def nested_ranges(rnd, start, end, depth):
+    """Ranges inside [start, end), every two of them disjoint or one inside the other"""
+    ret = []
+    for sub_start, sub_end in disjoint_ranges(rnd, range(start, end), rnd.randint(0, 3)):
+        sub_start += start
+        sub_end += start
+        ret.append((sub_start, sub_end))
+        if depth > 0:
+            ret += nested_ranges(rnd, sub_start, sub_end, depth - 1)
+    return ret
+
+
+def random_ranges(rnd, specification):
+    ret = []
+    for i in range(rnd.randint(0, 12)):
+        start = rnd.randint(0, len(specification))
+        ret.append((start, min(start + rnd.randint(0, 60), len(specification))))
+    return ret
+
+
+def random_mapping(rnd, specification, work_item_types, ranges):
+    """Mapping rows of ranges, split in order among work_item_types"""
+    mapping = {f"{x}s": [] for x in work_item_types}
+    cuts = sorted([rnd.randint(0, len(ranges)) for i in range(len(work_item_types) - 1)])
+    cuts = [0] + cuts + [len(ranges)]
+    for iWIT in range(len(work_item_types)):
+        work_item_type = work_item_types[iWIT]
+        for iRange in range(cuts[iWIT], cuts[iWIT + 1]):
+            start, end = ranges[iRange]
+            section = specification[start:end]
+            match = rnd.random() < 0.9
+            mapping[f"{work_item_type}s"].append({'relation_id': iRange,
+                                                  'offset': start,
+                                                  'section': section if match else f"{section}unmatched",
+                                                  'match': match,
+                                                  'coverage': rnd.choice([0, 10, 25, 50, 100, 120]),
+                                                  'version': '1.1',
+                                                  work_item_type: {'id': iRange, 'title': f'item {iRange}'}})
+    return mapping
+
+
+def brute_force_sections(specification, mapping, work_item_types):
+    """Sections as the runs of characters covered by the same matching mappings"""
+    rows = [(f"{x}s", y) for x in work_item_types for y in mapping[f"{x}s"]
+            if y['match'] and len(y['section']) > 0]
+    covering = [tuple([i for i in range(len(rows)) if rows[i][1]['offset'] <= position <
+                       rows[i][1]['offset'] + len(rows[i][1]['section'])])
+                for position in range(len(specification))]
+    ret = []
+    start = 0
+    for position in range(1, len(specification) + 1):
+        if position < len(specification) and covering[position] == covering[start]:
+            continue
+        items = covering[start]
+        if items or specification[start:position].strip() != "":
+            ret.append((start, specification[start:position],
+                        min(max(sum([rows[i][1]['coverage'] for i in items]), 0), 100),
+                        [(rows[i][0], rows[i][1]['relation_id']) for i in items]))
+        start = position
+    return ret
+
+
+WORK_ITEM_TYPES = [['sw_requirement', 'justification'],
+                   ['test_specification', 'justification'],
+                   ['test_case', 'justification'],
+                   ['justification']]
+
+
+@pytest.mark.parametrize("work_item_types", WORK_ITEM_TYPES)
+def test_disjoint_mappings_match_reference_splitter(work_item_types):
+    rnd = random.Random(f"disjoint-{work_item_types}")
+    for i in range(100):
+        specification = random_specification(rnd, rnd.randint(0, 200))
+        ranges = disjoint_ranges(rnd, specification, rnd.randint(0, 10))
+        rnd.shuffle(ranges)
+        mapping = random_mapping(rnd, specification, work_item_types, ranges)
+        expected = reference_splitted_sections(specification, copy.deepcopy(mapping), work_item_types)
+        sections = SpecificationSections(specification, copy.deepcopy(mapping), work_item_types)
+        assert sections.as_dicts(ITEM_KEYS) == expected
+        assert len(sections) == len(expected)
+
+
+@pytest.mark.parametrize("work_item_types", WORK_ITEM_TYPES)
+def test_nested_mappings_match_reference_splitter(work_item_types):
+    """Overlapping mappings processed container first, the cases split correctly by the reference splitter"""
+    rnd = random.Random(f"nested-{work_item_types}")
+    for i in range(100):
+        specification = random_specification(rnd, rnd.randint(0, 200))
+        ranges = nested_ranges(rnd, 0, len(specification), 3)
+        ranges = sorted(ranges, key=lambda x: x[0] - x[1])
+        mapping = random_mapping(rnd, specification, work_item_types, ranges)
+        expected = reference_splitted_sections(specification, copy.deepcopy(mapping), work_item_types)
+        sections = SpecificationSections(specification, copy.deepcopy(mapping), work_item_types)
+        assert sections.as_dicts(ITEM_KEYS) == expected
+
+
+@pytest.mark.parametrize("work_item_types", WORK_ITEM_TYPES)
+def test_overlapping_mappings_match_brute_force(work_item_types):
+    """The reference splitter shifts the text of a mapping straddling sections
+    split by an earlier one, any overlap is checked against a per character split instead
+    """
+    rnd = random.Random(f"overlapping-{work_item_types}")
+    for i in range(100):
+        specification = random_specification(rnd, rnd.randint(0, 200))
+        mapping = random_mapping(rnd, specification, work_item_types, random_ranges(rnd, specification))
+        sections = SpecificationSections(specification, copy.deepcopy(mapping), work_item_types).as_dicts(ITEM_KEYS)
+        assert [(x['offset'], x['section'], x['coverage'],
+                 [(key, y['relation_id']) for key in [f"{z}s" for z in work_item_types] for y in x[key]])
+                for x in sections] == brute_force_sections(specification, mapping, work_item_types)
+
+
+def test_sections_share_the_work_items():
+    specification = "first line\nsecond line\n"
+    mapping = {'sw_requirements': [{'relation_id': 1, 'offset': 0, 'section': specification, 'match': True,
+                                    'coverage': 50, 'version': '1.1', 'sw_requirement': {'id': 1}},
+                                   {'relation_id': 2, 'offset': 11, 'section': "second", 'match': True,
+                                    'coverage': 70, 'version': '1.1', 'sw_requirement': {'id': 2}}]}
+    sections = SpecificationSections(specification, mapping, ['sw_requirement']).as_dicts(ITEM_KEYS)
+    assert [x['section'] for x in sections] == ["first line\n", "second", " line\n"]
+    assert [x['coverage'] for x in sections] == [50, 100, 50]
+    assert sections[0][_SRs][0] is sections[1][_SRs][0]
@@ -0,0 +1,62 @@
+"""SPDX export of many libraries in worker processes, reading the BASIL_DB_URL database"""
+import json, os
+import pytest
+import db_orm
+from spdx_batch_export import export_libraries, export_library, main
+from mapping_trees import add_api, add_sw_requirement, add_test_case
+
+
+@pytest.fixture
+def libraries(app_session, monkeypatch):
+    """Snippet ids of the libraries in the database of the app, which the worker processes read too"""
+    monkeypatch.setenv("BASIL_DB_URL", db_orm.get_db_url())
+    ret = {}
+    for library in ["first", "second"]:
+        api = add_api(app_session, "api", library)
+        ret[library] = [f"API-SR-{add_sw_requirement(app_session, api, 0, 50).id}",
+                        f"API-TC-{add_test_case(app_session, api, 10, 50).id}"]
+    app_session.commit()
+    return ret
+
+
+def exported_snippets(export_dir, report):
+    with open(os.path.join(export_dir, report['filename'])) as f:
+        return sorted(x['SPDXID'] for x in json.load(f)['snippets'])
+
+
+def test_export_library(libraries, tmp_path):
+    export_dir = str(tmp_path / "export")
+    report = export_library("first", export_dir)
+    assert report['status'] == 'exported'
+    assert report['error'] is None
+    assert exported_snippets(export_dir, report) == sorted(libraries["first"])
+
+    reused = export_library("first", export_dir)
+    assert (reused['status'], reused['filename']) == ('reused', report['filename'])
+    assert export_library("first", export_dir, force=True)['status'] == 'exported'
+
+    # Errors are reported
+    open(tmp_path / "file", 'w').close()
+    report = export_library("second", str(tmp_path / "file"))
+    assert report['status'] == 'failed'
+    assert report['error']
+
+
+def test_export_libraries(libraries, tmp_path):
+    export_dir = str(tmp_path / "export")
+    reports = export_libraries(["second", "first"], export_dir, workers=2)
+    assert [(x['library'], x['status']) for x in reports] == [("first", "exported"), ("second", "exported")]
+    for report in reports:
+        assert exported_snippets(export_dir, report) == sorted(libraries[report['library']])
+
+    reports = export_libraries(["first", "second"], export_dir, workers=2)
+    assert [x['status'] for x in reports] == ["reused", "reused"]
+
+
+def test_export_every_library(libraries, tmp_path, capsys):
+    export_dir = str(tmp_path / "export")
+    assert main(["--workers", "1", "--export-dir", export_dir]) == 0
+    output = capsys.readouterr().out
+    assert "first: exported" in output
+    assert "second: exported" in output
+    assert len(os.listdir(export_dir)) == 2
@@ -0,0 +1,171 @@
+"""SPDX export of a library"""
+import json
+import pytest
+from sqlalchemy import text
+from api import ApiModel
+from api_sw_requirement import ApiSwRequirementModel
+from spdx_fragment import SpdxFragmentModel
+import spdx_manager
+from spdx_manager import export_spdx_library
+from mapping_trees import add, add_api, add_justification, add_sr_test_specification, add_sw_requirement, \
+    add_test_case, add_test_specification, add_ts_test_case
+
+LIBRARY = "library"
+
+
+def add_library(db_session):
+    """Two apis of LIBRARY mapping a shared sw requirement, one of another library.
+    Return the (spdx id, relationship type, related spdx id) of the export of LIBRARY
+    """
+    relationships = set()
+    shared_sr = None
+    for name in ["first", "second"]:
+        api = add_api(db_session, name, LIBRARY)
+        api.raw_specification_url = f"{name}.txt"
+        api_sr = add_sw_requirement(db_session, api, 0, 50)
+        shared_sr = shared_sr or api_sr.sw_requirement
+        shared_api_sr = add(db_session, ApiSwRequirementModel(api, shared_sr, "shared section", 10, 30))
+        sr_ts = add_sr_test_specification(db_session, api_sr, 50)
+        sr_ts_tc = add_ts_test_case(db_session, None, sr_ts, 50)
+        api_ts = add_test_specification(db_session, api, 20, 40)
+        ts_tc = add_ts_test_case(db_session, api_ts, None, 50)
+        api_tc = add_test_case(db_session, api, 30, 20)
+        api_j = add_justification(db_session, api, 40, 100)
+
+        relationships |= {
+            (f"API-{api.id}", "GENERATES", f"API-SR-{api_sr.id}"),
+            (f"API-{api.id}", "GENERATES", f"API-SR-{shared_api_sr.id}"),
+            (f"API-{api.id}", "GENERATES", f"API-TS-{api_ts.id}"),
+            (f"API-{api.id}", "GENERATES", f"API-TC-{api_tc.id}"),
+            (f"API-{api.id}", "GENERATES", f"API-JUST-{api_j.id}"),
+            (f"SR-{api_sr.sw_requirement_id}", "REQUIREMENT_DESCRIPTION_FOR", f"API-SR-{api_sr.id}"),
+            (f"SR-{shared_sr.id}", "REQUIREMENT_DESCRIPTION_FOR", f"API-SR-{shared_api_sr.id}"),
+            (f"TS-{sr_ts.test_specification_id}", "TEST_OF", f"API-SR-{api_sr.id}"),
+            (f"TC-{sr_ts_tc.test_case_id}", "TEST_CASE_OF", f"API-SR-{api_sr.id}"),
+            (f"TS-{sr_ts.test_specification_id}", "SPECIFICATION_FOR", f"TC-{sr_ts_tc.test_case_id}"),
+            (f"TS-{api_ts.test_specification_id}", "TEST_OF", f"API-TS-{api_ts.id}"),
+            (f"TC-{ts_tc.test_case_id}", "TEST_CASE_OF", f"API-TS-{api_ts.id}"),
+            (f"TS-{api_ts.test_specification_id}", "SPECIFICATION_FOR", f"TC-{ts_tc.test_case_id}"),
+            (f"TC-{api_tc.test_case_id}", "TEST_CASE_OF", f"API-TC-{api_tc.id}"),
+            (f"JUST-{api_j.justification_id}", "DESCRIBES", f"API-JUST-{api_j.id}")}
+
+    other_api = add_api(db_session, "other", "other library")
+    add_sw_requirement(db_session, other_api, 0, 50)
+    db_session.commit()
+    return relationships
+
+
+def export_document(db_session, tmp_path):
+    filepath = tmp_path / "export.json"
+    export_spdx_library(db_session, LIBRARY, str(filepath))
+    return json.loads(filepath.read_text())
+
+
+def test_export_library(app_session, tmp_path):
+    relationships = add_library(app_session)
+    document = export_document(app_session, tmp_path)
+
+    files = [x['SPDXID'] for x in document['files']]
+    snippets = [x['SPDXID'] for x in document['snippets']]
+    spdx_ids = files + snippets
+    assert len(spdx_ids) == len(set(spdx_ids))
+
+    # Every element of a relationship once, the work items shared by the apis too
+    related = set([x[0] for x in relationships] + [x[2] for x in relationships])
+    assert set(spdx_ids) == related
+    assert sorted(snippets) == sorted(x for x in related if x.split("-")[1] in ["SR", "TS", "TC", "JUST"])
+
+    exported = [(x['spdxElementId'], x['relationshipType'], x['relatedSpdxElement'])
+                for x in document['relationships']]
+    assert len(exported) == len(set(exported))
+    assert set(exported) == relationships
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    """spdx ids of the files and snippets converted to json"""
+    spdx_ids = []
+    for converter in [spdx_manager.FileConverter, spdx_manager.SnippetConverter]:
+        def convert(self, element, document, convert=converter.convert):
+            spdx_ids.append(element.spdx_id)
+            return convert(self, element, document)
+        monkeypatch.setattr(converter, "convert", convert)
+    return spdx_ids
+
+
+def elements(document):
+    return document['files'] + document['snippets']
+
+
+def stored_fragments(db_session):
+    db_session.expire_all()
+    return {x.spdx_id: x.fragment for x in db_session.query(SpdxFragmentModel).all()}
+
+
+def test_unchanged_fragments_are_reused(app_session, tmp_path, conversions):
+    add_library(app_session)
+    document = export_document(app_session, tmp_path)
+    assert sorted(conversions) == sorted(x['SPDXID'] for x in elements(document))
+    fragments = stored_fragments(app_session)
+    assert sorted(fragments.keys()) == sorted(conversions)
+
+    conversions.clear()
+    assert elements(export_document(app_session, tmp_path)) == elements(document)
+    assert conversions == []
+    assert stored_fragments(app_session) == fragments
+
+
+def test_changed_work_item_is_rebuilt(app_session, tmp_path, conversions):
+    add_library(app_session)
+    export_document(app_session, tmp_path)
+    api_sr = app_session.query(ApiSwRequirementModel).order_by(ApiSwRequirementModel.id).first()
+    api_sr.sw_requirement.title = "changed title"
+    app_session.commit()
+
+    conversions.clear()
+    document = export_document(app_session, tmp_path)
+    spdx_id = f"SR-{api_sr.sw_requirement_id}"
+    # The version of the snippets mapping it includes the one of the work item
+    mappings = app_session.query(ApiSwRequirementModel).filter(
+        ApiSwRequirementModel.sw_requirement_id == api_sr.sw_requirement_id).all()
+    assert len(mappings) == 3
+    assert sorted(conversions) == sorted([spdx_id] + [f"API-SR-{x.id}" for x in mappings])
+    assert [x['fileName'] for x in document['files'] if x['SPDXID'] == spdx_id] == ["changed title"]
+    assert "changed title" in stored_fragments(app_session)[spdx_id]
+
+
+def test_export_without_fragments_store(app_engine, app_session, tmp_path, conversions, capsys):
+    if app_engine.dialect.name != "sqlite":
+        pytest.skip("the store is made to fail with a SQLite trigger")
+    add_library(app_session)
+    app_session.execute(text("CREATE TRIGGER spdx_fragments_read_only BEFORE INSERT ON spdx_fragments "
+                             "BEGIN SELECT RAISE(ABORT, 'read only'); END"))
+    app_session.commit()
+
+    document = export_document(app_session, tmp_path)
+    assert sorted(conversions) == sorted(x['SPDXID'] for x in elements(document))
+    assert "Unable to store the SPDX fragments" in capsys.readouterr().out
+    assert stored_fragments(app_session) == {}
+
+    # Built again by the next export
+    conversions.clear()
+    assert elements(export_document(app_session, tmp_path)) == elements(document)
+    assert len(conversions) == len(elements(document))
+
+
+def test_stale_fragments_are_deleted(app_session, tmp_path):
+    add_library(app_session)
+    export_document(app_session, tmp_path)
+    fragments = stored_fragments(app_session)
+
+    api = app_session.query(ApiModel).filter(ApiModel.library == LIBRARY).order_by(ApiModel.id).first()
+    api_sr = app_session.query(ApiSwRequirementModel).filter(ApiSwRequirementModel.api_id == api.id).order_by(
+        ApiSwRequirementModel.id.desc()).first()
+    deleted = [f"API-SR-{api_sr.id}"]
+    app_session.delete(api_sr)
+    # A fragment of an element of another library
+    app_session.add(SpdxFragmentModel("TC-1000", "hash", "{}"))
+    app_session.commit()
+
+    export_document(app_session, tmp_path)
+    assert sorted(stored_fragments(app_session).keys()) == sorted(x for x in fragments.keys() if x not in deleted)
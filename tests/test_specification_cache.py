@@ -0,0 +1,129 @@
+import hashlib, os, threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from specification_cache import SpecificationCache
+
+
+class Origin():
+    """Local http server of the specifications, answering conditional requests"""
+
+    def __init__(self):
+        self.bodies = {}
+        self.fail = False
+        self.requests = []
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                origin.requests.append((self.path, self.headers.get('If-None-Match')))
+                if origin.fail or self.path not in origin.bodies:
+                    self.send_response(500 if origin.fail else 404)
+                    self.end_headers()
+                    return
+                body = origin.bodies[self.path]
+                etag = f'"{hash(body)}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; charset=utf-8')
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def origin():
+    origin = Origin()
+    yield origin
+    origin.stop()
+
+
+def objects(cache):
+    return sorted(os.listdir(cache.objects_dir))
+
+
+def test_fresh_body_is_served_from_disk(origin, tmp_path):
+    origin.bodies['/spec'] = "first version"
+    cache = SpecificationCache(str(tmp_path), ttl=300)
+    assert cache.get(origin.url('/spec')) == "first version"
+    origin.bodies['/spec'] = "second version"
+    assert cache.get(origin.url('/spec')) == "first version"
+    assert len(origin.requests) == 1
+
+
+def test_expired_body_is_revalidated(origin, tmp_path):
+    origin.bodies['/spec'] = "first version"
+    cache = SpecificationCache(str(tmp_path), ttl=0)
+    assert cache.get(origin.url('/spec')) == "first version"
+    fetched_at = cache.read_meta(origin.url('/spec'))['fetched_at']
+
+    # Not modified
+    assert cache.get(origin.url('/spec')) == "first version"
+    assert origin.requests[1][1] is not None
+    assert cache.read_meta(origin.url('/spec'))['fetched_at'] >= fetched_at
+
+    # Modified, the previous content is kept
+    origin.bodies['/spec'] = "second version"
+    assert cache.get(origin.url('/spec')) == "second version"
+    assert cache.previous_versions(origin.url('/spec')) == ["first version"]
+    assert len(origin.requests) == 3
+
+
+def test_cached_body_without_revalidation(origin, tmp_path):
+    origin.bodies['/spec'] = "first version"
+    cache = SpecificationCache(str(tmp_path), ttl=0)
+    cache.get(origin.url('/spec'))
+    origin.bodies['/spec'] = "second version"
+    assert cache.get(origin.url('/spec'), revalidate=False) == "first version"
+    assert len(origin.requests) == 1
+
+
+def test_stale_body_is_served_on_errors(origin, tmp_path):
+    origin.bodies['/spec'] = "first version"
+    cache = SpecificationCache(str(tmp_path), ttl=0)
+    cache.get(origin.url('/spec'))
+
+    origin.fail = True
+    assert cache.get(origin.url('/spec')) == "first version"
+    assert cache.get(origin.url('/missing')) is None
+
+    url = origin.url('/spec')
+    origin.stop()
+    assert cache.get(url) == "first version"
+
+
+def test_unreferenced_bodies_are_deleted(origin, tmp_path):
+    cache = SpecificationCache(str(tmp_path), ttl=0, history=1)
+    origin.bodies['/shared'] = "version 0"
+    cache.get(origin.url('/shared'))
+    for i in range(4):
+        origin.bodies['/spec'] = f"version {i}"
+        cache.get(origin.url('/spec'))
+
+    # The current and the previous content of /spec, version 0 is still used by /shared
+    assert cache.previous_versions(origin.url('/spec')) == ["version 2"]
+    assert len(objects(cache)) == 3
+    assert cache.get(origin.url('/shared'), revalidate=False) == "version 0"
+
+    # Dropped from the history of /shared too
+    for i in range(4, 6):
+        origin.bodies['/shared'] = f"version {i}"
+        cache.get(origin.url('/shared'))
+    assert not os.path.exists(cache.object_path(hashlib.sha256(b"version 0").hexdigest()))
+    assert len(objects(cache)) == 4